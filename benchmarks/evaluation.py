@@ -0,0 +1,237 @@
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from synthetic import generateInputs
+
+rootPath = os.path.realpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+sys.path.insert(0, os.path.join(rootPath, 'src'))
+
+from main import serializeEvaluation
+from evaluationFactory import EvaluationFactory
+from utils.studyIndex import StudyIndex
+
+# the evaluations timed by the benchmark, by algorithm type
+evaluations = {
+    "classification": "ClassificationEvaluation",
+    "continuous": "ContinuousEvaluation",
+    "boundingBox": "BoundingBoxEvaluation",
+    "segmentation": "SegmentationEvaluation"
+}
+
+# every scenario scales one dimension of the synthetic inputs, the rest of the parameters keep their defaults
+scenarios = {
+    "baseline": {"studies": 100},
+    "studies": {"studies": 2000},
+    "keys": {"studies": 100, "keys": 8},
+    "labels": {"studies": 1000, "labels": 12},
+    "depth": {"studies": 20, "series": 4, "instances": 8, "frames": 4},
+    "boxes": {"studies": 200, "boxes": 40},
+    "segmentation": {"studies": 40, "segmentations": 4, "segmentationSize": 1024}
+}
+
+# the increases below these are noise, the phases of the small scenarios only take a few milliseconds
+MINIMUM_TIME_CHANGE = 0.01
+MINIMUM_MEMORY_CHANGE = 1 << 20
+
+@contextlib.contextmanager
+def measurePhase(phases, name, traceMemory):
+    """
+    Measures the time of a phase and, when the memory is traced, the peak of the memory allocated during the phase
+    on top of the memory allocated before it
+    """
+    if traceMemory:
+        tracemalloc.reset_peak()
+        startMemory = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    yield
+    phases[name] = {"time": time.perf_counter() - start}
+    if traceMemory:
+        phases[name]["peakMemory"] = tracemalloc.get_traced_memory()[1] - startMemory
+
+def runPhases(datasetFilePath, outputFilePath, traceMemory):
+    """
+    Runs an evaluation measuring each of its phases: parsing the input files, indexing them, every evaluation and the
+    serialization of the result
+
+    Parameters
+    ----------
+    datasetFilePath : string
+        the path to the dataset json file
+    outputFilePath : string
+        the path to the output json file
+    traceMemory : bool
+        also measure the peak memory of every phase, which slows the phases down
+
+    Returns
+    -------
+    dictionary
+        The time of every phase in seconds and, when the memory is traced, its peak memory in bytes
+    """
+    phases = {}
+    with measurePhase(phases, "parse", traceMemory):
+        with open(datasetFilePath) as datasetFile:
+            dataset = json.load(datasetFile)
+        with open(outputFilePath) as outputFile:
+            output = json.load(outputFile)
+
+    with measurePhase(phases, "index", traceMemory):
+        index = StudyIndex(dataset, output)
+    dataset = None
+    output = None
+
+    factory = EvaluationFactory.fromIndex(index, 0.5, None)
+    evaluation = {}
+    for algorithmType, evaluationName in evaluations.items():
+        with measurePhase(phases, evaluationName, traceMemory):
+            evaluation[algorithmType] = factory.getFactory(algorithmType).Create()
+
+    with measurePhase(phases, "serialize", traceMemory):
+        serializeEvaluation(evaluation)
+    return phases
+
+def runScenario(parameters, repeats, seed):
+    """
+    Generates the inputs of a scenario and runs their evaluation a number of times keeping the fastest time of every phase,
+    which is the least affected by the noise of the machine. The peak memory is measured on one more run, since tracing
+    the memory slows the phases down
+
+    Parameters
+    ----------
+    parameters : dictionary
+        the parameters of the synthetic inputs
+    repeats : int
+        the number of timed runs
+    seed : int
+        the seed of the synthetic inputs
+
+    Returns
+    -------
+    json object
+        The parameters, the size of the inputs and the time and peak memory of every phase
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        dataset, output = generateInputs(seed, **parameters)
+        datasetFilePath = os.path.join(directory, 'dataset.json')
+        outputFilePath = os.path.join(directory, 'output.json')
+        with open(datasetFilePath, 'w', encoding='utf-8') as datasetFile:
+            json.dump(dataset, datasetFile)
+        with open(outputFilePath, 'w', encoding='utf-8') as outputFile:
+            json.dump(output, outputFile)
+        dataset = None
+        output = None
+
+        runs = [runPhases(datasetFilePath, outputFilePath, False) for _ in range(repeats)]
+        tracemalloc.start()
+        try:
+            memoryRun = runPhases(datasetFilePath, outputFilePath, True)
+        finally:
+            tracemalloc.stop()
+
+        return {
+            "parameters": parameters,
+            "inputSize": os.path.getsize(datasetFilePath) + os.path.getsize(outputFilePath),
+            "phases": {name: {"time": min(run[name]["time"] for run in runs), "peakMemory": memoryRun[name]["peakMemory"]} for name in memoryRun}
+        }
+
+def runBenchmark(names, repeats, scale, seed):
+    """
+    Runs the scenarios of the benchmark
+
+    Parameters
+    ----------
+    names : array
+        the names of the scenarios to run
+    repeats : int
+        the number of timed runs of every scenario
+    scale : float
+        the factor the number of studies of every scenario is multiplied by
+    seed : int
+        the seed of the synthetic inputs
+
+    Returns
+    -------
+    json object
+        The results of every scenario
+    """
+    # the metrics modules are imported before any phase is timed
+    for algorithmType in evaluations:
+        EvaluationFactory.getFactoryClass(algorithmType)
+
+    results = {}
+    for name in names:
+        parameters = dict(scenarios[name], studies=max(1, int(scenarios[name]["studies"] * scale)))
+        results[name] = runScenario(parameters, repeats, seed)
+    return results
+
+def getRegressions(results, baseline, tolerance):
+    """
+    Compares the results with a baseline, only the scenarios that were run with the same parameters are compared
+
+    Parameters
+    ----------
+    results : json object
+        the results of the benchmark
+    baseline : json object
+        the results of a previous run of the benchmark
+    tolerance : float
+        the relative increase of a time or peak memory allowed before it is considered a regression
+
+    Returns
+    -------
+    array
+        The description of every regression
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline or baseline[name]["parameters"] != result["parameters"]:
+            continue
+        for phase, measurements in result["phases"].items():
+            baselineMeasurements = baseline[name]["phases"].get(phase)
+            if baselineMeasurements is None:
+                continue
+            if measurements["time"] > max(baselineMeasurements["time"] * (1 + tolerance), baselineMeasurements["time"] + MINIMUM_TIME_CHANGE):
+                regressions.append('{0} {1} time went from {2:.3f}s to {3:.3f}s'.format(name, phase, baselineMeasurements["time"], measurements["time"]))
+            if measurements["peakMemory"] > max(baselineMeasurements["peakMemory"] * (1 + tolerance), baselineMeasurements["peakMemory"] + MINIMUM_MEMORY_CHANGE):
+                regressions.append('{0} {1} peak memory went from {2:.1f}MB to {3:.1f}MB'.format(name, phase, baselineMeasurements["peakMemory"] / 2**20, measurements["peakMemory"] / 2**20))
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='AI Lab Evaluation Metrics benchmark on synthetic inputs')
+    parser.add_argument("--scenarios", nargs="?", default=','.join(scenarios), help="string, the comma separated names of the scenarios to run, all of them by default: " + ', '.join(scenarios), type=str)
+    parser.add_argument("--repeats", nargs="?", default=3, help="int, the number of times every scenario runs", type=int)
+    parser.add_argument("--scale", nargs="?", default=1.0, help="float, the factor the number of studies of every scenario is multiplied by", type=float)
+    parser.add_argument("--seed", nargs="?", default=0, help="int, the seed of the synthetic inputs", type=int)
+    parser.add_argument("--baseline", nargs="?", default=None, help="string, the path to the results of a previous run to compare with, the benchmark fails if there are regressions", type=str)
+    parser.add_argument("--tolerance", nargs="?", default=0.25, help="float, the relative increase of a time or peak memory allowed before it is considered a regression", type=float)
+    parser.add_argument("--output", nargs="?", default=None, help="string, the path to save the results to", type=str)
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.scenarios.split(',') if len(name.strip()) > 0]
+    unknownNames = [name for name in names if name not in scenarios]
+    if len(unknownNames) > 0:
+        parser.error('unknown scenarios {0}'.format(', '.join(unknownNames)))
+
+    results = runBenchmark(names, args.repeats, args.scale, args.seed)
+    for name, result in results.items():
+        print('{0} ({1:.1f}MB of inputs)'.format(name, result["inputSize"] / 2**20))
+        for phase, measurements in result["phases"].items():
+            print('    {0:<26} {1:8.3f}s {2:10.1f}MB'.format(phase, measurements["time"], measurements["peakMemory"] / 2**20))
+
+    if args.output is not None:
+        with open(args.output, 'w', encoding='utf-8') as outputFile:
+            json.dump(results, outputFile, indent=4)
+
+    regressions = []
+    if args.baseline is not None:
+        with open(args.baseline) as baselineFile:
+            regressions = getRegressions(results, json.load(baselineFile), args.tolerance)
+
+    for regression in regressions:
+        print('REGRESSION:', regression, file=sys.stderr)
+    sys.exit(1 if len(regressions) > 0 else 0)
@@ -0,0 +1,131 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# the modules that are expensive to import, the cold start should only load the ones needed by the evaluated algorithm types
+HEAVY_MODULES = ["numpy", "scipy", "sklearn"]
+
+rootPath = os.path.realpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+# every scenario runs on a fresh interpreter: the import of the command line module alone and the evaluation of examples
+# that only have some of the algorithm types
+scenarios = {
+    "import": None,
+    "continuous": ("examples/PXS/dataset.json", "examples/PXS/modelOutput.json"),
+    "classification": ("examples/MGHChest/dataset.json", "examples/MGHChest/modelOutput.json"),
+    "classificationAndBoundingBox": ("examples/pneumoniaDetection/dataset.json", "examples/pneumoniaDetection/output.json")
+}
+
+# measured on the fresh interpreter, printed as json for the benchmark to read
+scenarioScript = """
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, 'src')
+import main
+imported = time.perf_counter()
+inputs = json.loads(sys.argv[1])
+if inputs is not None:
+    main.runEvaluation(main.getArgumentParser().parse_args(['--dataset_file_path', inputs[0], '--output_file_path', inputs[1], '--no_cache']))
+end = time.perf_counter()
+print(json.dumps({'importTime': imported - start, 'totalTime': end - start, 'heavyModules': [m for m in json.loads(sys.argv[2]) if m in sys.modules]}))
+"""
+
+def runScenario(inputs):
+    """
+    Runs a scenario on a fresh interpreter
+
+    Parameters
+    ----------
+    inputs : tuple
+        the paths of the dataset and output of the evaluation, None to only import the command line module
+
+    Returns
+    -------
+    json object
+        The import and total times in seconds and the heavy modules that were loaded
+    """
+    result = subprocess.run([sys.executable, '-c', scenarioScript, json.dumps(inputs), json.dumps(HEAVY_MODULES)], cwd=rootPath, capture_output=True, text=True, check=True)
+    # the evaluation prints its progress, the measurements are the last line
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def runBenchmark(repeats):
+    """
+    Runs every scenario a number of times keeping the fastest times, which are the least affected by the noise of the machine
+
+    Parameters
+    ----------
+    repeats : int
+        the number of times every scenario runs
+
+    Returns
+    -------
+    json object
+        The results of every scenario
+    """
+    results = {}
+    for name, inputs in scenarios.items():
+        runs = [runScenario(inputs) for _ in range(repeats)]
+        results[name] = {
+            "importTime": min(run["importTime"] for run in runs),
+            "totalTime": min(run["totalTime"] for run in runs),
+            "heavyModules": runs[0]["heavyModules"]
+        }
+    return results
+
+def getRegressions(results, baseline, tolerance):
+    """
+    Compares the results with a baseline
+
+    Parameters
+    ----------
+    results : json object
+        the results of the benchmark
+    baseline : json object
+        the results of a previous run of the benchmark
+    tolerance : float
+        the relative slow down allowed before a time is considered a regression
+
+    Returns
+    -------
+    array
+        The description of every regression
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for timeName in ["importTime", "totalTime"]:
+            if result[timeName] > baseline[name][timeName] * (1 + tolerance):
+                regressions.append('{0} {1} went from {2:.3f}s to {3:.3f}s'.format(name, timeName, baseline[name][timeName], result[timeName]))
+        newModules = set(result["heavyModules"]) - set(baseline[name]["heavyModules"])
+        if len(newModules) > 0:
+            regressions.append('{0} now loads {1}'.format(name, ', '.join(sorted(newModules))))
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='AI Lab Evaluation Metrics startup benchmark')
+    parser.add_argument("--repeats", nargs="?", default=5, help="int, the number of times every scenario runs", type=int)
+    parser.add_argument("--baseline", nargs="?", default=None, help="string, the path to the results of a previous run to compare with, the benchmark fails if there are regressions", type=str)
+    parser.add_argument("--tolerance", nargs="?", default=0.25, help="float, the relative slow down allowed before a time is considered a regression", type=float)
+    parser.add_argument("--output", nargs="?", default=None, help="string, the path to save the results to", type=str)
+    args = parser.parse_args()
+
+    results = runBenchmark(args.repeats)
+    for name, result in results.items():
+        print('{0:<30} import {1:.3f}s  total {2:.3f}s  heavy modules: {3}'.format(name, result["importTime"], result["totalTime"], ', '.join(result["heavyModules"]) or '-'))
+
+    if args.output is not None:
+        with open(args.output, 'w', encoding='utf-8') as outputFile:
+            json.dump(results, outputFile, indent=4)
+
+    # importing the command line module must never load the metrics dependencies
+    regressions = ['importing main loads {0}'.format(', '.join(results["import"]["heavyModules"]))] if len(results["import"]["heavyModules"]) > 0 else []
+    if args.baseline is not None:
+        with open(args.baseline) as baselineFile:
+            regressions.extend(getRegressions(results, json.load(baselineFile), args.tolerance))
+
+    for regression in regressions:
+        print('REGRESSION:', regression, file=sys.stderr)
+    sys.exit(1 if len(regressions) > 0 else 0)
@@ -0,0 +1,194 @@
+import argparse
+import json
+import os
+import random
+
+# the parameters of the generated inputs and their defaults
+DEFAULT_PARAMETERS = {
+    "studies": 100,
+    # the number of annotation keys of every algorithm type
+    "keys": 1,
+    # the number of labels of the classification keys, 2 is binary
+    "labels": 2,
+    # the depth of every study, the bounding boxes and segmentations are annotated on the instances and a classification on the frames
+    "series": 1,
+    "instances": 1,
+    "frames": 1,
+    # the number of ground truth bounding boxes of every study, spread over its instances
+    "boxes": 2,
+    # the number of ground truth segmented objects of every instance and the size of their masks
+    "segmentations": 1,
+    "segmentationSize": 256
+}
+
+def generateInputs(seed=0, **parameters):
+    """
+    Generates a dataset and the output of a model for it, with the ground truths and predictions of every algorithm type.
+    The same seed and parameters always generate the same inputs
+
+    Parameters
+    ----------
+    seed : int
+        the seed of the generator
+    parameters : dictionary
+        the parameters of DEFAULT_PARAMETERS to change
+
+    Returns
+    -------
+    tuple
+        The dataset json array and the output json object
+    """
+    unknownParameters = set(parameters) - set(DEFAULT_PARAMETERS)
+    if len(unknownParameters) > 0:
+        raise ValueError('unknown parameters {0}'.format(', '.join(sorted(unknownParameters))))
+    parameters = dict(DEFAULT_PARAMETERS, **parameters)
+    generator = random.Random(seed)
+    labels = [str(label) for label in range(parameters["labels"])]
+
+    dataset = []
+    studies = []
+    for s in range(parameters["studies"]):
+        studyUid = '1.2.840.{0}.{1}'.format(seed, s)
+        study = {"studyInstanceUid": studyUid, "annotationData": {"classification": [], "continuous": []}, "series": []}
+        studyOutput = {"studyInstanceUID": studyUid, "classificationOutput": [], "continuousOutput": [], "boundingBoxOutput": [], "segmentationOutput": []}
+        dataset.append(study)
+        studies.append(studyOutput)
+
+        for k in range(parameters["keys"]):
+            label = generator.choice(labels)
+            study["annotationData"]["classification"].append({"key": 'classification{0}'.format(k), "value": label})
+            studyOutput["classificationOutput"].append({"key": 'classification{0}'.format(k), "output": getClassificationOutput(generator, labels, label)})
+
+            value = round(generator.uniform(0, 100), 3)
+            study["annotationData"]["continuous"].append({"key": 'continuous{0}'.format(k), "value": value})
+            studyOutput["continuousOutput"].append({"key": 'continuous{0}'.format(k), "output": round(value + generator.gauss(0, 10), 3)})
+
+        instances = []
+        for se in range(parameters["series"]):
+            seriesUid = '{0}.{1}'.format(studyUid, se)
+            series = {"seriesInstanceUid": seriesUid, "annotationData": None, "instances": []}
+            study["series"].append(series)
+            for i in range(parameters["instances"]):
+                instanceUid = '{0}.{1}'.format(seriesUid, i)
+                instance = {"sopInstanceUid": instanceUid, "annotationData": {"boundingBox": [], "segmentation": []}, "frames": []}
+                series["instances"].append(instance)
+                instances.append((seriesUid, instance))
+
+                for f in range(parameters["frames"]):
+                    label = generator.choice(["0", "1"])
+                    instance["frames"].append({"frameIndex": f + 1, "annotationData": {"classification": [{"key": "frameClassification", "value": label}]}})
+                    studyOutput["classificationOutput"].append({"key": "frameClassification", "output": getClassificationOutput(generator, ["0", "1"], label), "seriesInstanceUID": seriesUid, "sopInstanceUID": instanceUid, "frameIndex": f + 1})
+
+        for k in range(parameters["keys"]):
+            addBoundingBoxes(generator, studyOutput, instances, 'boundingBox{0}'.format(k), parameters["boxes"])
+            # half of the segmentation keys are run length encoded masks and the other half polygons
+            addSegmentations(generator, studyOutput, instances, 'segmentation{0}'.format(k), parameters["segmentations"], parameters["segmentationSize"], k % 2 == 1)
+
+    return dataset, {"modelName": "synthetic", "studies": studies}
+
+def getClassificationOutput(generator, labels, label):
+    """
+    Generates the probabilities of the labels of a prediction, biased towards the ground truth label
+    """
+    weights = [generator.random() + (0.5 if candidate == label else 0) for candidate in labels]
+    total = sum(weights)
+    return {candidate: round(weight / total, 4) for candidate, weight in zip(labels, weights)}
+
+def addBoundingBoxes(generator, studyOutput, instances, key, boxCount):
+    """
+    Adds the ground truth bounding boxes of a key spread over the instances of a study and their jittered predictions,
+    with some missed boxes and some false positives
+    """
+    boxes = {instance["sopInstanceUid"]: [] for _, instance in instances}
+    instanceUids = list(boxes.keys())
+    for _ in range(boxCount):
+        x, y = generator.randint(0, 900), generator.randint(0, 900)
+        boxes[generator.choice(instanceUids)].append(getBox(x, y, x + generator.randint(5, 120), y + generator.randint(5, 120)))
+
+    for seriesUid, instance in instances:
+        groundTruths = boxes[instance["sopInstanceUid"]]
+        instance["annotationData"]["boundingBox"].append({"key": key, "value": groundTruths})
+        predictions = []
+        for box in groundTruths:
+            if generator.random() < 0.8:
+                topLeft, bottomRight = box["top_left_hand_corner"], box["bottom_right_hand_corner"]
+                predictions.append(getBox(max(0, topLeft["x"] + generator.randint(-10, 10)), max(0, topLeft["y"] + generator.randint(-10, 10)), bottomRight["x"] + generator.randint(-10, 10) + 12, bottomRight["y"] + generator.randint(-10, 10) + 12))
+        if generator.random() < 0.2:
+            x, y = generator.randint(0, 900), generator.randint(0, 900)
+            predictions.append(getBox(x, y, x + generator.randint(5, 120), y + generator.randint(5, 120)))
+        studyOutput["boundingBoxOutput"].append({"key": key, "output": predictions, "seriesInstanceUID": seriesUid, "sopInstanceUID": instance["sopInstanceUid"]})
+
+def getBox(left, top, right, bottom):
+    return {"top_left_hand_corner": {"x": left, "y": top}, "bottom_right_hand_corner": {"x": right, "y": bottom}}
+
+def addSegmentations(generator, studyOutput, instances, key, objectCount, size, polygons):
+    """
+    Adds the ground truth segmentations of a key to every instance of a study and their jittered predictions, the objects
+    are rectangles so their masks can be encoded without decoding any pixels
+    """
+    for seriesUid, instance in instances:
+        groundTruths = []
+        predictions = []
+        for _ in range(generator.randint(0, objectCount)):
+            width, height = generator.randint(2, size // 4), generator.randint(2, size // 4)
+            left, top = generator.randint(0, size - width), generator.randint(0, size - height)
+            groundTruths.append(getSegmentation(size, left, top, width, height, polygons))
+            if generator.random() < 0.8:
+                dx, dy = generator.randint(-3, 3), generator.randint(-3, 3)
+                predictions.append(getSegmentation(size, min(max(left + dx, 0), size - width), min(max(top + dy, 0), size - height), width, height, polygons))
+        instance["annotationData"]["segmentation"].append({"key": key, "value": groundTruths})
+        studyOutput["segmentationOutput"].append({"key": key, "output": predictions, "seriesInstanceUID": seriesUid, "sopInstanceUID": instance["sopInstanceUid"]})
+
+def getSegmentation(size, left, top, width, height, polygon):
+    """
+    Gets the segmentation of a rectangle of a size x size frame, as a polygon or run length encoded
+    """
+    if polygon:
+        return {"polygon": {"size": [size, size], "points": [[left, top], [left + width, top], [left + width, top + height], [left, top + height]]}}
+    # a background run before the first row, then a foreground run for every row with the background between the rows
+    counts = [top * size + left]
+    for _ in range(height - 1):
+        counts.extend([width, size - width])
+    counts.append(width)
+    return {"rle": {"size": [size, size], "counts": counts}}
+
+def writeInputs(directory, seed=0, **parameters):
+    """
+    Writes the generated dataset.json and output.json files to a directory
+
+    Parameters
+    ----------
+    directory : string
+        the path of the directory, it is created if it doesn't exist
+    seed : int
+        the seed of the generator
+    parameters : dictionary
+        the parameters of DEFAULT_PARAMETERS to change
+
+    Returns
+    -------
+    tuple
+        The paths of the dataset and output files
+    """
+    dataset, output = generateInputs(seed, **parameters)
+    os.makedirs(directory, exist_ok=True)
+    datasetFilePath = os.path.join(directory, 'dataset.json')
+    outputFilePath = os.path.join(directory, 'output.json')
+    with open(datasetFilePath, 'w', encoding='utf-8') as datasetFile:
+        json.dump(dataset, datasetFile)
+    with open(outputFilePath, 'w', encoding='utf-8') as outputFile:
+        json.dump(output, outputFile)
+    return datasetFilePath, outputFilePath
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generates a synthetic dataset.json and output.json')
+    parser.add_argument("--directory", nargs="?", default=None, help="string, the path of the directory to write the files to", type=str)
+    parser.add_argument("--seed", nargs="?", default=0, help="int, the seed of the generator", type=int)
+    for name, default in DEFAULT_PARAMETERS.items():
+        parser.add_argument('--' + name, nargs="?", default=default, type=type(default))
+    args = vars(parser.parse_args())
+
+    directory = args.pop("directory")
+    if directory is None:
+        parser.error("the directory is required")
+    print('\n'.join(writeInputs(directory, args.pop("seed"), **args)))
@@ -0,0 +1,282 @@
+import argparse
+import sys
+import os
+import json
+import traceback
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from main import securePath, serializeEvaluation
+from evaluationFactory import EvaluationFactory
+from utils.jsonStream import JsonArrayStream
+from utils.studyIndex import StudyIndex
+from utils.data import parseThresholds
+
+# the index of the ground truths shared by the evaluations of every model, set once on every worker process
+datasetIndex = None
+
+def initializeWorker(index):
+    global datasetIndex
+    datasetIndex = index
+
+def readManifest(manifestFilePath):
+    """
+    Reads the manifest of the models of a batch evaluation
+
+    Parameters
+    ----------
+    manifestFilePath : string
+        the path to the manifest json file, an array in the form of
+        [
+          {
+            "name": "...",
+            "output_file_path": "...",
+            "evaluation_file_path": "..."
+          }
+        ]
+
+    Returns
+    -------
+    array
+        The models of the manifest
+    """
+    with open(manifestFilePath) as manifestFile:
+        manifest = json.load(manifestFile)
+    if not isinstance(manifest, list):
+        raise ValueError("the manifest must be a json array of models")
+
+    names = set()
+    for model in manifest:
+        if not isinstance(model, dict) or "output_file_path" not in model or "evaluation_file_path" not in model:
+            raise ValueError("every model of the manifest must have an output_file_path and an evaluation_file_path")
+        model.setdefault("name", os.path.splitext(os.path.basename(model["output_file_path"]))[0])
+        if model["name"] in names:
+            raise ValueError('the model name {0} is repeated in the manifest'.format(model["name"]))
+        names.add(model["name"])
+        #path transversal mitigation
+        securePath(model["output_file_path"])
+        securePath(model["evaluation_file_path"])
+    return manifest
+
+def loadDatasetIndex(datasetFilePath, stream):
+    """
+    Creates the index of the ground truths of the dataset
+
+    Parameters
+    ----------
+    datasetFilePath : string
+        the path to the ground truth json file
+    stream : bool
+        parse the dataset one study at a time
+
+    Returns
+    -------
+    StudyIndex
+        The index of the ground truths, without any output
+    """
+    if not os.path.exists(datasetFilePath):
+        raise Exception('The dataset json file {0} does not exist'.format(datasetFilePath))
+
+    if stream:
+        return StudyIndex.fromDataset(JsonArrayStream(datasetFilePath))
+    with open(datasetFilePath) as datasetFile:
+        return StudyIndex.fromDataset(json.load(datasetFile))
+
+def evaluateModel(model, threshold, binaryMaps, stream, bootstrapResamples, bootstrapSeed, sweepThresholds=None, curvePoints=None, compact=False, segmentationChunkSize=None, datasetDirectory=None):
+    """
+    Evaluates the output of a model against the shared index of the ground truths and writes its evaluation file
+
+    Parameters
+    ----------
+    model : json object
+        the model of the manifest
+    threshold : float
+        the threshold of the evaluation for binary classification
+    binaryMaps : dictionary
+        the json object of the binary maps for evaluations
+    stream : bool
+        parse the output one study at a time
+    bootstrapResamples : int
+        the number of bootstrap resamples of the confidence intervals, 0 to disable them
+    bootstrapSeed : int
+        the seed of the bootstrap resamples
+    sweepThresholds : array
+        optional thresholds to add the binary classification metrics at every one of them to the evaluation
+    curvePoints : int
+        optional maximum number of points of the ROC and precision-recall curves
+    compact : bool
+        write the evaluation without any whitespace
+    segmentationChunkSize : int
+        optional maximum number of voxels of every segmentation mask read at a time
+    datasetDirectory : string
+        the directory of the dataset json file, the paths of the .npy masks of the ground truths are relative to it
+
+    Returns
+    -------
+    json object
+        The summary of the evaluation of the model
+    """
+    if not os.path.exists(model["output_file_path"]):
+        raise Exception('The output json file {0} does not exist'.format(model["output_file_path"]))
+
+    if stream:
+        output = {"studies": JsonArrayStream(model["output_file_path"], "studies")}
+    else:
+        with open(model["output_file_path"]) as outputJsonFile:
+            output = json.load(outputJsonFile)
+
+    index = datasetIndex.withOutput(output)
+    output = None
+
+    bootstrap = EvaluationFactory.getBootstrap(bootstrapResamples, bootstrapSeed)
+    evaluation = EvaluationFactory.fromIndex(index, threshold, binaryMaps, bootstrap=bootstrap, sweepThresholds=sweepThresholds, curvePoints=curvePoints, segmentationChunkSize=segmentationChunkSize, datasetDirectory=datasetDirectory, outputDirectory=os.path.dirname(os.path.realpath(model["output_file_path"]))).Create()
+
+    with open(model["evaluation_file_path"], 'w', encoding='utf-8') as f:
+        f.write(serializeEvaluation(evaluation, compact))
+
+    return getEvaluationSummary(evaluation)
+
+def getEvaluationSummary(evaluation):
+    """
+    Creates the summary of an evaluation with the number of unknowns and failures and the scalar metrics of every key
+
+    Parameters
+    ----------
+    evaluation : json object
+        the evaluation
+
+    Returns
+    -------
+    json object
+        The summary in the form of
+        {
+          algorithmType: {
+              key: {
+                  "unknowns": int,
+                  "failures": int,
+                  "metrics": { metric: value } // only the numeric metrics, the curves and matrices are left out
+              }
+          }
+        }
+    """
+    summary = {}
+    for algorithmType, keyEvaluations in evaluation.items():
+        summary[algorithmType] = {}
+        # the algorithm types without predictions have no evaluation
+        for keyEvaluation in keyEvaluations or []:
+            output = keyEvaluation.get("output") or {}
+            summary[algorithmType][keyEvaluation["key"]] = {
+                "unknowns": len(keyEvaluation.get("unknowns", [])),
+                "failures": len(keyEvaluation.get("failures", [])),
+                "metrics": getScalarMetrics(output)
+            }
+    return summary
+
+def getScalarMetrics(output):
+    """
+    Gets the numeric metrics of the output of a key, including the ones grouped in metrics objects (i.e. "generalMetrics")
+
+    Parameters
+    ----------
+    output : json object
+        the output of the evaluation of a key
+
+    Returns
+    -------
+    dictionary
+        The numeric metrics, the curves, plots and matrices are left out
+    """
+    metrics = {}
+    for name, value in output.items():
+        if isinstance(value, dict) and name.endswith("Metrics"):
+            metrics.update(getScalarMetrics(value))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            metrics[name] = value
+    return metrics
+
+def runBatch(args, models):
+    """
+    Evaluates every model of the manifest against the dataset, the ground truths are indexed a single time for all of them
+
+    Parameters
+    ----------
+    args : arguments
+        the arguments of the batch evaluation, with the binary maps already deserialized
+    models : array
+        the models of the manifest
+
+    Returns
+    -------
+    json object
+        The combined summary of the evaluations of every model, the models that could not be evaluated have their error instead
+    """
+    global datasetIndex
+    datasetIndex = loadDatasetIndex(args.dataset_file_path, args.stream)
+    evaluationArgs = (args.threshold, args.binary_maps, args.stream, args.bootstrap_resamples, args.bootstrap_seed, parseThresholds(args.threshold_sweep), args.curve_points, args.compact, args.segmentation_chunk_size, os.path.dirname(os.path.realpath(args.dataset_file_path)))
+
+    results = {}
+    if args.workers is not None and args.workers > 1 and len(models) > 1:
+        # every worker receives the index of the ground truths once, when it starts
+        with ProcessPoolExecutor(max_workers=min(args.workers, len(models)), initializer=initializeWorker, initargs=(datasetIndex,)) as executor:
+            futures = {model["name"]: executor.submit(evaluateModel, model, *evaluationArgs) for model in models}
+            for model in models:
+                results[model["name"]] = getModelResult(model, futures[model["name"]].result)
+    else:
+        for model in models:
+            results[model["name"]] = getModelResult(model, lambda: evaluateModel(model, *evaluationArgs))
+
+    return {"models": results}
+
+def getModelResult(model, evaluate):
+    print("Evaluating model", model["name"])
+    try:
+        return {"status": "ok", "evaluationFilePath": model["evaluation_file_path"], "summary": evaluate()}
+    except Exception as err:
+        print(err, file=sys.stderr)
+        traceback.print_exc()
+        return {"status": "error", "error": str(err)}
+
+if __name__ == '__main__':
+    # needed for the process pools of the frozen executable
+    multiprocessing.freeze_support()
+
+    parser = argparse.ArgumentParser(description='AI Lab Evaluation Metrics for many models of the same dataset')
+    parser.add_argument("--dataset_file_path",nargs="?", default=None, help="string, the path to the ground truth json file", type=str)
+    parser.add_argument("--manifest_file_path",nargs="?", default=None, help="string, the path to the json array of the models to evaluate, each with its name, output_file_path and evaluation_file_path", type=str)
+    parser.add_argument("--summary_file_path",nargs="?", default=None, help="string, the path to the combined summary of the evaluations of every model", type=str)
+    parser.add_argument("--threshold", nargs="?", default=0.5, help="float, the threshold of the evaluation for binary classification", type=float)
+    parser.add_argument("--binary_maps", nargs="?", default=None, help="string, the serialized json object of the binary maps for evaluations", type=str)
+    parser.add_argument("--threshold_sweep", nargs="?", default=None, help="string, the thresholds to add the binary classification metrics at to the evaluation, either comma separated (0.1,0.3,0.5) or a start:stop:step range (0.05:0.95:0.05)", type=str)
+    parser.add_argument("--curve_points", nargs="?", default=None, help="int, the maximum number of points of the ROC and precision-recall curves, keeping the convex hull of the ROC curve and the point of the threshold", type=int)
+    parser.add_argument("--segmentation_chunk_size", nargs="?", default=None, help="int, the maximum number of voxels of every segmentation mask stored in a .npy file read at a time", type=int)
+    parser.add_argument('--compact', dest='compact', action='store_true', help="flag, write the evaluations and summary without indentation or spaces to reduce their size")
+    parser.add_argument('--stream', dest='stream', action='store_true', help="flag, parse the dataset and output json files one study at a time to reduce memory usage on large files")
+    parser.add_argument("--workers", nargs="?", default=1, help="int, the number of models evaluated in parallel", type=int)
+    parser.add_argument("--bootstrap_resamples", nargs="?", default=0, help="int, the number of bootstrap resamples used to add 95% confidence intervals to the metrics, 0 to disable them", type=int)
+    parser.add_argument("--bootstrap_seed", nargs="?", default=0, help="int, the seed of the bootstrap resamples", type=int)
+    args = parser.parse_args()
+
+    #path transversal mitigation
+    securePath(args.dataset_file_path)
+    securePath(args.manifest_file_path)
+    if args.summary_file_path is not None:
+        securePath(args.summary_file_path)
+
+    if(args.binary_maps != None):
+        args.binary_maps = json.loads(args.binary_maps)
+
+    try:
+        summary = runBatch(args, readManifest(args.manifest_file_path))
+        if args.summary_file_path is not None and len(args.summary_file_path) > 0:
+            with open(args.summary_file_path, 'w', encoding='utf-8') as f:
+                f.write(serializeEvaluation(summary, args.compact))
+        else:
+            print('OUTPUT', json.dumps(summary, indent=4, sort_keys=True))
+    except Exception as err:
+        print(err, file=sys.stderr)
+        traceback.print_exc()
+        sys.exit(1)
+
+    # the batch fails when any of the models could not be evaluated
+    if any(result["status"] != "ok" for result in summary["models"].values()):
+        sys.exit(1)
@@ -1,12 +1,15 @@
 import json
 import sys
 import os.path
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
-from factories.clasification import ClassificationEvaluationFactory
-from factories.continuous import ContinuousEvaluationFactory
-from factories.boundingBox import BoundingBoxEvaluationFactory
-from factories.segmentation import SegmentationEvaluationFactory
+from factories.base import MetricsFactory
 from utils.binaryMap import BinaryClassificationMap
+from utils.jsonStream import JsonArrayStream
+from utils.studyIndex import StudyIndex
+from utils.studyCache import StudyCache
+from utils.data import parseThresholds
+from utils.profiler import span, isProfiling, stopProfiling
 
 class EvaluationFactory:
     """
@@ -19,17 +22,50 @@ class EvaluationFactory:
     args : arguments
         the arguments obtained from running the python script
     """
+
+    # the algorithm types of the evaluation and their identifying keys in the output json object
+    algorithmTypes = {
+        "classification": "classificationOutput",
+        "continuous": "continuousOutput",
+        "boundingBox": "boundingBoxOutput",
+        "segmentation": "segmentationOutput"
+    }
+
+    # the modules of the sub factories of every algorithm type. They are only imported when the output has that algorithm
+    # type, so the dependencies of the metrics (numpy, sklearn...) are not loaded unless they are needed
+    factoryModules = {
+        "classification": "factories.clasification",
+        "continuous": "factories.continuous",
+        "boundingBox": "factories.boundingBox",
+        "segmentation": "factories.segmentation"
+    }
+
     def __init__(self, args):
 
 
         if not os.path.exists(args.dataset_file_path):
             raise Exception('The dataset json file {0} does not exist'.format(args.dataset_file_path))
-        with open(args.dataset_file_path) as datasetFile:
-            self.dataset = json.load(datasetFile)
         if not os.path.exists(args.output_file_path):
             raise Exception('The output json file {0} does not exist'.format(args.output_file_path))
-        with open(args.output_file_path) as outputJsonFile:
-            self.output = json.load(outputJsonFile) 
+
+        # when streaming, the files are parsed while they are indexed so the load only opens them
+        with span("jsonLoad", stream=bool(args.stream)):
+            if args.stream:
+                # walk the study arrays one element at a time instead of holding the whole json documents in memory
+                dataset = JsonArrayStream(args.dataset_file_path)
+                output = {"studies": JsonArrayStream(args.output_file_path, "studies")}
+            else:
+                with open(args.dataset_file_path) as datasetFile:
+                    dataset = json.load(datasetFile)
+                with open(args.output_file_path) as outputJsonFile:
+                    output = json.load(outputJsonFile)
+
+        # walk the dataset and output a single time for all the algorithm types, the json documents
+        # are not referenced after this so they can be released while the metrics are calculated
+        with span("indexBuild"):
+            index = StudyIndex(dataset, output)
+        dataset = None
+        output = None
 
         if args.use_cache and args.evaluation_file_path is not None and len(args.evaluation_file_path) > 0 and os.path.isfile(args.evaluation_file_path) and os.stat(args.evaluation_file_path).st_size > 0:
             with open(args.evaluation_file_path) as previousEvaluationFile:
@@ -37,22 +73,195 @@ class EvaluationFactory:
         else:
             self.previousEvaluation = None
 
-        binaryMaps = None if args.binary_maps is None else {k:BinaryClassificationMap(v["presentLabels"], v["absentLabels"]) for (k,v) in args.binary_maps.items()}
-        self.classificationFactory = ClassificationEvaluationFactory(self.dataset, self.output, args.threshold, binaryMaps)
-        self.continuousFactory = ContinuousEvaluationFactory(self.dataset, self.output)
-        self.boundingBoxFactory = BoundingBoxEvaluationFactory(self.dataset, self.output, None if self.previousEvaluation is None else self.previousEvaluation["boundingBox"])
-        self.segmentationFactory = SegmentationEvaluationFactory(self.dataset, self.output)
+        bootstrap = EvaluationFactory.getBootstrap(args.bootstrap_resamples, args.bootstrap_seed)
+        studyCache = StudyCache.load(args.study_cache_path) if args.study_cache_path is not None else None
+        # the paths of the .npy masks are relative to the json file that references them
+        datasetDirectory = os.path.dirname(os.path.realpath(args.dataset_file_path))
+        outputDirectory = os.path.dirname(os.path.realpath(args.output_file_path))
+        self.initialize(index, args.threshold, args.binary_maps, self.previousEvaluation, args.workers, bootstrap, studyCache, parseThresholds(args.threshold_sweep), args.curve_points, args.segmentation_chunk_size, datasetDirectory, outputDirectory)
+
+    @classmethod
+    def fromIndex(cls, index, threshold, binary_maps, previousEvaluation=None, workers=1, bootstrap=None, studyCache=None, sweepThresholds=None, curvePoints=None, segmentationChunkSize=None, datasetDirectory=None, outputDirectory=None):
+        """
+        Creates the factory for an already built study index instead of the arguments of the python script
+
+        Parameters
+        ----------
+        index : StudyIndex
+            the index of the dataset and output
+        threshold : float
+            the threshold of the evaluation for binary classification
+        binary_maps : dictionary
+            the json object of the binary maps for evaluations
+        previousEvaluation : json object
+            optional previous evaluation to reuse the bounding box areas from
+        workers : int
+            the number of processes used to evaluate the annotation keys in parallel
+        bootstrap : Bootstrap
+            optional bootstrap to add the confidence intervals of the metrics to the evaluation
+        studyCache : StudyCache
+            optional cache of the per-study partial results to only calculate the studies that changed since the last run
+        sweepThresholds : array
+            optional thresholds to add the binary classification metrics at every one of them to the evaluation
+        curvePoints : int
+            optional maximum number of points of the ROC and precision-recall curves
+        segmentationChunkSize : int
+            optional maximum number of voxels of every segmentation mask read at a time
+        datasetDirectory : string
+            the directory of the dataset json file, the .npy masks of the ground truths are read relative to it. The .npy
+            masks can't be evaluated without it
+        outputDirectory : string
+            the directory of the output json file, the .npy masks of the predictions are read relative to it
+        """
+        factory = cls.__new__(cls)
+        factory.previousEvaluation = previousEvaluation
+        factory.initialize(index, threshold, binary_maps, previousEvaluation, workers, bootstrap, studyCache, sweepThresholds, curvePoints, segmentationChunkSize, datasetDirectory, outputDirectory)
+        return factory
+
+    def initialize(self, index, threshold, binary_maps, previousEvaluation, workers, bootstrap=None, studyCache=None, sweepThresholds=None, curvePoints=None, segmentationChunkSize=None, datasetDirectory=None, outputDirectory=None):
+        self.index = index
+        self.threshold = threshold
+        self.binaryMaps = None if binary_maps is None else {k:BinaryClassificationMap(v["presentLabels"], v["absentLabels"]) for (k,v) in binary_maps.items()}
+        self.previousBoundingBoxEvaluation = None if previousEvaluation is None else previousEvaluation["boundingBox"]
+        self.workers = workers
+        self.bootstrap = bootstrap
+        self.studyCache = studyCache
+        self.sweepThresholds = sweepThresholds
+        self.curvePoints = curvePoints
+        self.segmentationChunkSize = segmentationChunkSize
+        self.datasetDirectory = datasetDirectory
+        self.outputDirectory = outputDirectory
+
+    @staticmethod
+    def getBootstrap(resamples, seed=0):
+        """
+        Creates the bootstrap of the confidence intervals, importing it only when the intervals are requested
+
+        Parameters
+        ----------
+        resamples : int
+            the number of bootstrap resamples, 0 to disable the confidence intervals
+        seed : int
+            the seed of the bootstrap resamples
+
+        Returns
+        -------
+        Bootstrap
+            The bootstrap, None if the confidence intervals are disabled
+        """
+        if resamples is None or resamples <= 0:
+            return None
+        from utils.bootstrap import Bootstrap
+        return Bootstrap(resamples, seed)
+
+    @staticmethod
+    def getFactoryClass(algorithmType):
+        """
+        Imports the sub factory class of an algorithm type. The imports are static so the executable built by PyInstaller
+        from main.py finds and bundles the modules of the metrics
+
+        Parameters
+        ----------
+        algorithmType : string
+            the algorithm type key of the evaluation (i.e. "classification")
 
-    def Create(self):   
+        Returns
+        -------
+        class
+            The sub factory class
         """
-        Creates the evaluation
+        if algorithmType == "classification":
+            from factories.clasification import ClassificationEvaluationFactory
+            return ClassificationEvaluationFactory
+        if algorithmType == "continuous":
+            from factories.continuous import ContinuousEvaluationFactory
+            return ContinuousEvaluationFactory
+        if algorithmType == "boundingBox":
+            from factories.boundingBox import BoundingBoxEvaluationFactory
+            return BoundingBoxEvaluationFactory
+        if algorithmType == "segmentation":
+            from factories.segmentation import SegmentationEvaluationFactory
+            return SegmentationEvaluationFactory
+        raise ValueError('unknown algorithm type {0}'.format(algorithmType))
+
+    def getFactory(self, algorithmType):
+        """
+        Creates the sub factory of an algorithm type
+
+        Parameters
+        ----------
+        algorithmType : string
+            the algorithm type key of the evaluation (i.e. "classification")
+
+        Returns
+        -------
+        MetricsFactory
+            The sub factory
+        """
+        # without outputs there is nothing to evaluate, the base factory gives the same empty evaluation without importing the metrics
+        if not self.index.getOutputs(self.algorithmTypes[algorithmType]):
+            return MetricsFactory(self.index, algorithmType, self.algorithmTypes[algorithmType])
+
+        # the metrics modules are imported the first time, which is slow for the ones that load sklearn
+        with span("import", algorithmType=algorithmType):
+            factoryClass = EvaluationFactory.getFactoryClass(algorithmType)
+        with span("factory", algorithmType=algorithmType):
+            if algorithmType == "classification":
+                return factoryClass(self.index, self.threshold, self.binaryMaps, self.bootstrap, self.sweepThresholds, self.curvePoints)
+            if algorithmType == "continuous":
+                return factoryClass(self.index, self.bootstrap)
+            if algorithmType == "boundingBox":
+                return factoryClass(self.index, self.previousBoundingBoxEvaluation, self.bootstrap, self.studyCache)
+            if algorithmType == "segmentation":
+                return factoryClass(self.index, self.bootstrap, self.segmentationChunkSize, self.datasetDirectory, self.outputDirectory, self.studyCache)
+            return factoryClass(self.index)
+
+    def Create(self):
+        """
+        Creates the evaluation. The algorithm types are independent so their factories are built and evaluated concurrently,
+        on threads when everything runs in this process or submitting the keys of every type to a shared process pool when
+        more than one worker was requested
+        """
+
+        # only the algorithm types that have outputs will do any real work
+        busyTypes = [algorithmType for algorithmType, outputTypeKey in self.algorithmTypes.items() if self.index.getOutputs(outputTypeKey)]
+
+        if self.workers is not None and self.workers > 1:
+            # the forked workers don't keep profiling, the keys evaluated on them are only profiled as a whole by the pool span
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=stopProfiling) as executor:
+                factories = self.runConcurrently(self.getFactory, busyTypes)
+                with span("pool", workers=self.workers):
+                    # submit the keys of every algorithm type before waiting on any of them so they all share the pool
+                    submitted = {algorithmType: factories[algorithmType].Submit(executor) for algorithmType in self.algorithmTypes}
+                    return {algorithmType: factories[algorithmType].resolveEvaluations(evaluations) for algorithmType, evaluations in submitted.items()}
+
+        return self.runConcurrently(self.createEvaluation, busyTypes)
+
+    def createEvaluation(self, algorithmType):
+        with span("evaluation", algorithmType=algorithmType):
+            return self.getFactory(algorithmType).Create()
+
+    def runConcurrently(self, function, busyTypes):
+        """
+        Runs a function for every algorithm type, running the busy types on a thread pool when there are more than one of them
+
+        Parameters
+        ----------
+        function : function
+            the function to run with the algorithm type as its only argument
+        busyTypes : array
+            the algorithm types that have outputs to evaluate
+
+        Returns
+        -------
+        dictionary
+            The results of the function with the algorithm types as keys, in the order of the algorithm types
         """
-        
-        evaluation = {
-            "classification": self.classificationFactory.Create(),
-            "continuous": self.continuousFactory.Create(),
-            "boundingBox": self.boundingBoxFactory.Create(),
-            "segmentation": self.segmentationFactory.Create()
-        }
-        return evaluation
+        results = {}
+        # the profiled evaluations run the algorithm types one after the other, so the memory of every span only belongs to it
+        if len(busyTypes) > 1 and not isProfiling():
+            with ThreadPoolExecutor(max_workers=len(busyTypes)) as executor:
+                futures = {algorithmType: executor.submit(function, algorithmType) for algorithmType in busyTypes}
+                results = {algorithmType: future.result() for algorithmType, future in futures.items()}
 
+        return {algorithmType: results[algorithmType] if algorithmType in results else function(algorithmType) for algorithmType in self.algorithmTypes}
@@ -1,41 +1,115 @@
 
 from utils.data import getDicomIndexDictionary, getValuesIndexDictionary
-from utils.boundingBox import BoundingBox
+from utils.boundingBox import BoxArray, getCoverageAreas
+from utils.studyCache import getStudyFingerprint
 import numpy as np
 
-import time
+# the iou thresholds the average precision of every study is calculated with
+AVERAGE_PRECISION_THRESHOLDS = [0.35, 0.4, 0.45, 0.5, 0.55, 0.6, 0.65, 0.7, 0.75]
 
-def st_time(func):
+def BoundingBoxEvaluation(key, groundTruths, predictions, previousEvaluation, bootstrap=None):
     """
-        st decorator to calculate the total time of a func
+    Calculates the bounding box evaluation
+
+    Parameters
+    ----------
+    groundTruths : dictionary
+        dictionary having granularity id as keys and an array of bounding boxes as values
+    predictions : dictionary
+        dictionary having granularity id as keys and an array of bounding boxes as values
+    previousEvaluation : json object
+        optional previous evaluation of the key to reuse the area metrics from
+    bootstrap : Bootstrap
+        optional bootstrap to calculate the confidence intervals of the metrics with
+    Returns
+    -------
+    json object
+        The evaluation
+
     """
+    gtsClean, predsClean = getStudyBoxes(groundTruths, predictions)
 
-    def st_func(*args, **keyArgs):
-        t1 = time.time()
-        r = func(*args, **keyArgs)
-        t2 = time.time()
-        print("Function=%s, Time=%s" % (func.__name__, t2 - t1))
-        return r
+    # build the boxes of all the studies in one batch, one group of boxes per study
+    gts = BoxArray.fromJsonData(gtsClean)
+    preds = BoxArray.fromJsonData(predsClean)
+    
+    #if we have no valid studies to compare
+    if gts.getGroupCount() <= 0:
+        return None
+
+    if previousEvaluation is None:
+        return getMetricsFromStudyPartials(key, getStudyPartials(gts, preds), bootstrap)
 
-    return st_func
+    averagePrecisions = getAveragePrecisions(gts, preds)
+    metrics = {
+        "meanAveragePrecision": np.mean(np.array(averagePrecisions)),
+        "meanDiceCoefficient": previousEvaluation["meanDiceCoefficient"],
+        "meanIntersectionOverUnion": previousEvaluation["meanIntersectionOverUnion"],
+        "scatterPlot": previousEvaluation["scatterPlot"]
+    }
+    if bootstrap is not None:
+        metrics["confidenceIntervals"] = {
+            "meanAveragePrecision": bootstrap.getMeanInterval(averagePrecisions),
+            "meanDiceCoefficient": None,
+            "meanIntersectionOverUnion": None
+        }
+    return metrics
 
-def BoundingBoxEvaluation(key, groundTruths, predictions, previousEvaluation):
+def IncrementalBoundingBoxEvaluation(key, groundTruths, predictions, cachedPartials, bootstrap=None):
     """
-    Calculates the bounding box evaluation
+    Calculates the bounding box evaluation reusing the partial results of the studies that were already calculated
 
     Parameters
     ----------
     groundTruths : dictionary
-        dictionary having granularity hash as keys and an array of bounding boxes as values
+        dictionary having granularity id as keys and an array of bounding boxes as values
     predictions : dictionary
-        dictionary having granularity hash as keys and an array of bounding boxes as values
+        dictionary having granularity id as keys and an array of bounding boxes as values
+    cachedPartials : dictionary
+        dictionary having the study fingerprints as keys and their partial results as given by getStudyPartials as values
+    bootstrap : Bootstrap
+        optional bootstrap to calculate the confidence intervals of the metrics with
     Returns
     -------
-    json object
-        The evaluation
+    tuple
+        The evaluation and the partial results of the studies of the evaluation with their fingerprints as keys
 
     """
+    gtsClean, predsClean = getStudyBoxes(groundTruths, predictions)
+
+    #if we have no valid studies to compare
+    if len(gtsClean) <= 0:
+        return None, {}
 
+    fingerprints = [getStudyFingerprint(gtsClean[i], predsClean[i]) for i in range(len(gtsClean))]
+
+    # only the changed or new studies are calculated
+    partials = {fingerprint: cachedPartials[fingerprint] for fingerprint in fingerprints if fingerprint in cachedPartials}
+    missing = [i for i in range(len(fingerprints)) if fingerprints[i] not in partials]
+    if len(missing) > 0:
+        gts = BoxArray.fromJsonData([gtsClean[i] for i in missing])
+        preds = BoxArray.fromJsonData([predsClean[i] for i in missing])
+        for i, partial in zip(missing, getStudyPartials(gts, preds)):
+            partials[fingerprints[i]] = partial
+
+    return getMetricsFromStudyPartials(key, [partials[fingerprint] for fingerprint in fingerprints], bootstrap), partials
+
+def getStudyBoxes(groundTruths, predictions):
+    """
+    Aligns the bounding boxes of the ground truths and predictions of every study, excluding the true negatives
+
+    Parameters
+    ----------
+    groundTruths : dictionary
+        dictionary having granularity id as keys and an array of bounding boxes as values
+    predictions : dictionary
+        dictionary having granularity id as keys and an array of bounding boxes as values
+    Returns
+    -------
+    tuple
+        the arrays with the ground truth boxes and the predicted boxes of every study
+
+    """
     studyIndexDictionary = getDicomIndexDictionary(groundTruths, predictions)
     
     # arrays with the values only, no studyuids
@@ -60,159 +134,214 @@ def BoundingBoxEvaluation(key, groundTruths, predictions, previousEvaluation):
         if (gts[i] is None or len(gts[i]) == 0) and (preds[i] is None or len(predBoxes) == 0):
             continue
 
-        if gts[i] is None:
-            gtsClean.append([])
-        else:
-            gtsClean.append([BoundingBox.fromJsonData(gt) for gt in gts[i]])
+        gtsClean.append([] if gts[i] is None else gts[i])
+        predsClean.append(predBoxes)
 
-        if predBoxes is None or len(predBoxes) <= 0:
-            predsClean.append([])
-        else:
-            predsClean.append([BoundingBox.fromJsonData(pred) for pred in predBoxes])
+    return gtsClean, predsClean
 
-    gts = gtsClean
-    preds = predsClean
-    
-    #if we have no valid studies to compare
-    if len(gts) <= 0:
-        return None
-    
-    metrics = {
-        "meanAveragePrecision": getMeanAveragePrecision(gts, preds)
-    }
+def getStudyPartials(gts, preds):
+    """
+    Calculates the partial results of every study from which the metrics are aggregated
 
-    if previousEvaluation is not None:
-        metrics["meanDiceCoefficient"] = previousEvaluation["meanDiceCoefficient"]
-        metrics["meanIntersectionOverUnion"] = previousEvaluation["meanIntersectionOverUnion"]
-        metrics["scatterPlot"] = previousEvaluation["scatterPlot"]
-    else:
-        # calculate the metrics that aggregate the bounding box areas as one total area
-        # (meanDiceCoefficient, scatterPlot, and meanIntersectionOverUnion)
-        dices = []
-        ious = []
-        scatterPlot = []
-        for i in range(len(gts)):
-            gtBoxes = gts[i]
-            predBoxes = preds[i]
-
-            #get the dimensions of our area maps
-            maxX = max(box.bottomRight.x for box in (gtBoxes + predBoxes)) + 1
-            maxY = max(box.bottomRight.y for box in (gtBoxes + predBoxes)) + 1
-
-            # cook our area maps with the areas of our boxes
-            gtMap   = np.zeros((maxY, maxX), dtype=int)
-            predMap = np.zeros((maxY, maxX), dtype=int)
-            # +1 accounts for pixel space
-            for box in gtBoxes:
-                gtMap  [box.topLeft.y:box.bottomRight.y + 1, box.topLeft.x:box.bottomRight.x + 1] = 1
-            for box in predBoxes:
-                predMap[box.topLeft.y:box.bottomRight.y + 1, box.topLeft.x:box.bottomRight.x + 1] = 1
-
-            # get the areas
-            gtArea   = gtMap.sum()
-            predArea = predMap.sum()
-
-            #exclude any cases where there is no ground truth or prediction areas
-            #this is usually indicative of bad data where the bottom right corner is not south and east of the top left corner
-            #inclusion of these will cause N/A values for our IOU and mean dice calculations
-            if(gtArea + predArea <= 0):
-                continue
-
-            # get the intersection
-            intersectionMap = np.bitwise_and(gtMap, predMap)
-            intersectionArea = intersectionMap.sum()
-
-            # get the union
-            unionMap = np.bitwise_or(gtMap, predMap)
-            unionArea = unionMap.sum()
-
-            # get the dice
-            diceCoefficient = (2 * intersectionArea) / (gtArea + predArea)
-            dices.append(diceCoefficient)
-
-            #get the iou
-            iou = intersectionArea / unionArea
-            ious.append(iou)
-
-            #add to scatter plot
-            if len(gtBoxes) > 0 or len(predBoxes) > 0: # don't plot true negatives
-                scatterPlot.append([gtArea.item(), predArea.item()])
-
-        metrics["meanDiceCoefficient"] = np.mean(np.array(dices))
-        metrics["meanIntersectionOverUnion"] = np.mean(np.array(ious))
-        metrics["scatterPlot"] = {
+    Parameters
+    ----------
+    gts : BoxArray
+        the bounding boxes of the ground truths with a group of boxes for every study
+    preds : BoxArray
+        the bounding boxes of the outputs with a group of boxes for every study
+    Returns
+    -------
+    array
+        [averagePrecision, gtArea, predArea, intersectionArea, unionArea] for every study
+
+    """
+    partials = []
+    for i, averagePrecision in enumerate(getAveragePrecisions(gts, preds)):
+        # get the areas covered by each side, their intersection and their union
+        areas = getCoverageAreas(gts.getGroup(i), preds.getGroup(i))
+        partials.append([float(averagePrecision)] + [area.item() for area in areas])
+    return partials
+
+def getMetricsFromStudyPartials(key, partials, bootstrap=None):
+    """
+    Aggregates the metrics from the partial results of every study
+
+    Parameters
+    ----------
+    key : string
+        the key of the evaluation
+    partials : array
+        the partial results of every study as given by getStudyPartials
+    bootstrap : Bootstrap
+        optional bootstrap to calculate the confidence intervals of the metrics with
+    Returns
+    -------
+    json object
+        The metrics
+
+    """
+    averagePrecisions = [partial[0] for partial in partials]
+
+    # calculate the metrics that aggregate the bounding box areas as one total area
+    # (meanDiceCoefficient, scatterPlot, and meanIntersectionOverUnion)
+    dices = []
+    ious = []
+    scatterPlot = []
+    for _, gtArea, predArea, intersectionArea, unionArea in partials:
+
+        #exclude any cases where there is no ground truth or prediction areas
+        #this is usually indicative of bad data where the bottom right corner is not south and east of the top left corner
+        #inclusion of these will cause N/A values for our IOU and mean dice calculations
+        if(gtArea + predArea <= 0):
+            continue
+
+        # get the dice
+        diceCoefficient = (2 * intersectionArea) / (gtArea + predArea)
+        dices.append(diceCoefficient)
+
+        #get the iou
+        iou = intersectionArea / unionArea
+        ious.append(iou)
+
+        #add to scatter plot, the true negatives were already excluded
+        scatterPlot.append([gtArea, predArea])
+
+    metrics = {
+        "meanAveragePrecision": np.mean(np.array(averagePrecisions)),
+        "meanDiceCoefficient": np.mean(np.array(dices)),
+        "meanIntersectionOverUnion": np.mean(np.array(ious)),
+        "scatterPlot": {
             "data": scatterPlot,
             "name": key
-        } 
+        }
+    }
+
+    if bootstrap is not None:
+        metrics["confidenceIntervals"] = {
+            "meanAveragePrecision": bootstrap.getMeanInterval(averagePrecisions),
+            "meanDiceCoefficient": bootstrap.getMeanInterval(dices),
+            "meanIntersectionOverUnion": bootstrap.getMeanInterval(ious)
+        }
 
     return metrics
 
-def getMeanAveragePrecision(gts, preds):
+def getAveragePrecisions(gts, preds):
     """
-    Calculates the  mean of the average precision for each study in the ground truth and predictions
+    Calculates the average precision of each study in the ground truth and predictions
 
     Parameters
     ----------
-    gts : array
-        an array with each element containing an array of bounding boxes that correspond to the ground truth of a single study
-    preds : array
-        an array with each element containing an array of bounding boxes that correspond to the output of a single study
+    gts : BoxArray
+        the bounding boxes of the ground truths with a group of boxes for every study
+    preds : BoxArray
+        the bounding boxes of the outputs with a group of boxes for every study
     Returns
     -------
-    float
-        The mean average precision
+    array
+        The average precision of every study
 
     """
     averagePrecisions = []
 
-    thresholds = [0.35, 0.4, 0.45, 0.5, 0.55, 0.6, 0.65, 0.7, 0.75]
-
-    for i in range(len(gts)):
+    for i in range(gts.getGroupCount()):
+        tps, fps = getMatchCounts(gts.getGroup(i), preds.getGroup(i), AVERAGE_PRECISION_THRESHOLDS)
+        averagePrecisions.append(getAveragePrecisionFromMatchCounts(tps, fps))
+    return averagePrecisions
 
-        averagePrecision = 0
-        for threshold in thresholds:
+def getAveragePrecisionFromMatchCounts(tps, fps):
+    """
+    Calculates the average precision of a study as the mean of its precisions at every iou threshold
 
-            tps = 0
-            fps = 0
-            fns = 0
+    Parameters
+    ----------
+    tps : array
+        the true positive counts of every threshold
+    fps : array
+        the false positive counts of every threshold
+    Returns
+    -------
+    float
+        The average precision
 
-            matchedPredBoxes = []
-            for gtBox in gts[i]:
+    """
+    averagePrecision = 0
+    for threshold in range(len(tps)):
+        if tps[threshold] + fps[threshold] == 0: # avoid division by 0
+            precision = 0
+        else:
+            precision = tps[threshold] / (tps[threshold] + fps[threshold])
 
-                # iterate through the non-matched prediction boxes and get the best match
-                highestMatchedIoU = None
-                matchedPredBox = None
-                for predBox in (diff(preds[i], matchedPredBoxes)): 
-                    IoU = gtBox.getIoU(predBox)
-                    if IoU > threshold and (highestMatchedIoU is None or IoU > highestMatchedIoU):
-                        highestMatchedIoU = IoU
-                        matchedPredBox = predBox
+        averagePrecision += precision / len(tps)
+    return averagePrecision
 
-                # A false negative indicates a ground truth object had no associated predicted object
-                if highestMatchedIoU is None or matchedPredBox is None:
-                    fns += 1
+def getMatchCounts(gtBoxes, predBoxes, thresholds):
+    """
+    Greedily matches the ground truth boxes of a study to its predicted boxes for every threshold at once using a single iou matrix.
+    Every ground truth box (in order) is matched to the non-matched prediction box with the highest iou above the threshold,
+    matching a prediction box also consumes any other prediction box with the same coordinates
 
-                # A true positive is counted when a single predicted object matches a ground truth object with an IoU above the threshold
-                else:
-                    tps += 1
-                    matchedPredBoxes.append(matchedPredBox)
+    Parameters
+    ----------
+    gtBoxes : BoxArray
+        the bounding boxes of the ground truth of a single study
+    predBoxes : BoxArray
+        the bounding boxes of the output of a single study
+    thresholds : array
+        the iou thresholds
+    Returns
+    -------
+    tuple
+        the arrays of true positive and false positive counts for every threshold
 
-            # A false positive indicates a predicted object had no associated ground truth object
-            fps += len(diff(preds[i], matchedPredBoxes))
+    """
+    if len(predBoxes) <= 0:
+        return np.zeros(len(thresholds), dtype=int), np.zeros(len(thresholds), dtype=int)
 
-            if tps + fps == 0: # avoid division by 0
-                precision = 0
-            else:
-                precision = tps / (tps + fps)
+    # prediction boxes with the same coordinates are considered to be the same box
+    _, boxIds = np.unique(predBoxes.coordinates, axis=0, return_inverse=True)
+    return getMatchCountsFromIoUs(gtBoxes.getIoUMatrix(predBoxes), boxIds.reshape(-1), thresholds)
 
-            averagePrecision += precision / len(thresholds)
+def getMatchCountsFromIoUs(ious, predictionIds, thresholds):
+    """
+    Greedily matches the ground truth objects of a study to its predicted objects for every threshold at once, with the
+    same rules as getMatchCounts
 
-        averagePrecisions.append(averagePrecision)
-    return np.mean(np.array(averagePrecisions))
+    Parameters
+    ----------
+    ious : numpy array
+        (number of ground truth objects, number of predicted objects) array of ious
+    predictionIds : numpy array
+        an id for every predicted object, the predicted objects with the same id are considered to be the same object
+    thresholds : array
+        the iou thresholds
+    Returns
+    -------
+    tuple
+        the arrays of true positive and false positive counts for every threshold
 
-def diff(li1, li2):
-    """
-    Finds the difference of two lists
     """
-    li_dif = [i for i in li1 + li2 if i not in li1 or i not in li2]
-    return li_dif
\ No newline at end of file
+    thresholds = np.array(thresholds)
+    tps = np.zeros(len(thresholds), dtype=int)
+
+    if ious.shape[1] <= 0:
+        return tps, np.zeros(len(thresholds), dtype=int)
+
+    sameBoxes = predictionIds[:, None] == predictionIds[None, :]
+
+    # non-matched prediction boxes for every threshold
+    available = np.ones((len(thresholds), ious.shape[1]), dtype=bool)
+    thresholdIndexes = np.arange(len(thresholds))
+
+    for gtIndex in range(ious.shape[0]):
+        candidates = available & (ious[gtIndex][None, :] > thresholds[:, None])
+        # argmax takes the first highest iou, just like iterating the prediction boxes in order
+        bestMatches = np.argmax(np.where(candidates, ious[gtIndex][None, :], -1), axis=1)
+        # A true positive is counted when a single predicted object matches a ground truth object with an IoU above the threshold
+        # A false negative indicates a ground truth object had no associated predicted object
+        matched = candidates[thresholdIndexes, bestMatches]
+        tps += matched
+        available[matched] &= ~sameBoxes[bestMatches[matched]]
+
+    # A false positive indicates a predicted object had no associated ground truth object
+    fps = available.sum(axis=1)
+    return tps, fps
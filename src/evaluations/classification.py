@@ -1,85 +1,97 @@
-from sklearn.metrics import confusion_matrix, accuracy_score, cohen_kappa_score, recall_score, classification_report, roc_auc_score, roc_curve
 from utils.data import getDicomIndexDictionary, getValuesIndexDictionary
+from utils.confusionMatrix import getConfusionMatrices, getAccuracies, getLinearKappas, getRecalls, getMacroRecalls
+from utils.roc import BinaryRocCurve
 import numpy as np
 
-def ClassificationEvaluation(groundTruths, predictions, rocInputs, threshold):
+def ClassificationEvaluation(valuesIndexDictionary, confusionMatrix, rocInputs, threshold, labelPairs=None, bootstrap=None, sweepThresholds=None, curvePoints=None):
     """
-    Calculates the classification evaluation
+    Calculates the classification evaluation from the confusion matrix of the key, so the cost of the metrics doesn't
+    depend on the number of studies once the label pairs are counted
 
     Parameters
     ----------
-    groundTruths : dictionary
-        dictionary having granularity hash as keys and ground truths as values
-    predictions : dictionary
-        dictionary having granularity hash as keys and predictions as values
+    valuesIndexDictionary : dictionary
+        the index of every label in the confusion matrix as given by getValuesIndexDictionary
+    confusionMatrix : numpy array
+        the counts of the label pairs with the ground truths on the first axis and the predictions on the second axis,
+        with a row and column for every label in the values index dictionary
     rocInputs : dictionary
         inputs for the binary ROC curve metrics (AUC) containing Y_true and Y_score values
     threshold: float
         the threshold of the evaluation
+    labelPairs : tuple
+        the ground truth and prediction label index arrays as given by getLabelPairs, only needed for the bootstrap
+    bootstrap : Bootstrap
+        optional bootstrap to calculate the confidence intervals of the metrics with
+    sweepThresholds : array
+        optional thresholds to add the table of the binary metrics at every one of them to the evaluation
+    curvePoints : int
+        optional maximum number of points of the ROC and precision-recall curves, the curves have a point for every
+        distinct score when not given
     Returns
     -------
     json object
         The evaluation
 
     """
-    studyIndexDictionary = getDicomIndexDictionary(groundTruths, predictions)
-    valuesIndexDictionary = getValuesIndexDictionary(groundTruths, predictions)
-    
-    # arrays with the values only, no studyuids
-    length = len(studyIndexDictionary.items())
-    gts = [None] * length
-    preds = [None] * length
-    for studyId, gt in groundTruths.items():
-        gts[studyIndexDictionary[studyId]] = valuesIndexDictionary[gt]
-    for studyId, pred in predictions.items():
-        preds[studyIndexDictionary[studyId]] = set().union([valuesIndexDictionary[p] for p in pred])
-
-
-    # in case we nave None in any of our array elements, we have to remove those indeces from both arrays
-    gtsClean = []
-    predsClean = []
-    for i in range(length):
-        if gts[i] is None or preds[i] is None:
-            continue
-        gtsClean.extend([gts[i]] * len(preds[i]))
-        predsClean.extend(preds[i])
-    gts = gtsClean
-    preds = predsClean
-
     #if we have no valid studies to compare
-    if len(gts) <= 0:
+    if confusionMatrix.sum() <= 0:
         return None
 
+    # like sklearn, the matrix metrics only take into account the labels that are present in the ground truths or predictions
+    present = (confusionMatrix.sum(axis=0) + confusionMatrix.sum(axis=1)) > 0
+    presentMatrix = confusionMatrix[np.ix_(present, present)]
+
     metrics = {
         # calculate superficial metrics that only need normal y_true and y_pred
         # we do rot90 and fliplr to get the radiologist axis as the x axis and the model axis as the y axis
-        "confusionMatrix": np.rot90(np.fliplr(confusion_matrix(gts, preds))).tolist(),
-        "kappa": cohen_kappa_score(gts, preds, weights='linear'),
-        "accuracy": accuracy_score(gts, preds),
+        "confusionMatrix": np.rot90(np.fliplr(presentMatrix)).tolist(),
+        "kappa": getLinearKappas(presentMatrix[None])[0],
+        "accuracy": getAccuracies(presentMatrix[None])[0].item(),
         "matrixValueOrders": valuesIndexDictionary,
         #stubs, we'll do these next
         "sensitivity": None,
         "specificity": None,
         "auc": None,
-        "rocCurve": None
+        "rocCurve": None,
+        "averagePrecision": None,
+        "precisionRecallCurve": None
     }
 
-    # calculate AUC and ROC
+    # the scores of the binary ROC inputs are sorted a single time for all the binary metrics
+    rocCurve = None
     if "Binary_ROC" in rocInputs:
         rocInput = rocInputs["Binary_ROC"]
+        rocCurve = BinaryRocCurve(rocInput["expected"], rocInput["actual"])
+
+    # calculate AUC and ROC
+    if rocCurve is not None:
         if len(set(rocInput["expected"])) != 2:
             print("The binary ground truths do not have exactly two classification representation. Binnary ROC metrics cannot be calculated.")
             print("ground truths:", rocInput["expected"])
         else:
-            auc = roc_auc_score(rocInput["expected"], rocInput["actual"])
-            metrics["auc"] = auc
+            metrics["auc"] = rocCurve.getAuc()
             #ROC curve
-            fpr, tpr, thresholds = roc_curve(y_true=rocInput["expected"], y_score=rocInput["actual"], drop_intermediate=False)
+            if curvePoints is None:
+                fpr, tpr, thresholds = rocCurve.getRocCurve()
+            else:
+                fpr, tpr, thresholds = rocCurve.getDecimatedRocCurve(curvePoints, threshold)
             metrics["rocCurve"] = {
                 "falsePositiveRate": fpr.tolist(),
                 "truePositiveRate": tpr.tolist(),
                 "thresholds": thresholds.tolist()
             }
+            #precision-recall curve
+            metrics["averagePrecision"] = rocCurve.getAveragePrecision()
+            if curvePoints is None:
+                precision, recall, thresholds = rocCurve.getPrecisionRecallCurve()
+            else:
+                precision, recall, thresholds = rocCurve.getDecimatedPrecisionRecallCurve(curvePoints, threshold)
+            metrics["precisionRecallCurve"] = {
+                "precision": precision.tolist(),
+                "recall": recall.tolist(),
+                "thresholds": thresholds.tolist()
+            }
 
     # calculate sensitivity and specificity
     # because of the nature of these metrics, we must have a binary classification
@@ -88,21 +100,181 @@ def ClassificationEvaluation(groundTruths, predictions, rocInputs, threshold):
     if len(valuesIndexDictionary.keys()) == 2 and '0' in valuesIndexDictionary.keys():
         #true binary data will have the positive case as label index 0 instead of 1
         #due to ACR requirements, so our sensitivity and specificity will be flipped
-        metrics["sensitivity"] = recall_score(gts, preds, pos_label=0)
-        metrics["specificity"] = recall_score(gts, preds)
+        metrics["sensitivity"] = getRecalls(confusionMatrix[None], 0)[0]
+        metrics["specificity"] = getRecalls(confusionMatrix[None], 1)[0]
     #simulated binary, use the roc inputs
-    elif "Binary_ROC" in rocInputs:
-        rocInput = rocInputs["Binary_ROC"]
-        binaryTruths = rocInput["expected"]
-        binaryPreds = [1 if x >= threshold else 0 for x in rocInput["actual"]]
-        metrics["specificity"] = recall_score(binaryTruths, binaryPreds, pos_label=0)
-        metrics["sensitivity"] = recall_score(binaryTruths, binaryPreds)
-    #otherwise rely on sklearn averaging
+    elif rocCurve is not None:
+        metrics["sensitivity"], metrics["specificity"] = rocCurve.getSensitivityAndSpecificity(threshold)
+    #otherwise rely on macro averaging
     else:
-        metrics["specificity"] = recall_score(gts, preds, pos_label=0, average='macro')
-        metrics["sensitivity"] = recall_score(gts, preds, average='macro')
+        # the macro average of both sides is the same
+        metrics["specificity"] = metrics["sensitivity"] = getMacroRecalls(presentMatrix[None])[0]
+
+    # the sweep is only possible when there are binary scores to threshold
+    if sweepThresholds is not None:
+        metrics["thresholdSweep"] = None if rocCurve is None else getThresholdSweep(rocCurve, sweepThresholds)
+
+    if bootstrap is not None:
+        gts, preds = labelPairs
+        metrics["confidenceIntervals"] = getConfidenceIntervals(gts, preds, valuesIndexDictionary, rocInputs, threshold, bootstrap)
 
     evaluation = {
         "generalMetrics": metrics
     }
     return evaluation
+
+def getThresholdSweep(rocCurve, thresholds):
+    """
+    Calculates the table of the binary metrics at every threshold of a sweep, with the threshold with the highest Youden index
+
+    Parameters
+    ----------
+    rocCurve : BinaryRocCurve
+        the sorted binary scores of the key
+    thresholds : array
+        the thresholds of the sweep
+    Returns
+    -------
+    json object
+        The table in the form of
+        {
+          "columns": ["threshold", "truePositives", ...],
+          "rows": [[0.1, 12, ...], ...], // a row for every threshold, in the order of the columns
+          "youdenOptimalThreshold": 0.4
+        }
+
+    """
+    operatingPoints = rocCurve.getOperatingPoints(thresholds)
+    countColumns = ["truePositives", "falsePositives", "trueNegatives", "falseNegatives"]
+    rateColumns = ["sensitivity", "specificity", "positivePredictiveValue", "negativePredictiveValue", "youdenIndex"]
+
+    columns = [np.asarray(thresholds, dtype=np.float64).tolist()]
+    columns.extend(operatingPoints[column].astype(np.int64).tolist() for column in countColumns)
+    columns.extend(operatingPoints[column].tolist() for column in rateColumns)
+    return {
+        "columns": ["threshold"] + countColumns + rateColumns,
+        "rows": [list(row) for row in zip(*columns)],
+        # the first of the thresholds with the highest index
+        "youdenOptimalThreshold": float(thresholds[int(np.argmax(operatingPoints["youdenIndex"]))])
+    }
+
+def getConfidenceIntervals(gts, preds, valuesIndexDictionary, rocInputs, threshold, bootstrap):
+    """
+    Calculates the bootstrap confidence intervals of the classification metrics, following the same binary/simulated binary/macro
+    rules as the metrics themselves. The pair metrics are calculated from the confusion matrices of the resamples of the pairs
+    and the auc from the resamples of the binary ROC inputs
+
+    Parameters
+    ----------
+    gts : array
+        the label index of the ground truth of every prediction pair
+    preds : array
+        the label index of the prediction of every prediction pair
+    valuesIndexDictionary : dictionary
+        the label indexes
+    rocInputs : dictionary
+        inputs for the binary ROC curve metrics (AUC) containing Y_true and Y_score values
+    threshold: float
+        the threshold of the evaluation
+    bootstrap : Bootstrap
+        the bootstrap to calculate the confidence intervals with
+    Returns
+    -------
+    json object
+        [lower, upper] intervals with the metric names as keys
+
+    """
+    matrices = bootstrap.getConfusionMatrices(gts, preds, len(valuesIndexDictionary))
+    intervals = {
+        "kappa": bootstrap.getInterval(getLinearKappas(matrices)),
+        "accuracy": bootstrap.getInterval(getAccuracies(matrices)),
+        "sensitivity": None,
+        "specificity": None,
+        "auc": None
+    }
+
+    rocInput = rocInputs["Binary_ROC"] if "Binary_ROC" in rocInputs else None
+    if rocInput is not None and len(set(rocInput["expected"])) == 2:
+        intervals["auc"] = bootstrap.getInterval(bootstrap.getAucSamples(rocInput["expected"], rocInput["actual"]))
+
+    if len(valuesIndexDictionary.keys()) == 2 and '0' in valuesIndexDictionary.keys():
+        intervals["sensitivity"] = bootstrap.getInterval(getRecalls(matrices, 0))
+        intervals["specificity"] = bootstrap.getInterval(getRecalls(matrices, 1))
+    elif rocInput is not None:
+        binaryPreds = [1 if x >= threshold else 0 for x in rocInput["actual"]]
+        binaryMatrices = bootstrap.getConfusionMatrices(rocInput["expected"], binaryPreds, 2)
+        intervals["specificity"] = bootstrap.getInterval(getRecalls(binaryMatrices, 0))
+        intervals["sensitivity"] = bootstrap.getInterval(getRecalls(binaryMatrices, 1))
+    else:
+        # the macro average of both sides is the same
+        intervals["specificity"] = intervals["sensitivity"] = bootstrap.getInterval(getMacroRecalls(matrices))
+
+    return intervals
+
+def getLabelPairs(groundTruths, predictions):
+    """
+    Pairs the ground truth of every study with each of its predicted labels
+
+    Parameters
+    ----------
+    groundTruths : dictionary
+        dictionary having granularity id as keys and ground truths as values
+    predictions : dictionary
+        dictionary having granularity id as keys and predictions as values
+    Returns
+    -------
+    tuple
+        the values index dictionary of the labels and the label index arrays of the ground truths and predictions of every pair
+
+    """
+    studyIndexDictionary = getDicomIndexDictionary(groundTruths, predictions)
+    valuesIndexDictionary = getValuesIndexDictionary(groundTruths, predictions)
+    
+    # arrays with the values only, no studyuids
+    length = len(studyIndexDictionary.items())
+    gts = [None] * length
+    preds = [None] * length
+    for studyId, gt in groundTruths.items():
+        gts[studyIndexDictionary[studyId]] = valuesIndexDictionary[gt]
+    for studyId, pred in predictions.items():
+        preds[studyIndexDictionary[studyId]] = set().union([valuesIndexDictionary[p] for p in pred])
+
+
+    # in case we nave None in any of our array elements, we have to remove those indeces from both arrays
+    gtsClean = []
+    predsClean = []
+    for i in range(length):
+        if gts[i] is None or preds[i] is None:
+            continue
+        gtsClean.extend([gts[i]] * len(preds[i]))
+        predsClean.extend(preds[i])
+
+    return valuesIndexDictionary, np.array(gtsClean, dtype=np.int64), np.array(predsClean, dtype=np.int64)
+
+def getConfusionMatrixDictionary(labelPairs):
+    """
+    Counts the confusion matrices of every key with a single bincount over the encoded (key, ground truth, prediction) triples
+
+    Parameters
+    ----------
+    labelPairs : dictionary
+        dictionary having the keys as keys and their label pairs as given by getLabelPairs as values
+    Returns
+    -------
+    dictionary
+        dictionary having the keys as keys and their confusion matrices as values, with a row and column for every label of the key
+
+    """
+    keys = list(labelPairs.keys())
+    if len(keys) <= 0:
+        return {}
+
+    labelCount = max(len(labelPairs[key][0]) for key in keys)
+    groups = np.repeat(np.arange(len(keys)), [len(labelPairs[key][1]) for key in keys])
+    matrices = getConfusionMatrices(
+        np.concatenate([labelPairs[key][1] for key in keys]),
+        np.concatenate([labelPairs[key][2] for key in keys]),
+        labelCount, groups, len(keys)
+    )
+
+    return {key: matrices[i, :len(labelPairs[key][0]), :len(labelPairs[key][0])] for i, key in enumerate(keys)}
@@ -1,7 +1,8 @@
 from sklearn.metrics import mean_squared_error, mean_absolute_error
 from utils.data import getDicomIndexDictionary, getValuesIndexDictionary
+import numpy as np
 
-def ContinuousEvaluation(key, allGroundTruths, predictions):
+def ContinuousEvaluation(key, allGroundTruths, predictions, bootstrap=None):
     """
     Calculates the continuous evaluation
 
@@ -12,7 +13,9 @@ def ContinuousEvaluation(key, allGroundTruths, predictions):
     allGroundTruths : dictionary
         dictionary having prediction labels as keys and ground truth dictionaries as values (study instance uids as keys and ground truths as values)
     predictions : dictionary
-        dictionary having granularity hash as keys and predictions as values
+        dictionary having granularity id as keys and predictions as values
+    bootstrap : Bootstrap
+        optional bootstrap to calculate the confidence intervals of the metrics with
 
     Returns
     -------
@@ -25,6 +28,10 @@ def ContinuousEvaluation(key, allGroundTruths, predictions):
 
     meanSquaredError = 0
     meanAbsoluteError = 0
+    confidenceIntervals = {
+        "meanSquaredError": None,
+        "meanAbsoluteError": None
+    }
     plots = []
 
     # we must scatter plot our predictions against every input key
@@ -52,6 +59,11 @@ def ContinuousEvaluation(key, allGroundTruths, predictions):
         if gtKey == key:
             meanSquaredError = mean_squared_error(gts, preds)
             meanAbsoluteError = mean_absolute_error(gts, preds)
+            if bootstrap is not None:
+                # the errors are means over the prediction pairs so their resamples only need the error of every pair
+                errors = np.array([gt - pred for gt, pred in plotData], dtype=np.float64)
+                confidenceIntervals["meanSquaredError"] = bootstrap.getMeanInterval(errors ** 2)
+                confidenceIntervals["meanAbsoluteError"] = bootstrap.getMeanInterval(np.abs(errors))
 
 
         plot = {
@@ -65,4 +77,6 @@ def ContinuousEvaluation(key, allGroundTruths, predictions):
         "meanAbsoluteError": meanAbsoluteError,
         "scatterPlot": plots
     }
+    if bootstrap is not None:
+        evaluation["confidenceIntervals"] = confidenceIntervals
     return evaluation
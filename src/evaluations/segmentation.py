@@ -1,25 +1,166 @@
-
 from utils.data import getDicomIndexDictionary, getValuesIndexDictionary
+from utils.rle import RunLengthMask, checkSizes
+from utils.npyMask import NpyMask, getMaskPath, resolveMaskPath
+from utils.polygon import PolygonMask
+from utils.studyCache import getStudyFingerprint
+from utils.resultCache import getFileDigest
+from evaluations.boundingBox import AVERAGE_PRECISION_THRESHOLDS, getMatchCountsFromIoUs, getAveragePrecisionFromMatchCounts, getMetricsFromStudyPartials
+import numpy as np
+from scipy import ndimage, spatial
+
+# the default number of voxels of the masks read at a time when the masks are not all run length encoded or all polygons
+DEFAULT_CHUNK_SIZE = 1 << 24
 
-def SegmentationEvaluation(groundTruths, predictions):
+def SegmentationEvaluation(key, groundTruths, predictions, bootstrap=None, chunkSize=None, datasetDirectory=None, outputDirectory=None):
     """
     Calculates the segmentation evaluation
 
     Parameters
     ----------
+    key : string
+        the key of the evaluation
     groundTruths : dictionary
-        dictionary having granularity hash as keys and an array of segmentations as values
+        dictionary having granularity id as keys and a segmentation or an array of segmentations as values
     predictions : dictionary
-        dictionary having granularity hash as keys and an array of segmentations as values
+        dictionary having granularity id as keys and an array of segmentations as values
+    bootstrap : Bootstrap
+        optional bootstrap to calculate the confidence intervals of the metrics with
+    chunkSize : int
+        the maximum number of voxels of every mask read at a time when the masks are not all run length encoded or all polygons
+    datasetDirectory : string
+        the directory of the dataset json file, the paths of the .npy masks of the ground truths are relative to it
+    outputDirectory : string
+        the directory of the output json file, the paths of the .npy masks of the predictions are relative to it
     Returns
     -------
     json object
         The evaluation
 
     """
+    gts, preds = getStudyValues(groundTruths, predictions)
+
+    # the masks of a study are opened and released before the next study, so the .npy files mapped at the same time
+    # don't grow with the number of studies
+    partials = []
+    for i in range(len(gts)):
+        partial = getStudyPartial(gts[i], preds[i], chunkSize, datasetDirectory, outputDirectory)
+        # the masks in files are only known to be empty once they are read, those studies are true negatives too
+        if partial is not None:
+            partials.append(partial)
+
+    #if we have no valid studies to compare
+    if len(partials) <= 0:
+        return None
+    return getMetricsFromPartials(key, partials, bootstrap)
+
+def IncrementalSegmentationEvaluation(key, groundTruths, predictions, cachedPartials, bootstrap=None, chunkSize=None, datasetDirectory=None, outputDirectory=None):
+    """
+    Calculates the segmentation evaluation reusing the partial results of the studies that were already calculated, the masks
+    of those studies are not decoded or read
+
+    Parameters
+    ----------
+    key : string
+        the key of the evaluation
+    groundTruths : dictionary
+        dictionary having granularity id as keys and a segmentation or an array of segmentations as values
+    predictions : dictionary
+        dictionary having granularity id as keys and an array of segmentations as values
+    cachedPartials : dictionary
+        dictionary having the study fingerprints as keys and their partial results as given by getStudyPartials as values
+    bootstrap : Bootstrap
+        optional bootstrap to calculate the confidence intervals of the metrics with
+    chunkSize : int
+        the maximum number of voxels of every mask read at a time
+    datasetDirectory : string
+        the directory of the dataset json file, the paths of the .npy masks of the ground truths are relative to it
+    outputDirectory : string
+        the directory of the output json file, the paths of the .npy masks of the predictions are relative to it
+    Returns
+    -------
+    tuple
+        The evaluation and the partial results of the studies of the evaluation with their fingerprints as keys
+
+    """
+    gts, preds = getStudyValues(groundTruths, predictions)
+    fingerprints = [getSegmentationFingerprint(gts[i], preds[i], datasetDirectory, outputDirectory) for i in range(len(gts))]
+
+    # only the changed or new studies are calculated, the true negatives are cached as None
+    partials = {fingerprint: cachedPartials[fingerprint] for fingerprint in fingerprints if fingerprint in cachedPartials}
+    for i, fingerprint in enumerate(fingerprints):
+        if fingerprint in partials:
+            continue
+        partial = getStudyPartial(gts[i], preds[i], chunkSize, datasetDirectory, outputDirectory)
+        # the same types as the partials loaded from the cache, so the evaluation doesn't depend on where they come from
+        partials[fingerprint] = None if partial is None else [float(partial[0])] + [int(area) for area in partial[1:5]] + [None if distance is None else float(distance) for distance in partial[5:]]
+
+    studyPartials = [partials[fingerprint] for fingerprint in fingerprints if partials[fingerprint] is not None]
+    if len(studyPartials) <= 0:
+        return None, partials
+    return getMetricsFromPartials(key, studyPartials, bootstrap), partials
+
+def getMetricsFromPartials(key, partials, bootstrap=None):
+    """
+    Aggregates the metrics of the studies from their partial results as given by getStudyPartials
+    """
+    # the overlap metrics are aggregated from the areas of every study the same way as the bounding boxes
+    metrics = getMetricsFromStudyPartials(key, [partial[:5] for partial in partials], bootstrap)
+
+    # the surface distances are only defined for the studies where both sides have a segmentation
+    hausdorffDistances = [partial[5] for partial in partials if partial[5] is not None]
+    surfaceDistances = [partial[6] for partial in partials if partial[6] is not None]
+    metrics["meanHausdorffDistance95"] = np.mean(np.array(hausdorffDistances)) if len(hausdorffDistances) > 0 else None
+    metrics["meanAverageSymmetricSurfaceDistance"] = np.mean(np.array(surfaceDistances)) if len(surfaceDistances) > 0 else None
+    if bootstrap is not None:
+        metrics["confidenceIntervals"]["meanHausdorffDistance95"] = bootstrap.getMeanInterval(hausdorffDistances)
+        metrics["confidenceIntervals"]["meanAverageSymmetricSurfaceDistance"] = bootstrap.getMeanInterval(surfaceDistances)
+    return metrics
+
+def getStudyPartial(gt, preds, chunkSize=None, datasetDirectory=None, outputDirectory=None):
+    """
+    Opens the segmentation masks of the ground truth and predictions of a study and calculates its partial result, the
+    masks are released when it returns
+
+    Parameters
+    ----------
+    gt : json object
+        the segmentation or array of segmentations of the ground truth of the study
+    preds : array
+        the segmentation values of the predictions of the study
+    chunkSize : int
+        the maximum number of voxels of every mask read at a time
+    datasetDirectory : string
+        the directory the paths of the .npy masks of the ground truths are relative to
+    outputDirectory : string
+        the directory the paths of the .npy masks of the predictions are relative to
+    Returns
+    -------
+    array
+        The partial result of the study as given by getStudyPartials, None for the true negatives
+
+    """
+    gtMasks = getMasks(gt, datasetDirectory)
+    #to account for the one-to-many relationships of ground truth and prediction granularity levels
+    #we flatten the masks of all the predictions of the ground truth level
+    predMasks = [mask for pred in ([] if preds is None else preds) for mask in getMasks(pred, outputDirectory)]
+
+    #exclude true negatives from calculations
+    if len(gtMasks) == 0 and len(predMasks) == 0:
+        return None
+    return getStudyPartials([gtMasks], [predMasks], chunkSize)[0]
 
+def getStudyValues(groundTruths, predictions):
+    """
+    Aligns the segmentation values of the ground truths and predictions of every study, in the order of the granularity ids
+
+    Returns
+    -------
+    tuple
+        the arrays with the ground truth value and the array of predicted values of every study, None when a side has none
+
+    """
     studyIndexDictionary = getDicomIndexDictionary(groundTruths, predictions)
-    
+
     # arrays with the values only, no studyuids
     length = len(studyIndexDictionary.items())
     gts = [None] * length
@@ -28,23 +169,314 @@ def SegmentationEvaluation(groundTruths, predictions):
         gts[studyIndexDictionary[studyId]] = gt
     for studyId, pred in predictions.items():
         preds[studyIndexDictionary[studyId]] = pred
-    # in case we nave None in any of our array elements, we have to remove those indeces from both arrays
-    gtsClean = []
-    predsClean = []
-    for i in range(length):
-        if gts[i] is None or preds[i] is None:
-            continue
-        gtsClean.append(gts[i])
-        predsClean.append(preds[i])
-    gts = gtsClean
-    preds = predsClean
-    
-    metrics = {
-        "meanDiceCoefficient": None,
-        "meanAveragePrecision": None,
-        "meanIntersectionOverUnion": None,
-        "scatterPlot": {
-            "data": None
-        } 
-    }
-    return metrics
+    return gts, preds
+
+def getSegmentationFingerprint(gt, preds, datasetDirectory=None, outputDirectory=None):
+    """
+    Creates the fingerprint of the segmentations of a study, the content of the .npy masks is not in the json values so
+    the digests of their files are part of the fingerprint
+    """
+    digests = [getFileDigest(path) for path in getNpyMaskPaths(gt, datasetDirectory)]
+    digests += [getFileDigest(path) for pred in ([] if preds is None else preds) for path in getNpyMaskPaths(pred, outputDirectory)]
+    return getStudyFingerprint(gt, preds, digests)
+
+def getNpyMaskPaths(value, directory):
+    """
+    Gets the resolved paths of the .npy masks of a segmentation value, a single segmentation or an array of them
+    """
+    if value is None:
+        return []
+    segmentations = value if isinstance(value, list) else [value]
+    return [resolveMaskPath(getMaskPath(segmentation["npy"]), directory) for segmentation in segmentations if isinstance(segmentation, dict) and "npy" in segmentation]
+
+def getMasks(value, directory=None):
+    """
+    Decodes the masks of a segmentation value, a single segmentation or an array of them (one for every object)
+
+    Parameters
+    ----------
+    value : json object
+        the segmentation value, every segmentation in one of the forms of
+        {
+            "rle": {"size": [height, width], "counts": [...]}
+        }
+        {
+            "npy": "path/to/mask.npy" // relative to the directory
+        }
+        {
+            "polygon": {"size": [height, width], "points": [[x, y], ...]}
+        }
+    directory : string
+        the directory of the json file of the segmentations, the paths of the .npy masks are relative to it
+    Returns
+    -------
+    array
+        The masks, the empty run length encoded and polygon masks are left out
+
+    """
+    if value is None:
+        return []
+    segmentations = value if isinstance(value, list) else [value]
+    masks = [getMask(segmentation, directory) for segmentation in segmentations]
+    return [mask for mask in masks if isinstance(mask, NpyMask) or mask.getArea() > 0]
+
+def getMask(segmentation, directory=None):
+    """
+    Decodes the mask of a single segmentation
+
+    Parameters
+    ----------
+    segmentation : json object
+        the segmentation
+    directory : string
+        the directory the path of a .npy mask is relative to
+    Returns
+    -------
+    RunLengthMask, NpyMask or PolygonMask
+        The mask
+
+    """
+    if isinstance(segmentation, dict) and "rle" in segmentation:
+        return RunLengthMask.fromJsonData(segmentation["rle"])
+    if isinstance(segmentation, dict) and "npy" in segmentation:
+        return NpyMask.fromJsonData(segmentation["npy"], directory)
+    if isinstance(segmentation, dict) and "polygon" in segmentation:
+        return PolygonMask.fromJsonData(segmentation["polygon"])
+    raise ValueError('unsupported segmentation format, the segmentations must have one of the keys: rle, npy, polygon')
+
+def getStudyPartials(gts, preds, chunkSize=None):
+    """
+    Calculates the partial results of every study from which the metrics are aggregated
+
+    Parameters
+    ----------
+    gts : array
+        the masks of the ground truth objects of every study
+    preds : array
+        the masks of the predicted objects of every study
+    chunkSize : int
+        the maximum number of voxels of every mask read at a time, the run length encoded and polygon masks are only read in
+        chunks to find their surfaces
+    Returns
+    -------
+    array
+        [averagePrecision, gtArea, predArea, intersectionArea, unionArea, hausdorffDistance95, averageSymmetricSurfaceDistance]
+        for every study, None for the studies that only have empty masks. The surface distances are None when a side is empty
+
+    """
+    partials = []
+    for gtMasks, predMasks in zip(gts, preds):
+        # the run length encoded and polygon masks are compared without decoding them, unless they are mixed with other kinds
+        maskClasses = set(type(mask) for mask in gtMasks + predMasks)
+        if len(maskClasses) == 1 and maskClasses <= {RunLengthMask, PolygonMask}:
+            partials.append(getEncodedStudyPartial(gtMasks, predMasks, maskClasses.pop(), DEFAULT_CHUNK_SIZE if chunkSize is None else chunkSize))
+        else:
+            partials.append(getSlabStudyPartial(gtMasks, predMasks, DEFAULT_CHUNK_SIZE if chunkSize is None else chunkSize))
+    return partials
+
+def getEncodedStudyPartial(gtMasks, predMasks, maskClass, chunkSize):
+    """
+    Calculates the partial result of a study from its encoded masks, the runs of the run length encoded masks or the packed
+    bits of the polygon masks
+    """
+    # the pixels covered by each side, an object can overlap the others of the same side
+    size = gtMasks[0].size if len(gtMasks) > 0 else predMasks[0].size
+    gtMask = maskClass.union(gtMasks, size)
+    predMask = maskClass.union(predMasks, size)
+    intersectionArea, unionArea = gtMask.getOverlapAreas(predMask)
+    surfaceDistances = getSurfaceDistances(gtMask, predMask, getJointBounds(gtMask.getBounds(), predMask.getBounds()), chunkSize)
+
+    ious = np.zeros((len(gtMasks), len(predMasks)), dtype=np.float64)
+    for i, gtObject in enumerate(gtMasks):
+        for j, predObject in enumerate(predMasks):
+            objectIntersectionArea, objectUnionArea = gtObject.getOverlapAreas(predObject)
+            ious[i, j] = objectIntersectionArea / objectUnionArea
+
+    return [float(getAveragePrecision(ious, predMasks)), gtMask.getArea(), predMask.getArea(), intersectionArea, unionArea] + surfaceDistances
+
+def getSlabStudyPartial(gtMasks, predMasks, chunkSize):
+    """
+    Calculates the partial result of a study reading its masks a slab of voxels at a time, so the memory used only depends
+    on the chunk size and the number of objects of the study and not on the size of the volumes
+    """
+    masks = gtMasks + predMasks
+    checkSizes(masks)
+    if chunkSize <= 0:
+        raise ValueError("the chunk size must be positive")
+
+    gtCount = len(gtMasks)
+    voxelCount = int(np.prod(masks[0].size, dtype=np.int64))
+    areas = np.zeros(len(masks), dtype=np.int64)
+    intersectionAreas = np.zeros((gtCount, len(predMasks)), dtype=np.int64)
+    gtArea = predArea = intersectionArea = unionArea = 0
+    bounds = None
+
+    for start in range(0, voxelCount, chunkSize):
+        stop = min(start + chunkSize, voxelCount)
+        slabs = [mask.getSlab(start, stop) for mask in masks]
+        areas += [np.count_nonzero(slab) for slab in slabs]
+        for i in range(gtCount):
+            for j in range(len(predMasks)):
+                intersectionAreas[i, j] += np.count_nonzero(slabs[i] & slabs[gtCount + j])
+
+        # the voxels covered by each side, an object can overlap the others of the same side
+        gtSlab = np.zeros(stop - start, dtype=bool)
+        for slab in slabs[:gtCount]:
+            gtSlab |= slab
+        predSlab = np.zeros(stop - start, dtype=bool)
+        for slab in slabs[gtCount:]:
+            predSlab |= slab
+        gtArea += np.count_nonzero(gtSlab)
+        predArea += np.count_nonzero(predSlab)
+        intersectionArea += np.count_nonzero(gtSlab & predSlab)
+        unionArea += np.count_nonzero(gtSlab | predSlab)
+
+        # the bounding region of both sides, for the surface distances
+        coordinates = np.unravel_index(start + np.flatnonzero(gtSlab | predSlab), masks[0].size)
+        if len(coordinates[0]) > 0:
+            bounds = getJointBounds(bounds, [(int(axis.min()), int(axis.max()) + 1) for axis in coordinates])
+
+    #exclude true negatives from calculations, like the empty run length encoded masks
+    if gtArea == 0 and predArea == 0:
+        return None
+
+    # the empty objects are left out, like the empty run length encoded masks
+    gtObjects = np.where(areas[:gtCount] > 0)[0]
+    predObjects = np.where(areas[gtCount:] > 0)[0]
+    intersectionAreas = intersectionAreas[np.ix_(gtObjects, predObjects)]
+    unionAreas = areas[gtObjects][:, None] + areas[gtCount + predObjects][None, :] - intersectionAreas
+    ious = intersectionAreas / unionAreas
+
+    # the surface distances only read the bounding region of the masks, a slab at a time too
+    surfaceDistances = [None, None]
+    if gtArea > 0 and predArea > 0:
+        surfaceDistances = getSurfaceDistances(UnionMask(gtMasks), UnionMask(predMasks), bounds, chunkSize)
+
+    return [float(getAveragePrecision(ious, [predMasks[j] for j in predObjects])), int(gtArea), int(predArea), int(intersectionArea), int(unionArea)] + surfaceDistances
+
+class UnionMask(object):
+    """
+    Union of the masks of the objects of one side of a study, only decoded for a bounding region
+    """
+    def __init__(self, masks):
+        self.masks = masks
+
+    def getRegion(self, bounds):
+        region = np.zeros([stop - start for start, stop in bounds], dtype=bool)
+        for mask in self.masks:
+            region |= mask.getRegion(bounds)
+        return region
+
+def getJointBounds(bounds, otherBounds):
+    """
+    Gets the bounding region of two bounding regions, either of them can be None when it is empty
+    """
+    if bounds is None:
+        return otherBounds
+    if otherBounds is None:
+        return bounds
+    return [(min(a[0], b[0]), max(a[1], b[1])) for a, b in zip(bounds, otherBounds)]
+
+def getSurfaceDistances(gtMask, predMask, bounds, chunkSize=DEFAULT_CHUNK_SIZE):
+    """
+    Calculates the 95th percentile Hausdorff distance and the average symmetric surface distance between the ground truth and
+    predicted segmentations of a study, in pixels. The surface pixels of both sides are found reading their joint bounding
+    region a slab at a time, and the distance of every surface pixel to the closest surface pixel of the other side comes
+    from a k-d tree of the surface pixels. The memory used depends on the chunk size and the number of surface pixels, not on
+    the size of the region. The distances are the same as the ones of medpy's hd95 and assd
+
+    Parameters
+    ----------
+    gtMask : RunLengthMask, NpyMask, PolygonMask or UnionMask
+        the ground truth segmentation
+    predMask : RunLengthMask, NpyMask, PolygonMask or UnionMask
+        the predicted segmentation
+    bounds : array
+        the (start, stop) range of every axis of the joint bounding region of both segmentations
+    chunkSize : int
+        the maximum number of pixels of the region read at a time
+    Returns
+    -------
+    array
+        the 95th percentile Hausdorff distance and the average symmetric surface distance, None when either segmentation is empty
+
+    """
+    if bounds is None:
+        return [None, None]
+    gtSurface = getSurfacePoints(gtMask, bounds, chunkSize)
+    predSurface = getSurfacePoints(predMask, bounds, chunkSize)
+    if len(gtSurface) <= 0 or len(predSurface) <= 0:
+        return [None, None]
+
+    # the distance of every surface pixel to the closest surface pixel of the other side
+    gtDistances = spatial.cKDTree(predSurface).query(gtSurface)[0]
+    predDistances = spatial.cKDTree(gtSurface).query(predSurface)[0]
+
+    hausdorffDistance95 = np.percentile(np.hstack((gtDistances, predDistances)), 95)
+    averageSymmetricSurfaceDistance = np.mean((predDistances.mean(), gtDistances.mean()))
+    return [float(hausdorffDistance95), float(averageSymmetricSurfaceDistance)]
+
+def getSurfacePoints(mask, bounds, chunkSize):
+    """
+    Finds the surface pixels of a segmentation, the pixels that have a face-connected neighbour outside of it or outside of
+    the image. The bounding region is read in slabs of whole slices of its first axis, with one more slice on each side so
+    the surface of the slices at the edges of a slab is the same as the one of the whole region
+
+    Parameters
+    ----------
+    mask : RunLengthMask, NpyMask, PolygonMask or UnionMask
+        the segmentation
+    bounds : array
+        the (start, stop) range of every axis of the bounding region, there is no foreground outside of it
+    chunkSize : int
+        the maximum number of pixels of the region read at a time, at least one slice and its neighbours are read
+    Returns
+    -------
+    numpy array
+        (number of surface pixels, number of axes) array of the coordinates of the surface pixels relative to the region
+    """
+    start, stop = bounds[0]
+    sliceSize = int(np.prod([axisStop - axisStart for axisStart, axisStop in bounds[1:]], dtype=np.int64))
+    slabSlices = max(1, chunkSize // max(sliceSize, 1) - 2)
+    structure = ndimage.generate_binary_structure(len(bounds), 1)
+
+    points = []
+    for slabStart in range(start, stop, slabSlices):
+        slabStop = min(slabStart + slabSlices, stop)
+        readStart, readStop = max(slabStart - 1, start), min(slabStop + 1, stop)
+        region = mask.getRegion([(readStart, readStop)] + list(bounds[1:]))
+        # the erosion treats the pixels outside of the slab as background, which they are past the edges of the region
+        surface = region & ~ndimage.binary_erosion(region, structure=structure, iterations=1)
+        slabPoints = np.argwhere(surface[slabStart - readStart:slabStop - readStart])
+        slabPoints[:, 0] += slabStart - start
+        points.append(slabPoints)
+    return np.concatenate(points) if len(points) > 0 else np.zeros((0, len(bounds)), dtype=np.int64)
+
+def getAveragePrecision(ious, predMasks):
+    """
+    Calculates the average precision of the objects of a study over the same iou thresholds as the bounding boxes
+
+    Parameters
+    ----------
+    ious : numpy array
+        (number of ground truth objects, number of predicted objects) array of the ious of the objects
+    predMasks : array
+        the masks of the predicted objects
+    Returns
+    -------
+    float
+        The average precision
+
+    """
+    # predicted objects with the same mask are considered to be the same object
+    maskIds = {}
+    predictionIds = np.array([maskIds.setdefault(getMaskIdentity(mask), len(maskIds)) for mask in predMasks], dtype=np.int64)
+
+    tps, fps = getMatchCountsFromIoUs(ious, predictionIds, AVERAGE_PRECISION_THRESHOLDS)
+    return getAveragePrecisionFromMatchCounts(tps, fps)
+
+def getMaskIdentity(mask):
+    # the masks in files are the same when they are the same file, so they don't have to be compared voxel by voxel
+    if isinstance(mask, NpyMask):
+        return ("npy", mask.path)
+    return mask
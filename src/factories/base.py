@@ -1,5 +1,7 @@
 import json
-from utils.data import hashGranularityIdentifier
+from concurrent.futures import Future
+
+from utils.profiler import span
 
 class MetricsFactory:
     """
@@ -9,10 +11,8 @@ class MetricsFactory:
 
     Attributes
     ----------
-    dataset : json object
-        the json object of our standard dataset
-    output : json object
-        the json object of our standard output
+    index : StudyIndex
+        the shared index of the ground truths and outputs of our standard dataset and output
     annotationTypeKey : string
         the identifying key for the algorithm type in the dataset json object
     outputTypeKey : string
@@ -20,36 +20,80 @@ class MetricsFactory:
     """
 
 
-    def __init__(self, dataset, output, annotationTypeKey, outputTypeKey):
+    def __init__(self, index, annotationTypeKey, outputTypeKey):
 
-        if dataset is None:
-            raise ValueError("no dataset found")
-        if output is None:
-            raise ValueError("no output found")
+        if index is None:
+            raise ValueError("no study index found")
 
-        #index of granularity hashes for reverse lookup
-        self.hashes = {}
+        self.annotationTypeKey = annotationTypeKey
+        #table of granularity ids for reverse lookup
+        self.granularities = index.granularities
         #useful sorted data
-        self.predictions = self.getPredictionDictionary(output, outputTypeKey)
-        self.groundTruths = self.getGroundTruthDictionary(dataset, annotationTypeKey)
-        self.keys = self.getkeys(dataset, annotationTypeKey)
+        self.predictions = self.getPredictionDictionary(index, outputTypeKey)
+        self.groundTruths = self.getGroundTruthDictionary(index, annotationTypeKey)
+        self.keys = self.getkeys(index, annotationTypeKey)
         # contains ground truth keys that are present in our predictions
         self.predictedKeys = None if self.predictions is None else list(filter(lambda x: x in self.predictions.keys(), self.keys))
 
-    def Create(self):
+    def Create(self, executor=None):
         """
         Creates the array of evaluations for our dataset and outputs
 
+        Parameters
+        ----------
+        executor : Executor
+            optional pool used to calculate the evaluations of every key in parallel
+
         Returns
         -------
         array
             The evaluations
 
         """
-        evaluations = None if self.predictedKeys is None else list(map(self.getEvaluationWrapperForkey, self.predictedKeys))
+        return self.resolveEvaluations(self.Submit(executor))
+
+    def Submit(self, executor=None):
+        """
+        Starts the evaluations of every key. When an executor is given, the evaluations are submitted to it and the outputs of the
+        evaluation wrappers will be futures until they are resolved with resolveEvaluations
+
+        Parameters
+        ----------
+        executor : Executor
+            optional pool used to calculate the evaluations of every key in parallel
+
+        Returns
+        -------
+        array
+            The evaluation wrappers
+
+        """
+        evaluations = None if self.predictedKeys is None else [self.getEvaluationWrapperForkey(key, executor) for key in self.predictedKeys]
+        return evaluations
+
+    def resolveEvaluations(self, evaluations):
+        """
+        Waits for the submitted evaluations in the order of their keys, so the result is the same as running them one after the other
+
+        Parameters
+        ----------
+        evaluations : array
+            the evaluation wrappers as given by Submit
+
+        Returns
+        -------
+        array
+            The evaluation wrappers with their outputs resolved
+
+        """
+        if evaluations is None:
+            return None
+        for wrapper in evaluations:
+            if isinstance(wrapper["output"], Future):
+                wrapper["output"] = wrapper["output"].result()
         return evaluations
 
-    def getEvaluationWrapperForkey(self, key):    
+    def getEvaluationWrapperForkey(self, key, executor=None):    
         """
         Builds the common wrapper object for an evaluation that will contain information about unknowns, failures, and keys
 
@@ -57,6 +101,8 @@ class MetricsFactory:
         ----------
         key : string
             they key of the annotation class for this evaluation wrapper
+        executor : Executor
+            optional pool to submit the evaluation to, the output of the wrapper will be a future in that case
 
         Returns
         -------
@@ -71,7 +117,7 @@ class MetricsFactory:
         nonNullPredictions  = {k:v for k,v in predictionsForKey.items()  if v is not None}
         #now get a list of all the unknown predictions
         nullPredictions  = {k:v for k,v in predictionsForKey.items()  if v is None or ('values' in v and any(val is None for val in v.values()))}
-        unknowns = list(map(lambda x: self.hashes[x[0]] if x[0] in self.hashes else x[0], nullPredictions.items()))
+        unknowns = list(map(lambda x: self.granularities.getIdentifier(x[0]), nullPredictions.items()))
         
         #only consider the ground truths that we have a prediction for, we will account for the rest as "failures"
         groundTruthsForKey = self.groundTruths[key]
@@ -79,15 +125,44 @@ class MetricsFactory:
 
         #FAILURES
         failedPredictions  = {k:v for k,v in groundTruthsForKey.items()  if k not in predictionsForKey.keys()}
-        failures = list(map(lambda x: self.hashes[x[0]] if x[0] in self.hashes else x[0], failedPredictions.items()))
+        failures = list(map(lambda x: self.granularities.getIdentifier(x[0]), failedPredictions.items()))
 
         return {
             "key": key,
             "unknowns": unknowns,
             "failures": failures,
-            "output": self.getEvaluation(key, validGroundTruths, nonNullPredictions)
+            "output": self.runEvaluation(key, validGroundTruths, nonNullPredictions, executor)
         }
 
+    def runEvaluation(self, key, groundTruths, predictions, executor=None):
+        """
+        Runs the evaluation task of a key either right away or on an executor. Only the aligned data of the key
+        is sent to the executor
+
+        Parameters
+        ----------
+        key : string
+            they key of the annotation class for this evaluation
+        groundTruths : dictionary
+            dictionary containing granularity ids as keys and the ground truths for that study as values
+        predictions : dictionary
+            dictionary containing granularity ids as keys and the predictions for that study as values
+        executor : Executor
+            optional pool to submit the evaluation to
+
+        Returns
+        -------
+        json object
+            The evaluation, or a future of the evaluation if an executor was given
+
+        """
+        if executor is None:
+            with span("key", algorithmType=self.annotationTypeKey, key=key):
+                function, arguments = self.getEvaluationTask(key, groundTruths, predictions)
+                return function(*arguments)
+        function, arguments = self.getEvaluationTask(key, groundTruths, predictions)
+        return executor.submit(function, *arguments)
+
     def getEvaluation(self, key, groundTruths, predictions):    
         """
         Gets a single evaluation for the selected annotation class key/slug and ground truth and predictions
@@ -97,27 +172,51 @@ class MetricsFactory:
         key : string
             they key of the annotation class for this evaluation
         groundTruths : dictionary
-            dictionary containing granularity hashes as keys and the ground truths for that study as values
+            dictionary containing granularity ids as keys and the ground truths for that study as values
         predictions : dictionary
-            dictionary containing granularity hashes as keys and the predictions for that study as values
+            dictionary containing granularity ids as keys and the predictions for that study as values
 
         Returns
         -------
         json object
             The evaluation
 
+        """
+        function, arguments = self.getEvaluationTask(key, groundTruths, predictions)
+        return function(*arguments)
+
+    def getEvaluationTask(self, key, groundTruths, predictions):    
+        """
+        Gets the evaluation function and its arguments for the selected annotation class key/slug and ground truth and predictions.
+        The function must be a module level function and the arguments must only hold the data of this key so the task can be
+        sent to a process pool
+
+        Parameters
+        ----------
+        key : string
+            they key of the annotation class for this evaluation
+        groundTruths : dictionary
+            dictionary containing granularity ids as keys and the ground truths for that study as values
+        predictions : dictionary
+            dictionary containing granularity ids as keys and the predictions for that study as values
+
+        Returns
+        -------
+        tuple
+            The evaluation function and the tuple of arguments to call it with
+
         """
         raise NotImplementedError()
 
 
-    def getPredictionDictionary(self, output, outputTypeKey):
+    def getPredictionDictionary(self, index, outputTypeKey):
         """
-        Processes the standard output to sort all the possible data for the algorithm type specified by the output key
+        Obtains all the possible data for the algorithm type specified by the output key from the study index
 
         Parameters
         ----------
-        output : json
-            The standard output json
+        index : StudyIndex
+            The shared index of the standard output
         outputTypeKey : dictionary
             the key that specifies which algorithm type should be processed to obtain the predictions
 
@@ -127,36 +226,27 @@ class MetricsFactory:
             dictionary in the form of
             {
               key: {
-                  granularityHash: predictions
+                  granularityId: predictions
               }
             }
 
         """
 
-        if output is None or len(output["studies"]) <= 0:
+        outputs = index.getOutputs(outputTypeKey)
+        if outputs is None:
             return None
 
         predictions = {}
 
-        for study in [s for s in output["studies"] if outputTypeKey in s and s[outputTypeKey] is not None]:
-            for output in study[outputTypeKey]:
-                if output["key"] not in predictions:
-                    targetDict = {}
-                    predictions[output["key"]] = targetDict
-                else:
-                    targetDict = predictions[output["key"]]
-
-                # get the granularity hash
-                studyInstanceUID = study["studyInstanceUID"]
-                seriesInstanceUID = output["seriesInstanceUID"] if "seriesInstanceUID" in output else ''
-                sopInstanceUID = output["sopInstanceUID"] if "sopInstanceUID" in output else ''
-                frameIndex = output["frameIndex"] if "frameIndex" in output else ''
-                hash = hashGranularityIdentifier(studyInstanceUID, seriesInstanceUID, sopInstanceUID, frameIndex, self.hashes)
-
-                if hash not in targetDict:
-                    targetDict[hash] = []
-
-                targetDict[hash].append(self.getTargetPredictionFromOutput(output["output"]))
+        for key, keyOutputs in outputs.items():
+            targetDict = {}
+            predictions[key] = targetDict
+
+            for granularityId, output in keyOutputs:
+                if granularityId not in targetDict:
+                    targetDict[granularityId] = []
+
+                targetDict[granularityId].append(self.getTargetPredictionFromOutput(output))
         return predictions
 
     def getTargetPredictionFromOutput(self, output):
@@ -172,15 +262,15 @@ class MetricsFactory:
         """
         return output
 
-    def getGroundTruthDictionary(self, dataset, annotationTypeKey):
+    def getGroundTruthDictionary(self, index, annotationTypeKey):
         """
-        Processes the standard dataset to sort all the possible data for the algorith type specified by the annotation type key. This will "flaten"
-        the levels of the annotation into a single dictionary structure.
+        Obtains all the possible data for the algorith type specified by the annotation type key from the study index. The levels
+        of the annotation are already "flatened" into a single dictionary structure by the index.
 
         Parameters
         ----------
-        dataset : json
-            The standard dataset json
+        index : StudyIndex
+            The shared index of the standard dataset
         annotationTypeKey : dictionary
             the key that specifies which algorithm type should be processed to obtain the ground truths
 
@@ -190,108 +280,31 @@ class MetricsFactory:
             dictionary in the form of
             {
               key: {
-                  granularityHash: groundTruths
+                  granularityId: groundTruths
               }
             }
 
         """
-        if dataset  is None or len(dataset) <= 0:
-            return None
-        
-        groundTruths = {}
-
-        def processAnnotations(annotationData, studyInstanceUid, seriesId='', instanceId='', frameId=''):
-            if annotationData is None:
-                return
-
-            if annotationTypeKey not in annotationData:
-                return
-
-            targetGroundTruths = annotationData[annotationTypeKey]
-            if targetGroundTruths is None:
-                return
-
-            for groundTruth in targetGroundTruths:
-                if groundTruth["key"] not in groundTruths:
-                    targetDict = {}
-                    groundTruths[groundTruth["key"]] = targetDict
-                else:
-                    targetDict = groundTruths[groundTruth["key"]]
-
-                hash = hashGranularityIdentifier(studyInstanceUid, seriesId, instanceId, frameId, self.hashes)
-                targetDict[hash] = groundTruth["value"]
-
-        for data in dataset:
-            studyInstanceUid = data["studyInstanceUid"]
-            processAnnotations(data["annotationData"], studyInstanceUid)
-            if "series" not in data or data["series"] is None:
-                continue
-            for series in data["series"]:
-                seriesInstanceUid = series["seriesInstanceUid"] if "seriesInstanceUid" in series else ''
-                processAnnotations(series["annotationData"], studyInstanceUid, seriesInstanceUid)
-                if "instances" not in series or series["instances"] is None:
-                    continue
-                for instance in series["instances"]:
-                    sopInstanceUid = instance["sopInstanceUid"] if "sopInstanceUid" in instance else ''
-                    processAnnotations(instance["annotationData"], studyInstanceUid, seriesInstanceUid, sopInstanceUid)
-                    if "frames" not in instance or instance["frames"] is None:
-                        continue
-                    for frame in instance["frames"]:
-                        frameIndex = frame["frameIndex"] if "frameIndex" in frame else ''
-                        processAnnotations(frame["annotationData"], studyInstanceUid, seriesInstanceUid, sopInstanceUid, frameIndex)
-
-        return groundTruths
-
-        
+        return index.getGroundTruths(annotationTypeKey)
 
-    def getkeys(self, dataset, annotationTypeKey):
+    def getkeys(self, index, annotationTypeKey):
         """
-        Processes the standard dataset to obtain all of the predicted annotation keys/slugs accross all annotation levels. 
+        Obtains all of the predicted annotation keys/slugs accross all annotation levels from the study index. 
 
         Parameters
         ----------
-        dataset : json
-            The standard dataset json
+        index : StudyIndex
+            The shared index of the standard dataset
         annotationTypeKey : dictionary
             the key that specifies which algorithm type should be processed to obtain the ground truths
 
         Returns
         -------
         array
-            the array of ground truth keys
+            the array of ground truth keys in the order they first appear in the dataset
 
         """
-        if dataset  is None or len(dataset) <= 0:
+        groundTruths = index.getGroundTruths(annotationTypeKey)
+        if groundTruths is None:
             return None
-        
-        keys = set()
-
-        def findKeys(annotationData):
-            if annotationData is None:
-                return
-                
-            if annotationTypeKey not in annotationData:
-                return
-
-            targetGroundTruths = annotationData[annotationTypeKey]
-            if targetGroundTruths is None:
-                return
-            for groundTruth in targetGroundTruths:
-                keys.add(groundTruth["key"])
-
-        for data in dataset:
-            findKeys(data["annotationData"])
-            if "series" not in data or data["series"] is None:
-                continue
-            for series in data["series"]:
-                findKeys(series["annotationData"])
-                if "instances" not in series or series["instances"] is None:
-                    continue
-                for instance in series["instances"]:
-                    findKeys(instance["annotationData"])
-                    if "frames" not in instance or instance["frames"] is None:
-                        continue
-                    for frame in instance["frames"]:
-                        findKeys(frame["annotationData"])
-
-        return keys
+        return list(groundTruths.keys())
@@ -1,18 +1,37 @@
 import json
 
 from .base import MetricsFactory
-from evaluations.boundingBox import BoundingBoxEvaluation
+from evaluations.boundingBox import BoundingBoxEvaluation, IncrementalBoundingBoxEvaluation
 
 class BoundingBoxEvaluationFactory(MetricsFactory):
 
-    def __init__(self, dataset, output, previousEvaluation):
-        super(BoundingBoxEvaluationFactory, self).__init__(dataset, output, "boundingBox", "boundingBoxOutput")
+    def __init__(self, index, previousEvaluation, bootstrap=None, studyCache=None):
+        super(BoundingBoxEvaluationFactory, self).__init__(index, "boundingBox", "boundingBoxOutput")
         self.previousEvaluation = previousEvaluation
+        self.bootstrap = bootstrap
+        self.studyCache = studyCache
         
-    def getEvaluation(self, key, groundTruths, predictions):
-        return BoundingBoxEvaluation(key, 
+    def getEvaluationTask(self, key, groundTruths, predictions):
+        #the study cache supersedes the previous evaluation as it only reuses the studies that didn't change
+        if self.studyCache is not None:
+            return IncrementalBoundingBoxEvaluation, (key, 
+                groundTruths, 
+                predictions, 
+                self.studyCache.getPartials("boundingBox", key), 
+                self.bootstrap
+            )
+        return BoundingBoxEvaluation, (key, 
             groundTruths, 
             predictions, 
-            None if self.previousEvaluation is None else [x for x in self.previousEvaluation if x["key"] == key][0]["output"]
+            None if self.previousEvaluation is None else [x for x in self.previousEvaluation if x["key"] == key][0]["output"],
+            self.bootstrap
         )
-       
\ No newline at end of file
+
+    def resolveEvaluations(self, evaluations):
+        evaluations = super(BoundingBoxEvaluationFactory, self).resolveEvaluations(evaluations)
+        if self.studyCache is not None and evaluations is not None:
+            #keep the partial results of the studies for the next run
+            for wrapper in evaluations:
+                wrapper["output"], partials = wrapper["output"]
+                self.studyCache.setPartials("boundingBox", wrapper["key"], partials)
+        return evaluations
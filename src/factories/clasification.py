@@ -1,19 +1,50 @@
 import json
 
 from .base import MetricsFactory
-from evaluations.classification import ClassificationEvaluation
-from utils.data import hashGranularityIdentifier
+from utils.profiler import span
+from evaluations.classification import ClassificationEvaluation, getLabelPairs, getConfusionMatrixDictionary
 
 class ClassificationEvaluationFactory(MetricsFactory):
 
-    def __init__(self, dataset, output, threshold, binary_maps):
+    def __init__(self, index, threshold, binary_maps, bootstrap=None, sweepThresholds=None, curvePoints=None):
         self.threshold = threshold
         self.binary_maps = binary_maps
-        super(ClassificationEvaluationFactory, self).__init__(dataset, output, "classification", "classificationOutput")
-        self.rocInputs = self.getROCInputDictionary(output, self.groundTruths, self.binary_maps)
-        
-    def getEvaluation(self, key, groundTruths, predictions):
-        return ClassificationEvaluation(groundTruths, predictions, self.rocInputs[key], self.threshold)
+        self.bootstrap = bootstrap
+        self.sweepThresholds = sweepThresholds
+        self.curvePoints = curvePoints
+        super(ClassificationEvaluationFactory, self).__init__(index, "classification", "classificationOutput")
+        with span("rocInputs", algorithmType="classification"):
+            self.rocInputs = self.getROCInputDictionary(index, self.groundTruths, self.binary_maps)
+        self.labelPairs = {}
+        self.confusionMatrices = {}
+
+    def Submit(self, executor=None):
+        if self.predictedKeys is not None:
+            # count the confusion matrices of all the keys at once before the keys are evaluated
+            with span("confusionMatrices", algorithmType="classification"):
+                self.labelPairs = {key: getLabelPairs(*self.getEvaluationInputs(key)) for key in self.predictedKeys}
+                self.confusionMatrices = getConfusionMatrixDictionary(self.labelPairs)
+        return super(ClassificationEvaluationFactory, self).Submit(executor)
+
+    def getEvaluationInputs(self, key):
+        #the same ground truths and predictions the evaluation wrapper gives to the evaluation of the key
+        predictionsForKey = self.predictions[key]
+        nonNullPredictions = {k:v for k,v in predictionsForKey.items() if v is not None}
+        validGroundTruths = {k:v for k,v in self.groundTruths[key].items() if k in predictionsForKey}
+        return validGroundTruths, nonNullPredictions
+
+    def getEvaluationTask(self, key, groundTruths, predictions):
+        valuesIndexDictionary, gts, preds = self.labelPairs[key]
+        return ClassificationEvaluation, (valuesIndexDictionary, 
+            self.confusionMatrices[key], 
+            self.rocInputs[key], 
+            self.threshold, 
+            #the label pairs are only needed to resample them
+            None if self.bootstrap is None else (gts, preds), 
+            self.bootstrap,
+            self.sweepThresholds,
+            self.curvePoints
+        )
        
     def getTargetPredictionFromOutput(self, output):
         #unknowns
@@ -34,7 +65,7 @@ class ClassificationEvaluationFactory(MetricsFactory):
         return output
 
 
-    def getROCInputDictionary(self, outputs, groundTruths, binary_maps):
+    def getROCInputDictionary(self, index, groundTruths, binary_maps):
         """
         Processes the standard output to obtain binary y_truth and y_score values for the prediction of every study to use this information in order to compute ROC AUC scores. 
         For true binary cases, this will use the non-negative label probability as the y_score.
@@ -43,8 +74,8 @@ class ClassificationEvaluationFactory(MetricsFactory):
 
         Parameters
         ----------
-        outputs : json
-            The standard output json
+        index : StudyIndex
+            The shared index of the standard output
         groundTruths : dictionary
             the ground truth dictionary as given by the getGroundTruthDictionary function
         binary_maps : dictionary
@@ -68,38 +99,29 @@ class ClassificationEvaluationFactory(MetricsFactory):
             return None
 
         rocInputs = {}
+        outputs = index.getOutputs("classificationOutput")
         
-        for study in [s for s in outputs["studies"] if "classificationOutput" in s and s["classificationOutput"] is not None]:
-            for output in study["classificationOutput"]:
-                if output["key"] not in rocInputs:
-                    targetDict = {}
-                    rocInputs[output["key"]] = targetDict
-                else:
-                    targetDict = rocInputs[output["key"]]
+        for key, keyOutputs in ({} if outputs is None else outputs).items():
+            targetDict = {}
+            rocInputs[key] = targetDict
 
+            for granularityId, outputValues in keyOutputs:
                 #unknowns, we don't need to include unknowns on our ROC inputs since this can just be skipped as no calculation can take place on them
-                if output["output"] is None or any(val is None for val in output["output"].values()):
+                if outputValues is None or any(val is None for val in outputValues.values()):
                     continue;
 
-                # get the granularity hash
-                studyInstanceUID = study["studyInstanceUID"]
-                seriesInstanceUID = output["seriesInstanceUID"] if "seriesInstanceUID" in output else ''
-                sopInstanceUID = output["sopInstanceUID"] if "sopInstanceUID" in output else ''
-                frameIndex = output["frameIndex"] if "frameIndex" in output else ''
-                hash = hashGranularityIdentifier(studyInstanceUID, seriesInstanceUID, sopInstanceUID, frameIndex)
-
-                for predictionKey in output["output"].keys():
-                    outputVal = output["output"][predictionKey]
+                for predictionKey in outputValues.keys():
+                    outputVal = outputValues[predictionKey]
 
                     #make sure we have a matching ground truth for our predictions, otherwise, just ignore this prediction
-                    if output["key"] not in groundTruths or hash not in groundTruths[output["key"]]:
+                    if key not in groundTruths or granularityId not in groundTruths[key]:
                         continue
                     
                     BinaryRocKey = "Binary_ROC"
 
                     # when we do binary mapping, only take the first positive value as we well aggregate the rest of the positives
                     # and the negatives will simply be implied
-                    if binary_maps is not None and output["key"] in binary_maps and binary_maps[output["key"]].mapLabel(predictionKey) == "1":
+                    if binary_maps is not None and key in binary_maps and binary_maps[key].mapLabel(predictionKey) == "1":
                         if BinaryRocKey not in targetDict:
                             rocIns = {}
                             targetDict[BinaryRocKey] = rocIns
@@ -112,18 +134,18 @@ class ClassificationEvaluationFactory(MetricsFactory):
 
                         # for binary maps, the probability of whether a study is classified as "positive" or "negative" would
                         # be the sum of the probabilities of all the predictions in the same binary split
-                        map = binary_maps[output["key"]]
+                        map = binary_maps[key]
                         siblingLabels = map.getSiblingLabels(predictionKey)
                         aggregate = 0
-                        for label in output["output"].keys():
+                        for label in outputValues.keys():
                             if label not in siblingLabels:
                                 continue;
-                            aggregate += output["output"][label]
+                            aggregate += outputValues[label]
                         rocIns["actual"].append(aggregate)
 
                         # similarly to the multi-classification actual flag calculation
                         # but we have to do a bitwise or on all the labels
-                        if groundTruths[output["key"]][hash] in siblingLabels:
+                        if groundTruths[key][granularityId] in siblingLabels:
                             expected = 1
                         else:
                             expected = 0
@@ -132,7 +154,7 @@ class ClassificationEvaluationFactory(MetricsFactory):
                         break # we are done with this output
                     
                     # if we have a binary classification (either is or isn't)
-                    elif len(output["output"].keys()) == 1:
+                    elif len(outputValues.keys()) == 1:
                         
                         if BinaryRocKey not in targetDict:
                             rocIns = {}
@@ -145,7 +167,7 @@ class ClassificationEvaluationFactory(MetricsFactory):
                             rocIns["expected"] = []
 
                         rocIns["actual"].append(outputVal)
-                        expected = 0 if groundTruths[output["key"]][hash] == "0" else 1
+                        expected = 0 if groundTruths[key][granularityId] == "0" else 1
                         rocIns["expected"].append(expected)
 
                     # otherwise we have to find out whether our prediction falls in our class or a different class (pseudo-binary)
@@ -162,7 +184,7 @@ class ClassificationEvaluationFactory(MetricsFactory):
                             rocIns["expected"] = []
 
                         rocIns["actual"].append(outputVal)
-                        expected = 1 if groundTruths[output["key"]][hash] == outputVal else 0
+                        expected = 1 if groundTruths[key][granularityId] == outputVal else 0
                         rocIns["expected"].append(expected)
         
         return rocInputs
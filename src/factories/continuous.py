@@ -5,8 +5,9 @@ from evaluations.continuous import ContinuousEvaluation
 
 class ContinuousEvaluationFactory(MetricsFactory):
 
-    def __init__(self, dataset, output):
-        super(ContinuousEvaluationFactory, self).__init__(dataset, output, "continuous", "continuousOutput")
+    def __init__(self, index, bootstrap=None):
+        super(ContinuousEvaluationFactory, self).__init__(index, "continuous", "continuousOutput")
+        self.bootstrap = bootstrap
         
         self.datasetStudyUids = list()
 
@@ -14,14 +15,14 @@ class ContinuousEvaluationFactory(MetricsFactory):
             groundTruthDict = self.groundTruths[key]
             self.datasetStudyUids = list(set().union(self.datasetStudyUids, list(groundTruthDict.keys())))
         
-    def Create(self):
+    def Submit(self, executor=None):
         #don't use self.predictedKeys as we don't need to intersect prediction keys with ground truth keys for continuous evaluations
-        evaluations = None if self.predictions is None else list(map(self.getEvaluationWrapperForkey, self.predictions.keys()))
+        evaluations = None if self.predictions is None else [self.getEvaluationWrapperForkey(key, executor) for key in self.predictions.keys()]
         return evaluations
         
     #for continuous evaluations we have to calculate unknowns and predictions
     #differently because our output keys are not necessarily contained in our ground truth keys
-    def getEvaluationWrapperForkey(self, key):    
+    def getEvaluationWrapperForkey(self, key, executor=None):    
         """
         Builds the common wrapper object for an evaluation that will contain information about unknowns, failures, and keys
 
@@ -29,6 +30,8 @@ class ContinuousEvaluationFactory(MetricsFactory):
         ----------
         key : string
             they key of the annotation class for this evaluation wrapper
+        executor : Executor
+            optional pool to submit the evaluation to, the output of the wrapper will be a future in that case
 
         Returns
         -------
@@ -44,15 +47,20 @@ class ContinuousEvaluationFactory(MetricsFactory):
         nonNullPredictions  = {k:v for k,v in predictionsForKey.items()  if v is not None}
         #now get a list of all the unknown predictions
         nullPredictions  = {k:v for k,v in predictionsForKey.items()  if v is None}
-        unknowns = list(map(lambda x: x[0], nullPredictions.items()))
+        #continuous evaluations report the granularity hashes of the unknowns and failures
+        unknowns = list(map(lambda x: self.granularities.getHash(x[0]), nullPredictions.items()))
         
         #FAILURES
         #Here we just consider wether there is an output for the particular study that has a "continuousOutput" object
-        failures = list(filter(lambda uid: uid not in predictionsForKey.keys(), self.datasetStudyUids))
+        failures = [self.granularities.getHash(uid) for uid in self.datasetStudyUids if uid not in predictionsForKey]
 
         return {
             "key": key,
             "unknowns": unknowns,
             "failures": failures,
-            "output": ContinuousEvaluation(key, self.groundTruths, nonNullPredictions)
-        }
\ No newline at end of file
+            "output": self.runEvaluation(key, self.groundTruths, nonNullPredictions, executor)
+        }
+
+    def getEvaluationTask(self, key, groundTruths, predictions):
+        #the continuous evaluation scatter plots the predictions against the ground truths of every key
+        return ContinuousEvaluation, (key, groundTruths, predictions, self.bootstrap)
\ No newline at end of file
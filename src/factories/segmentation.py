@@ -1,13 +1,37 @@
 import json
 
 from .base import MetricsFactory
-from evaluations.segmentation import SegmentationEvaluation
+from evaluations.segmentation import SegmentationEvaluation, IncrementalSegmentationEvaluation
 
 class SegmentationEvaluationFactory(MetricsFactory):
 
-    def __init__(self, dataset, output):
-        super(SegmentationEvaluationFactory, self).__init__(dataset, output, "segmentation", "segmentationOutput")
+    def __init__(self, index, bootstrap=None, chunkSize=None, datasetDirectory=None, outputDirectory=None, studyCache=None):
+        self.bootstrap = bootstrap
+        self.chunkSize = chunkSize
+        self.datasetDirectory = datasetDirectory
+        self.outputDirectory = outputDirectory
+        self.studyCache = studyCache
+        super(SegmentationEvaluationFactory, self).__init__(index, "segmentation", "segmentationOutput")
         
-    def getEvaluation(self, key, groundTruths, predictions):
-        return SegmentationEvaluation(groundTruths, predictions)
-       
\ No newline at end of file
+    def getEvaluationTask(self, key, groundTruths, predictions):
+        if self.studyCache is not None:
+            return IncrementalSegmentationEvaluation, (key, 
+                groundTruths, 
+                predictions, 
+                self.studyCache.getPartials("segmentation", key), 
+                self.bootstrap, 
+                self.chunkSize, 
+                self.datasetDirectory, 
+                self.outputDirectory
+            )
+        return SegmentationEvaluation, (key, groundTruths, predictions, self.bootstrap, self.chunkSize, self.datasetDirectory, self.outputDirectory)
+
+    def resolveEvaluations(self, evaluations):
+        evaluations = super(SegmentationEvaluationFactory, self).resolveEvaluations(evaluations)
+        if self.studyCache is not None and evaluations is not None:
+            #keep the partial results of the studies for the next run
+            for wrapper in evaluations:
+                wrapper["output"], partials = wrapper["output"]
+                self.studyCache.setPartials("segmentation", wrapper["key"], partials)
+        return evaluations
+       
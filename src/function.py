@@ -1,13 +1,59 @@
 import boto3
 from botocore.client import Config
+import codecs
 import json
-
-from factories.clasification import ClassificationEvaluationFactory
-from factories.continuous import ContinuousEvaluationFactory
-from factories.boundingBox import BoundingBoxEvaluationFactory
-from factories.segmentation import SegmentationEvaluationFactory
-from utils.binaryMap import BinaryClassificationMap
-
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from main import serializeEvaluation
+from evaluationFactory import EvaluationFactory
+from utils.jsonStream import iterateJsonArray
+from utils.studyIndex import StudyIndex
+from utils.data import parseThresholds
+from utils.profiler import span, startProfiling, stopProfiling, getProfileFilePath
+
+# the client is created on the first invocation and reused by the next invocations of the same (warm) lambda container
+s3Client = None
+
+def getS3Client():
+    """
+    Gets the shared S3 client. The S3_ENDPOINT_URL environment variable points the client to another S3 compatible
+    endpoint, i.e. a local S3 stand-in to run the handler outside of AWS
+    """
+    global s3Client
+    if s3Client is None:
+        config = Config(connect_timeout=5, retries={'max_attempts': 0})
+        s3Client = boto3.client('s3', config=config, endpoint_url=os.environ.get('S3_ENDPOINT_URL'))
+    return s3Client
+
+def iterateS3JsonArray(s3, bucket, key, propertyName=None):
+    """
+    Downloads a json file from S3 decoding the elements of its array as the body is received, so the whole file is never
+    held in memory as bytes or text
+
+    Parameters
+    ----------
+    s3 : S3 client
+        the S3 client
+    bucket : string
+        the bucket of the file
+    key : string
+        the key of the file
+    propertyName : string
+        optional name of the top level property that holds the array
+
+    Returns
+    -------
+    generator
+        generator yielding the decoded elements of the array in order
+
+    """
+    response = s3.get_object(Bucket=bucket, Key=key)
+    body = response['Body']
+    try:
+        yield from iterateJsonArray(codecs.getreader('utf-8')(body), propertyName)
+    finally:
+        body.close()
 
 def lambda_handler(event, context):
 
@@ -18,54 +64,77 @@ def lambda_handler(event, context):
     bucket = event['bucket']
     binary_maps = None if 'binary_maps' not in event else event['binary_maps']
     threshold = 0.3 if 'threshold' not in event else event['threshold']
+    bootstrapResamples = 0 if 'bootstrap_resamples' not in event else event['bootstrap_resamples']
+    bootstrapSeed = 0 if 'bootstrap_seed' not in event else event['bootstrap_seed']
+    sweepThresholds = None if 'threshold_sweep' not in event else parseThresholds(event['threshold_sweep'])
+    curvePoints = None if 'curve_points' not in event else event['curve_points']
+    compact = False if 'compact' not in event else event['compact']
+    # optional key to write the evaluation back to, in the same bucket
+    evaluationFileKey = None if 'evaluationFileKey' not in event else event['evaluationFileKey']
+    # optional profile of the phases of the evaluation, written to profileFileKey or next to the evaluation
+    profile = False if 'profile' not in event else event['profile']
+    profileFileKey = None if 'profileFileKey' not in event else event['profileFileKey']
+    if profileFileKey is None and evaluationFileKey is not None:
+        profileFileKey = getProfileFilePath(evaluationFileKey)
+
+    if profile:
+        startProfiling()
+    try:
+        s3 = getS3Client()
+
+        # download both files at the same time, the dataset is indexed while it is received and the studies of the output are
+        # decoded as they are received. The output is indexed after the dataset so the ids are the same as a local evaluation
+        print('loading dataset and output...')
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            datasetIndex = executor.submit(lambda: downloadDatasetIndex(s3, bucket, datasetFileKey))
+            outputStudies = executor.submit(lambda: downloadOutputStudies(s3, bucket, outputFileKey))
+            datasetIndex = datasetIndex.result()
+            outputStudies = outputStudies.result()
+        with span("indexBuild"):
+            index = datasetIndex.withOutput({"studies": outputStudies})
+        print('dataset and output loaded')
+
+        bootstrap = EvaluationFactory.getBootstrap(bootstrapResamples, bootstrapSeed)
+        factory = EvaluationFactory.fromIndex(index, threshold, binary_maps, bootstrap=bootstrap, sweepThresholds=sweepThresholds, curvePoints=curvePoints)
+
+        print('created evaluation factory')
+
+        evaluation = factory.Create()
+
+        print('calculated evaluation as ', evaluation)
+
+        if evaluationFileKey is not None:
+            with span("serialization", compact=bool(compact)):
+                body = serializeEvaluation(evaluation, compact).encode('utf-8')
+            with span("evaluationWrite"):
+                s3.put_object(Bucket=bucket, Key=evaluationFileKey, Body=body, ContentType='application/json')
+            print('evaluation written to', evaluationFileKey)
+
+        return evaluation
+    finally:
+        # the profile is also written when the evaluation fails, to know the phase it failed on
+        if profile:
+            writeProfile(stopProfiling(), bucket, profileFileKey)
+
+def downloadDatasetIndex(s3, bucket, datasetFileKey):
+    # the dataset is indexed as it is received, so the span covers the download, the parse and the index of the ground truths
+    with span("jsonLoad", file="dataset"):
+        return StudyIndex.fromDataset(iterateS3JsonArray(s3, bucket, datasetFileKey))
+
+def downloadOutputStudies(s3, bucket, outputFileKey):
+    with span("jsonLoad", file="output"):
+        return list(iterateS3JsonArray(s3, bucket, outputFileKey, "studies"))
+
+def writeProfile(profile, bucket, profileFileKey):
+    """
+    Writes the profile of an evaluation to S3, or prints it to the logs when there is no key to write it to
+    """
+    if profileFileKey is None:
+        print('evaluation profile', json.dumps(profile))
+        return
+    getS3Client().put_object(Bucket=bucket, Key=profileFileKey, Body=json.dumps(profile, indent=4).encode('utf-8'), ContentType='application/json')
+    print('profile written to', profileFileKey)
 
-    config = Config(connect_timeout=5, retries={'max_attempts': 0})
-    s3 = boto3.client('s3', config=config)
-    
-
-    
-    # print('printing test output from boto3')
-    # response = s3.list_objects_v2(Bucket=bucket)
-    # files = response.get("Contents")
-    # for file in files:
-    #     print(f"file_name: {file['Key']}, size: {file['Size']}")
-
-
-    print('loading dataset...')
-    datasetresponse = s3.get_object(Bucket=bucket,Key=datasetFileKey)
-    print('got response', datasetresponse)
-    datasetresponsefile=datasetresponse['Body'].read().decode('utf-8')
-    datasetresponsefile=str(datasetresponsefile)
-    dataset = json.loads(datasetresponsefile)
-    print('dataset loaded')
-
-    print('loading output...')
-    outputresponse = s3.get_object(Bucket=bucket,Key=outputFileKey)
-    print('got response', outputresponse)
-    outputresponsefile=outputresponse['Body'].read().decode('utf-8')
-    outputresponsefile=str(outputresponsefile)
-    output = json.loads(outputresponsefile)
-    print('output loaded')
-
-    binaryMaps = None if binary_maps is None else {k:BinaryClassificationMap(v["presentLabels"], v["absentLabels"]) for (k,v) in binary_maps.items()}
-    classificationFactory = ClassificationEvaluationFactory(dataset, output, threshold, binaryMaps)
-    continuousFactory = ContinuousEvaluationFactory(dataset, output)
-    boundingBoxFactory = BoundingBoxEvaluationFactory(dataset, output, None)
-    segmentationFactory = SegmentationEvaluationFactory(dataset, output)
-
-    print('created evaluation factories')
-
-    evaluation = {
-        "classification": classificationFactory.Create(),
-        "continuous": continuousFactory.Create(),
-        "boundingBox": boundingBoxFactory.Create(),
-        "segmentation": segmentationFactory.Create()
-    }
-
-    print('calculated evaluation as ', evaluation)
-
-    return evaluation
-    
 
 if __name__ == "__main__":
     event = {
@@ -3,8 +3,12 @@ import sys
 import os
 import json
 import traceback 
+import multiprocessing
 
 from evaluationFactory import EvaluationFactory
+from utils.resultCache import ResultCache, getFileDigest, getRunKey, getReferencedMaskPaths, fileContains
+from utils.data import parseThresholds
+from utils.profiler import span, startProfiling, stopProfiling, getProfileFilePath
 
 def securePath(path):
     """
@@ -24,42 +28,170 @@ def securePath(path):
     if not realPath.startswith(examplesFolderPath) and not realPath.startswith(aiLabFolderPath):
         raise Exception('Security Error: Invalid path: ' + realPath + '. Filepaths must reside within the examples folder if run locally or within the /app/Data folder if run from AI Lab')
 
-if __name__ == '__main__':
+def getResultCacheKey(args):
+    """
+    Creates the result cache key of a run from its inputs and the arguments that change the evaluation
+    """
+    previousEvaluation = None
+    if args.use_cache and args.study_cache_path is None and args.evaluation_file_path is not None and len(args.evaluation_file_path) > 0 and os.path.isfile(args.evaluation_file_path) and os.stat(args.evaluation_file_path).st_size > 0:
+        previousEvaluation = getPreviousEvaluationDigest(args.evaluation_file_path, args.output_file_path)
+
+    # the .npy masks of the segmentations can change without any change of the json files that reference them
+    maskPaths = getReferencedMaskPaths(args.dataset_file_path) + getReferencedMaskPaths(args.output_file_path)
+
+    return getRunKey(args.dataset_file_path, args.output_file_path, {
+        "threshold": args.threshold,
+        "thresholdSweep": parseThresholds(args.threshold_sweep),
+        "curvePoints": args.curve_points,
+        "compact": args.compact,
+        "binaryMaps": args.binary_maps,
+        "bootstrapResamples": args.bootstrap_resamples,
+        "bootstrapSeed": args.bootstrap_seed if args.bootstrap_resamples > 0 else None,
+        "previousEvaluation": previousEvaluation,
+        "npyMasks": {path: getFileDigest(path) for path in maskPaths}
+    })
+
+def getPreviousEvaluationDigest(evaluationFilePath, outputFilePath):
+    """
+    Gets the digest of the previous evaluation when it changes the evaluation, which is only when the run has bounding box
+    outputs and their areas are reused from the bounding box evaluation of the previous evaluation. Otherwise rerunning the
+    same evaluation would change its own key by writing the evaluation file
+    """
+    # the output is only searched for the key, the previous evaluation is only parsed for the runs with bounding boxes
+    if not fileContains(outputFilePath, b'"boundingBoxOutput"'):
+        return None
+    with open(evaluationFilePath) as previousEvaluationFile:
+        previousEvaluation = json.load(previousEvaluationFile)
+    if not isinstance(previousEvaluation, dict) or not previousEvaluation.get("boundingBox"):
+        return None
+    return getFileDigest(evaluationFilePath)
+
+def getArgumentParser():
+    """
+    Creates the parser of the arguments of an evaluation
+    """
     parser = argparse.ArgumentParser(description='AI Lab Evaluation Metrics')
     parser.add_argument("--dataset_file_path",nargs="?", default=None, help="string, the path to the ground truth json file", type=str)
     parser.add_argument("--output_file_path",nargs="?", default=None, help="string, the path to the prediction json file", type=str)
     parser.add_argument("--evaluation_file_path",nargs="?", default=None, help="string, the path to the resulting results for the evaluation", type=str)
     parser.add_argument("--threshold", nargs="?", default=0.5, help="float, the threshold of the evaluation for binary classification", type=float)
     parser.add_argument("--binary_maps", nargs="?", default=None, help="string, the serialized json object of the binary maps for evaluations", type=str)
+    parser.add_argument("--threshold_sweep", nargs="?", default=None, help="string, the thresholds to add the binary classification metrics at to the evaluation, either comma separated (0.1,0.3,0.5) or a start:stop:step range (0.05:0.95:0.05)", type=str)
     
     parser.add_argument('--cache', dest='use_cache', action='store_true')
     parser.add_argument('--no_cache', dest='use_cache', action='store_false')
     parser.set_defaults(use_cache=True)
-    
-    args=parser.parse_args()
-    #path transversal mitigation
+
+    parser.add_argument("--curve_points", nargs="?", default=None, help="int, the maximum number of points of the ROC and precision-recall curves, keeping the convex hull of the ROC curve and the point of the threshold. The curves have a point for every distinct score when not given", type=int)
+    parser.add_argument("--segmentation_chunk_size", nargs="?", default=None, help="int, the maximum number of voxels of every segmentation mask stored in a .npy file read at a time, which bounds the memory used by large volumes", type=int)
+    parser.add_argument('--compact', dest='compact', action='store_true', help="flag, write the evaluation without indentation or spaces to reduce its size")
+    parser.add_argument('--stream', dest='stream', action='store_true', help="flag, parse the dataset and output json files one study at a time to reduce memory usage on large files")
+    parser.add_argument("--workers", nargs="?", default=1, help="int, the number of processes used to evaluate the annotation keys in parallel", type=int)
+    parser.add_argument("--bootstrap_resamples", nargs="?", default=0, help="int, the number of bootstrap resamples used to add 95% confidence intervals to the metrics, 0 to disable them", type=int)
+    parser.add_argument("--bootstrap_seed", nargs="?", default=0, help="int, the seed of the bootstrap resamples", type=int)
+    parser.add_argument("--result_cache_dir", nargs="?", default=None, help="string, the path to the directory caching whole evaluations, runs with the same inputs and arguments return the cached evaluation", type=str)
+    parser.add_argument("--result_cache_size", nargs="?", default=512, help="int, the maximum size of the result cache directory in megabytes", type=int)
+    parser.add_argument("--study_cache_path", nargs="?", default=None, help="string, the path to the cache of the per-study results, only the studies that changed since the last run are calculated", type=str)
+    parser.add_argument('--profile', dest='profile', action='store_true', help="flag, record the time and peak memory of every phase of the evaluation and write them to a .profile.json file next to the evaluation file")
+    return parser
+
+def serializeEvaluation(evaluation, compact=False):
+    """
+    Serializes an evaluation, indented or, when compact, without any whitespace
+    """
+    if compact:
+        return json.dumps(evaluation, ensure_ascii=False, separators=(',', ':'))
+    return json.dumps(evaluation, ensure_ascii=False, indent=4)
+
+def securePaths(args):
+    """
+    secures all the paths of the arguments of an evaluation. Throws security exception if any path is insecure
+    """
     securePath(args.dataset_file_path)
     securePath(args.output_file_path)
-    securePath(args.evaluation_file_path)
-    
-    if(args.binary_maps != None):
-        args.binary_maps = json.loads(args.binary_maps)
+    # the optional paths are only checked when they are given
+    for path in [args.evaluation_file_path, args.study_cache_path, args.result_cache_dir]:
+        if path is not None:
+            securePath(path)
 
+def runEvaluation(args):
+    """
+    Runs an evaluation, writing it to the evaluation file if its path was given
+
+    Parameters
+    ----------
+    args : arguments
+        the arguments of the evaluation as given by the parser of getArgumentParser, with the binary maps already deserialized
+
+    Returns
+    -------
+    string
+        The serialized evaluation
+
+    """
+    print("Building evaluation with args: ", args)
+    if args.profile:
+        startProfiling()
     try:
-        print("Building evaluation with args: ", args)
-        factory = EvaluationFactory(args)
-        output = factory.Create()
-        print("Evaluation complete")
+        evaluation = None
+        if args.result_cache_dir is not None:
+            with span("resultCacheLookup"):
+                resultCache = ResultCache(args.result_cache_dir, args.result_cache_size * 1024 * 1024)
+                runKey = getResultCacheKey(args)
+                evaluation = resultCache.get(runKey)
+
+        if evaluation is not None:
+            print("Evaluation found in the result cache")
+        else:
+            factory = EvaluationFactory(args)
+            output = factory.Create()
+            print("Evaluation complete")
+            if factory.studyCache is not None:
+                factory.studyCache.save(args.study_cache_path)
+            with span("serialization", compact=bool(args.compact)):
+                evaluation = serializeEvaluation(output, args.compact)
+            if args.result_cache_dir is not None:
+                resultCache.put(runKey, evaluation)
+
         if args.evaluation_file_path is not None and len(args.evaluation_file_path) > 0:
             print("Writing results to output json....")
-            with open(args.evaluation_file_path, 'w', encoding='utf-8') as f:
-                json.dump(output, f, ensure_ascii=False, indent=4)
+            with span("evaluationWrite"):
+                with open(args.evaluation_file_path, 'w', encoding='utf-8') as f:
+                    f.write(evaluation)
             print("Writing results to json completed....")
-        else:
-            print('OUTPUT', json.dumps(output, indent=4, sort_keys=True))
+        return evaluation
+    finally:
+        # the profile is also written when the evaluation fails, to know the phase it failed on
+        if args.profile:
+            writeProfile(stopProfiling(), args.evaluation_file_path)
+
+def writeProfile(profile, evaluationFilePath):
+    """
+    Writes the profile of an evaluation next to its evaluation file, or prints it when the evaluation has no file
+    """
+    if evaluationFilePath is None or len(evaluationFilePath) <= 0:
+        print('PROFILE', json.dumps(profile, indent=4))
+        return
+    with open(getProfileFilePath(evaluationFilePath), 'w', encoding='utf-8') as f:
+        json.dump(profile, f, indent=4)
+
+if __name__ == '__main__':
+    # needed for the process pools of the frozen executable
+    multiprocessing.freeze_support()
+
+    args = getArgumentParser().parse_args()
+    #path transversal mitigation
+    securePaths(args)
+    
+    if(args.binary_maps != None):
+        args.binary_maps = json.loads(args.binary_maps)
+
+    try:
+        evaluation = runEvaluation(args)
+        if args.evaluation_file_path is None or len(args.evaluation_file_path) <= 0:
+            print('OUTPUT', json.dumps(json.loads(evaluation), indent=4, sort_keys=True))
         
     except Exception as err:
         print(err, file=sys.stderr)
         traceback.print_exc() 
         sys.exit(1)
-
@@ -0,0 +1,310 @@
+import argparse
+import sys
+import os
+import json
+import threading
+import traceback
+import socketserver
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from main import getArgumentParser, securePaths, runEvaluation
+from evaluationFactory import EvaluationFactory
+
+# the modules the worker processes are started with so the jobs don't pay for their imports, the sub factories
+# are imported lazily by the evaluations so they are preloaded explicitly
+PRELOADED_MODULES = ["main", "utils.bootstrap"] + list(EvaluationFactory.factoryModules.values())
+
+def runJob(request):
+    """
+    Runs the evaluation of a request on a worker process
+
+    Parameters
+    ----------
+    request : json object
+        the request with the arguments of the evaluation as keys, using the destination names of the command line arguments
+        (i.e. {"dataset_file_path": "...", "output_file_path": "...", "threshold": 0.5})
+
+    Returns
+    -------
+    json object
+        The response, with the evaluation when the request has no evaluation file path
+
+    """
+    args = getJobArguments(request)
+    #path transversal mitigation
+    securePaths(args)
+
+    evaluation = runEvaluation(args)
+    if args.evaluation_file_path is not None and len(args.evaluation_file_path) > 0:
+        return {"status": "ok", "evaluationFilePath": args.evaluation_file_path}
+    return {"status": "ok", "evaluation": json.loads(evaluation)}
+
+def getJobArguments(request):
+    """
+    Creates the arguments of an evaluation from a request, the arguments not in the request have the same defaults as the command line
+
+    Parameters
+    ----------
+    request : json object
+        the request with the arguments of the evaluation as keys
+
+    Returns
+    -------
+    arguments
+        The arguments of the evaluation
+
+    """
+    parser = getArgumentParser()
+    actions = {action.dest: action for action in parser._actions}
+    args = parser.parse_args([])
+    for name, value in request.items():
+        if name == "id":
+            continue
+        if not hasattr(args, name):
+            raise ValueError('unknown argument {0}'.format(name))
+        # the binary maps can be sent either serialized, like on the command line, or as an object
+        if name == "binary_maps" and isinstance(value, dict):
+            args.binary_maps = value
+            continue
+        setattr(args, name, parseJobValue(actions[name], value))
+
+    # every job already runs on its own worker process of the bounded pool of the server
+    if args.workers is not None and args.workers > 1:
+        raise ValueError("the jobs of the server run on a single process, the number of workers of the server is set when it starts")
+
+    if isinstance(args.binary_maps, str):
+        args.binary_maps = json.loads(args.binary_maps)
+    return args
+
+def parseJobValue(action, value):
+    """
+    Parses the value of an argument of a request with the type of its command line argument
+
+    Parameters
+    ----------
+    action : argparse action
+        the command line argument
+    value : json value
+        the value of the argument in the request
+
+    Returns
+    -------
+    any
+        The value of the argument, with the same type it has when it is given on the command line
+
+    """
+    # the flags are booleans
+    if action.type is None:
+        if not isinstance(value, bool):
+            raise ValueError('the argument {0} must be a boolean'.format(action.dest))
+        return value
+    if value is None:
+        return None
+    # the strings are parsed like on the command line, the numbers are only accepted by the arguments that are numbers
+    if isinstance(value, str) or (isinstance(value, (int, float)) and not isinstance(value, bool) and action.type in (int, float)):
+        try:
+            return action.type(str(value))
+        except ValueError:
+            pass
+    raise ValueError('invalid value {0} of the argument {1}'.format(json.dumps(value), action.dest))
+
+def initializeWorker():
+    # the standard output of the daemon is reserved for the responses
+    sys.stdout = sys.stderr
+
+class EvaluationServer:
+    """
+    Long running server that keeps the evaluation modules loaded and runs the evaluation requests on a bounded pool of
+    worker processes. Every job runs on its own process so a failing job can't affect the others or the server
+
+    ...
+
+    Attributes
+    ----------
+    workers : int
+        the number of jobs that run at the same time
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        # bound the pending jobs so the requests are not read faster than they can be evaluated
+        self.pendingJobs = threading.BoundedSemaphore(workers * 2)
+        self.lock = threading.Lock()
+        self.pool = self.createPool()
+
+    def createPool(self):
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            # the fork server process imports the evaluation modules once and every worker is forked from it
+            context = multiprocessing.get_context("forkserver")
+            context.set_forkserver_preload(PRELOADED_MODULES)
+            return ProcessPoolExecutor(max_workers=self.workers, mp_context=context, initializer=initializeWorker)
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=initializeWorker)
+
+    def replacePool(self, brokenPool):
+        # the jobs that fail at the same time share a single replacement
+        with self.lock:
+            if self.pool is brokenPool:
+                self.pool = self.createPool()
+                # release the management thread, queues and surviving workers of the broken pool without waiting on them
+                brokenPool.shutdown(wait=False)
+            return self.pool
+
+    def submit(self, request, respond):
+        """
+        Submits the evaluation of a request, blocking while the pool has too many pending jobs
+
+        Parameters
+        ----------
+        request : json object
+            the request
+        respond : function
+            the function called with the response once the job is done
+
+        """
+        self.pendingJobs.acquire()
+        jobId = request.get("id") if isinstance(request, dict) else None
+
+        def complete(future):
+            try:
+                response = future.result()
+            except BrokenProcessPool as err:
+                # a worker process died, start a new pool for the next jobs
+                self.replacePool(pool)
+                response = {"status": "error", "error": 'the worker process of the job terminated abruptly: {0}'.format(err)}
+            except Exception as err:
+                response = {"status": "error", "error": str(err)}
+            self.pendingJobs.release()
+            respond(dict({"id": jobId}, **response))
+
+        try:
+            if not isinstance(request, dict):
+                raise ValueError("the request must be a json object")
+            with self.lock:
+                pool = self.pool
+            try:
+                future = pool.submit(runJob, request)
+            except BrokenProcessPool:
+                pool = self.replacePool(pool)
+                future = pool.submit(runJob, request)
+        except Exception as err:
+            self.pendingJobs.release()
+            respond({"id": jobId, "status": "error", "error": str(err)})
+            return
+        future.add_done_callback(complete)
+
+    def serveLines(self, inputFile, outputFile):
+        """
+        Reads json lines requests from a file and writes a json line response for each of them, in the order the jobs complete
+
+        Parameters
+        ----------
+        inputFile : file
+            the file the requests are read from
+        outputFile : file
+            the file the responses are written to
+
+        """
+        outputLock = threading.Lock()
+        done = threading.Condition()
+        pending = [0]
+
+        def respond(response):
+            try:
+                with outputLock:
+                    outputFile.write(json.dumps(response) + '\n')
+                    outputFile.flush()
+            finally:
+                # the request is answered even when the client is gone and the response can't be written
+                with done:
+                    pending[0] -= 1
+                    done.notify_all()
+
+        for line in inputFile:
+            if len(line.strip()) <= 0:
+                continue
+            with done:
+                pending[0] += 1
+            try:
+                request = json.loads(line)
+            except ValueError as err:
+                respond({"id": None, "status": "error", "error": 'invalid request: {0}'.format(err)})
+                continue
+            self.submit(request, respond)
+
+        # answer every request before returning
+        with done:
+            done.wait_for(lambda: pending[0] <= 0)
+
+    def serveSocket(self, socketPath):
+        """
+        Listens on a unix socket, every connection sends json lines requests and receives a json line response for each of them
+
+        Parameters
+        ----------
+        socketPath : string
+            the path of the unix socket
+
+        """
+        server = self
+
+        class RequestHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                server.serveLines(TextLines(self.rfile), TextWriter(self.wfile))
+
+        if os.path.exists(socketPath):
+            os.remove(socketPath)
+        with socketserver.ThreadingUnixStreamServer(socketPath, RequestHandler) as socketServer:
+            socketServer.serve_forever()
+
+    def shutdown(self):
+        self.pool.shutdown()
+
+class TextLines:
+    """
+    Iterates the lines of a binary stream as text
+    """
+    def __init__(self, stream):
+        self.stream = stream
+
+    def __iter__(self):
+        for line in self.stream:
+            yield line.decode('utf-8')
+
+class TextWriter:
+    """
+    Writes text to a binary stream
+    """
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text):
+        self.stream.write(text.encode('utf-8'))
+
+    def flush(self):
+        self.stream.flush()
+
+if __name__ == '__main__':
+    # needed for the process pools of the frozen executable
+    multiprocessing.freeze_support()
+
+    parser = argparse.ArgumentParser(description='AI Lab Evaluation Metrics Server')
+    parser.add_argument("--socket", nargs="?", default=None, help="string, the path of the unix socket to listen on, the requests are read from the standard input when not given", type=str)
+    parser.add_argument("--workers", nargs="?", default=2, help="int, the number of evaluations that run at the same time", type=int)
+    args = parser.parse_args()
+
+    evaluationServer = EvaluationServer(args.workers)
+    try:
+        if args.socket is not None:
+            evaluationServer.serveSocket(args.socket)
+        else:
+            evaluationServer.serveLines(sys.stdin, sys.stdout)
+    except KeyboardInterrupt:
+        pass
+    except Exception as err:
+        print(err, file=sys.stderr)
+        traceback.print_exc()
+        sys.exit(1)
+    finally:
+        evaluationServer.shutdown()
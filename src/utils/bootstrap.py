@@ -0,0 +1,175 @@
+import numpy as np
+
+from utils.confusionMatrix import getConfusionMatrices
+
+class Bootstrap:
+    """
+    Percentile bootstrap confidence intervals for the evaluation metrics. The resamples are drawn as index matrices
+    (one row per resample) and the metrics are computed for all the rows at once from per-study values, so no metric
+    function is called once per resample
+
+    ...
+
+    Attributes
+    ----------
+    resamples : int
+        the number of bootstrap resamples
+    seed : int
+        the seed of the random generator, every metric draws its resamples from a generator with this seed so the
+        intervals are reproducible
+    confidenceLevel : float
+        the confidence level of the intervals (i.e. 0.95)
+    maxChunkSize : int
+        the maximum number of indexes held by a single index matrix, the resamples are drawn in chunks of rows when
+        there are too many studies to hold all of them at once
+    """
+
+    def __init__(self, resamples, seed=0, confidenceLevel=0.95, maxChunkSize=1 << 22):
+        if resamples is None or resamples <= 0:
+            raise ValueError("the number of bootstrap resamples must be positive")
+        if confidenceLevel <= 0 or confidenceLevel >= 1:
+            raise ValueError("the bootstrap confidence level must be between 0 and 1")
+        self.resamples = resamples
+        self.seed = seed
+        self.confidenceLevel = confidenceLevel
+        self.maxChunkSize = maxChunkSize
+
+    def getResampleIndexes(self, count):
+        """
+        Draws the resamples of a sample with replacement
+
+        Parameters
+        ----------
+        count : int
+            the number of elements in the sample
+        Returns
+        -------
+        generator
+            generator yielding (rows, count) index matrices until all the resamples were drawn
+
+        """
+        generator = np.random.default_rng(self.seed)
+        rows = max(1, min(self.resamples, self.maxChunkSize // max(count, 1)))
+        for start in range(0, self.resamples, rows):
+            yield generator.integers(0, count, size=(min(rows, self.resamples - start), count))
+
+    def getResampleCounts(self, count):
+        """
+        Draws the resamples of a sample with replacement as the number of times every element is drawn
+
+        Parameters
+        ----------
+        count : int
+            the number of elements in the sample
+        Returns
+        -------
+        generator
+            generator yielding (rows, count) matrices of draw counts until all the resamples were drawn
+
+        """
+        for indexes in self.getResampleIndexes(count):
+            rows = len(indexes)
+            offsets = (np.arange(rows) * count)[:, None]
+            yield np.bincount((indexes + offsets).ravel(), minlength=rows * count).reshape(rows, count)
+
+    def getInterval(self, samples):
+        """
+        Gets the percentile interval of the metric values of the resamples
+
+        Parameters
+        ----------
+        samples : numpy array
+            the metric value of every resample, nan where the metric is not defined for the resample
+        Returns
+        -------
+        array
+            [lower, upper] bounds of the interval, None if the metric is not defined for any resample
+
+        """
+        samples = np.asarray(samples, dtype=np.float64)
+        samples = samples[~np.isnan(samples)]
+        if len(samples) <= 0:
+            return None
+        tail = (1 - self.confidenceLevel) / 2
+        lower, upper = np.percentile(samples, [100 * tail, 100 * (1 - tail)])
+        return [lower.item(), upper.item()]
+
+    def getMeanInterval(self, values):
+        """
+        Gets the interval of a metric that is the mean of a per-study value (i.e. the mean squared error)
+
+        Parameters
+        ----------
+        values : array
+            the value of every study
+        Returns
+        -------
+        array
+            [lower, upper] bounds of the interval, None if there are no values
+
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) <= 0:
+            return None
+        return self.getInterval(np.concatenate([values[indexes].mean(axis=1) for indexes in self.getResampleIndexes(len(values))]))
+
+    def getConfusionMatrices(self, truths, predictions, labelCount):
+        """
+        Gets the confusion matrix of every resample of the prediction pairs
+
+        Parameters
+        ----------
+        truths : array
+            the label index of the ground truth of every pair
+        predictions : array
+            the label index of the prediction of every pair
+        labelCount : int
+            the number of labels
+        Returns
+        -------
+        numpy array
+            (resamples, labelCount, labelCount) array of confusion matrices
+
+        """
+        truths = np.asarray(truths, dtype=np.int64)
+        predictions = np.asarray(predictions, dtype=np.int64)
+        matrices = []
+        for indexes in self.getResampleIndexes(len(truths)):
+            groups = np.broadcast_to(np.arange(len(indexes))[:, None], indexes.shape)
+            matrices.append(getConfusionMatrices(truths[indexes], predictions[indexes], labelCount, groups, len(indexes)))
+        return np.concatenate(matrices)
+
+    def getAucSamples(self, expected, actual):
+        """
+        Calculates the ROC AUC of every resample as the Mann-Whitney statistic (ties count as half) on the scores
+        sorted a single time, weighting every score with the number of times it was drawn
+
+        Parameters
+        ----------
+        expected : array
+            the binary truths (0/1)
+        actual : array
+            the scores
+        Returns
+        -------
+        numpy array
+            the auc of every resample, nan where the resample only has one class
+
+        """
+        expected = np.asarray(expected, dtype=np.float64)
+        actual = np.asarray(actual, dtype=np.float64)
+        order = np.argsort(actual, kind="mergesort")
+        expected = expected[order]
+        scores = actual[order]
+        # the start of every group of tied scores
+        groupStarts = np.flatnonzero(np.r_[True, scores[1:] != scores[:-1]])
+
+        samples = []
+        for counts in self.getResampleCounts(len(scores)):
+            counts = counts[:, order]
+            positives = np.add.reduceat(counts * expected, groupStarts, axis=1)
+            negatives = np.add.reduceat(counts * (1 - expected), groupStarts, axis=1)
+            negativesBelow = np.cumsum(negatives, axis=1) - negatives
+            with np.errstate(divide='ignore', invalid='ignore'):
+                samples.append((positives * (negativesBelow + negatives / 2)).sum(axis=1) / (positives.sum(axis=1) * negatives.sum(axis=1)))
+        return np.concatenate(samples)
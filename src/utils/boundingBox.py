@@ -1,4 +1,5 @@
 from collections import namedtuple
+import numpy as np
 
 from .coordinate import Coordinate
 
@@ -142,3 +143,227 @@ class BoundingBox(object):
         # areas - the interesection area
         iou = interBox.getArea() / (self.getArea() + other.getArea() - interBox.getArea() )
         return iou
+
+class BoxArray(object):
+    """
+    Compact container that keeps the coordinates of many bounding boxes in contiguous arrays instead of BoundingBox objects.
+    The boxes are split in ragged groups (i.e. the boxes of every study) by an offset index
+
+    ...
+
+    Attributes
+    ----------
+    coordinates : numpy array
+        (N, 4) int32 array with the top left x, top left y, bottom right x and bottom right y of every box
+    offsets : numpy array
+        array of size number of groups + 1, the boxes of group i are coordinates[offsets[i]:offsets[i + 1]]
+    """
+
+    def __init__(self, coordinates, offsets=None):
+        if coordinates is None:
+            raise Exception("no coordinates provided for the box array")
+        self.coordinates = np.asarray(coordinates, dtype=np.int32).reshape(-1, 4)
+        self.offsets = np.array([0, len(self.coordinates)], dtype=np.int64) if offsets is None else np.asarray(offsets, dtype=np.int64)
+
+    @classmethod
+    def fromJsonData(cls, groups):
+        """
+        Builds a box array from the json data of groups of bounding boxes in a single batch
+
+        Parameters
+        ----------
+        groups : array
+            an array with each element containing an array of json objects representing bounding boxes with the schema
+            used by BoundingBox.fromJsonData
+        Returns
+        -------
+        BoxArray
+            The box array
+        """
+        offsets = np.zeros(len(groups) + 1, dtype=np.int64)
+        np.cumsum([len(group) for group in groups], out=offsets[1:])
+
+        try:
+            coordinates = np.array([
+                (box["top_left_hand_corner"]["x"], box["top_left_hand_corner"]["y"], box["bottom_right_hand_corner"]["x"], box["bottom_right_hand_corner"]["y"])
+                for group in groups for box in group
+            ])
+        except (KeyError, TypeError, ValueError):
+            coordinates = None
+
+        # anything that isn't plain numbers (missing fields, nulls, strings...) goes through the validation of the bounding box and coordinate classes
+        # which will either raise the corresponding error or convert the values the same way
+        if coordinates is None or (len(coordinates) > 0 and coordinates.dtype.kind not in 'iuf'):
+            boxes = [BoundingBox.fromJsonData(box) for group in groups for box in group]
+            coordinates = [(box.topLeft.x, box.topLeft.y, box.bottomRight.x, box.bottomRight.y) for box in boxes]
+
+        # convert to int as we will only support indivisible pixel values
+        return cls(np.asarray(coordinates).reshape(-1, 4).astype(np.int32), offsets)
+
+    def __len__(self):
+        return len(self.coordinates)
+
+    def getGroupCount(self):
+        """
+        Gets the number of groups of boxes
+
+        Returns
+        -------
+        int
+            The number of groups
+
+        """
+        return len(self.offsets) - 1
+
+    def getGroup(self, index):
+        """
+        Gets the boxes of a single group
+
+        Parameters
+        ----------
+        index : int
+            the index of the group
+        Returns
+        -------
+        BoxArray
+            A box array with the boxes of the group as its only group
+
+        """
+        return BoxArray(self.coordinates[self.offsets[index]:self.offsets[index + 1]])
+
+    def getAreas(self):
+        """
+        Calculates the area of every box
+
+        Returns
+        -------
+        numpy array
+            The areas
+
+        """
+        coordinates = self.coordinates.astype(np.int64)
+        # add + 1 to dimensions to account for pixel coordinates
+        return (coordinates[:, 2] - coordinates[:, 0] + 1) * (coordinates[:, 3] - coordinates[:, 1] + 1)
+
+    def getIntersectionAreas(self, other):
+        """
+        Calculates the intersection areas of every box of this array against every box of another array
+
+        Parameters
+        ----------
+        other : BoxArray
+            the other boxes
+        Returns
+        -------
+        numpy array
+            (number of boxes, number of other boxes) array of intersection areas, 0 where the boxes do not intersect
+
+        """
+        boxes = self.coordinates.astype(np.int64)
+        others = other.coordinates.astype(np.int64)
+
+        # determine the (x, y)-coordinates of the intersection rectangles
+        topLeftX = np.maximum(boxes[:, None, 0], others[None, :, 0])
+        topLeftY = np.maximum(boxes[:, None, 1], others[None, :, 1])
+        bottomRightX = np.minimum(boxes[:, None, 2], others[None, :, 2])
+        bottomRightY = np.minimum(boxes[:, None, 3], others[None, :, 3])
+
+        # make sure that the boxes intersect
+        intersects = (bottomRightX >= topLeftX) & (bottomRightY >= topLeftY)
+        return np.where(intersects, (bottomRightX - topLeftX + 1) * (bottomRightY - topLeftY + 1), 0)
+
+    def getIoUMatrix(self, other):
+        """
+        Calculates the intersection over union of every box of this array against every box of another array.
+        The values are the same as the ones given by BoundingBox.getIoU for every pair
+
+        Parameters
+        ----------
+        other : BoxArray
+            the other boxes
+        Returns
+        -------
+        numpy array
+            (number of boxes, number of other boxes) array of ious
+
+        """
+        intersectionAreas = self.getIntersectionAreas(other)
+        unionAreas = self.getAreas()[:, None] + other.getAreas()[None, :] - intersectionAreas
+
+        ious = np.zeros(intersectionAreas.shape, dtype=np.float64)
+        np.divide(intersectionAreas, unionAreas, out=ious, where=intersectionAreas > 0)
+        return ious
+
+def getCoverageAreas(gtBoxes, predBoxes):
+    """
+    Calculates the exact pixel areas covered by a set of ground truth boxes and a set of predicted boxes, as well as the area of their
+    intersection and union, without painting the boxes in pixel maps. The coordinates are compressed to the box edges so the work
+    only depends on the number of boxes and not on the size of the image
+
+    Parameters
+    ----------
+    gtBoxes : BoxArray
+        the boxes of the ground truths
+    predBoxes : BoxArray
+        the boxes of the predictions
+    Returns
+    -------
+    tuple
+        the ground truth area, the prediction area, the intersection area and the union area
+
+    """
+    boxes = np.concatenate((gtBoxes.coordinates, predBoxes.coordinates)).astype(np.int64)
+
+    # the boxes are bound to the same canvas the pixel maps would use, clipped by the slicing rules of those maps
+    width = boxes[:, 2].max() + 1
+    height = boxes[:, 3].max() + 1
+    left, right = getPixelRanges(boxes[:, 0], boxes[:, 2] + 1, width)
+    top, bottom = getPixelRanges(boxes[:, 1], boxes[:, 3] + 1, height)
+    isGt = np.arange(len(boxes)) < len(gtBoxes)
+    nonEmpty = (right > left) & (bottom > top)
+
+    # compress the coordinates to the edges of the boxes so every cell is either fully covered by a box or not at all
+    xs, xIndexes = np.unique(np.concatenate((left, right)), return_inverse=True)
+    ys, yIndexes = np.unique(np.concatenate((top, bottom)), return_inverse=True)
+    xIndexes = xIndexes.reshape(2, -1)
+    yIndexes = yIndexes.reshape(2, -1)
+    cellAreas = np.diff(ys)[:, None] * np.diff(xs)[None, :]
+
+    def getCoverage(selection):
+        # 2D difference array of the boxes that gets accumulated to the number of boxes covering every cell
+        counts = np.zeros((len(ys), len(xs)), dtype=np.int64)
+        np.add.at(counts, (yIndexes[0][selection], xIndexes[0][selection]), 1)
+        np.add.at(counts, (yIndexes[0][selection], xIndexes[1][selection]), -1)
+        np.add.at(counts, (yIndexes[1][selection], xIndexes[0][selection]), -1)
+        np.add.at(counts, (yIndexes[1][selection], xIndexes[1][selection]), 1)
+        return counts.cumsum(axis=0).cumsum(axis=1)[:-1, :-1] > 0
+
+    gtCoverage = getCoverage(isGt & nonEmpty)
+    predCoverage = getCoverage(~isGt & nonEmpty)
+
+    gtArea = cellAreas[gtCoverage].sum()
+    predArea = cellAreas[predCoverage].sum()
+    intersectionArea = cellAreas[gtCoverage & predCoverage].sum()
+    unionArea = cellAreas[gtCoverage | predCoverage].sum()
+    return gtArea, predArea, intersectionArea, unionArea
+
+def getPixelRanges(starts, stops, size):
+    """
+    Resolves the pixel ranges of box edges the same way slicing a pixel map of the given size would
+
+    Parameters
+    ----------
+    starts : numpy array
+        the first pixel of every range
+    stops : numpy array
+        the pixel after the last pixel of every range
+    size : int
+        the size of the pixel map
+    Returns
+    -------
+    tuple
+        the resolved starts and stops
+    """
+    starts = np.clip(np.where(starts < 0, starts + size, starts), 0, size)
+    stops = np.clip(np.where(stops < 0, stops + size, stops), 0, size)
+    return starts, np.maximum(starts, stops)
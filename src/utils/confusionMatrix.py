@@ -0,0 +1,115 @@
+import numpy as np
+
+def getConfusionMatrices(truths, predictions, labelCount, groups=None, groupCount=1):
+    """
+    Counts encoded (group, truth, prediction) triples into a stack of confusion matrices with a single bincount
+
+    Parameters
+    ----------
+    truths : numpy array
+        the label index of every ground truth
+    predictions : numpy array
+        the label index of every prediction
+    labelCount : int
+        the number of labels
+    groups : numpy array
+        optional index of the matrix every pair is counted in, the same shape as truths and predictions
+    groupCount : int
+        the number of matrices
+    Returns
+    -------
+    numpy array
+        (groupCount, labelCount, labelCount) array with the ground truths on the first axis and the predictions on the second axis
+
+    """
+    codes = np.asarray(truths, dtype=np.int64) * labelCount + np.asarray(predictions, dtype=np.int64)
+    if groups is not None:
+        codes = codes + np.asarray(groups, dtype=np.int64) * (labelCount * labelCount)
+    counts = np.bincount(codes.ravel(), minlength=groupCount * labelCount * labelCount)
+    return counts.reshape(groupCount, labelCount, labelCount)
+
+def getAccuracies(matrices):
+    """
+    Calculates the accuracy of a stack of confusion matrices
+
+    Parameters
+    ----------
+    matrices : numpy array
+        (..., labels, labels) array of confusion matrices
+    Returns
+    -------
+    numpy array
+        The accuracies
+
+    """
+    return np.trace(matrices, axis1=-2, axis2=-1) / matrices.sum(axis=(-2, -1))
+
+def getLinearKappas(matrices):
+    """
+    Calculates the linear weighted cohen's kappa of a stack of confusion matrices the same way sklearn does, only taking into account the labels
+    that are present in the ground truths or predictions of each matrix
+
+    Parameters
+    ----------
+    matrices : numpy array
+        (..., labels, labels) array of confusion matrices
+    Returns
+    -------
+    numpy array
+        The kappas, nan where there is a single label present
+
+    """
+    predictionCounts = matrices.sum(axis=-2)
+    truthCounts = matrices.sum(axis=-1)
+    expected = predictionCounts[..., :, None] * truthCounts[..., None, :] / predictionCounts.sum(axis=-1)[..., None, None]
+
+    # the weights are the distances between the positions of the present labels
+    present = (predictionCounts + truthCounts) > 0
+    positions = np.cumsum(present, axis=-1)
+    weights = np.abs(positions[..., :, None] - positions[..., None, :])
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 1 - (weights * matrices).sum(axis=(-2, -1)) / (weights * expected).sum(axis=(-2, -1))
+
+def getRecalls(matrices, label):
+    """
+    Calculates the recall of a label for a stack of confusion matrices, 0 where the label is not in the ground truths
+
+    Parameters
+    ----------
+    matrices : numpy array
+        (..., labels, labels) array of confusion matrices
+    label : int
+        the index of the label
+    Returns
+    -------
+    numpy array
+        The recalls
+
+    """
+    truePositives = matrices[..., label, label]
+    truthCounts = matrices[..., label, :].sum(axis=-1)
+    recalls = np.zeros(truePositives.shape, dtype=np.float64)
+    np.divide(truePositives, truthCounts, out=recalls, where=truthCounts > 0)
+    return recalls
+
+def getMacroRecalls(matrices):
+    """
+    Calculates the macro averaged recall of a stack of confusion matrices over the labels present in the ground truths or predictions of each matrix
+
+    Parameters
+    ----------
+    matrices : numpy array
+        (..., labels, labels) array of confusion matrices
+    Returns
+    -------
+    numpy array
+        The macro recalls
+
+    """
+    truePositives = np.diagonal(matrices, axis1=-2, axis2=-1)
+    truthCounts = matrices.sum(axis=-1)
+    present = (truthCounts + matrices.sum(axis=-2)) > 0
+    recalls = np.zeros(truePositives.shape, dtype=np.float64)
+    np.divide(truePositives, truthCounts, out=recalls, where=truthCounts > 0)
+    return recalls.sum(axis=-1) / present.sum(axis=-1)
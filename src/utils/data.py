@@ -9,7 +9,8 @@ def getDicomIndexDictionary(groundTruths, predictions):
     """
     gtKeys = list(groundTruths.keys())
     predKeys = list(predictions.keys())
-    union = list(set().union(gtKeys, predKeys))
+    # granularity ids are integers so sorting gives the same order on every run
+    union = sorted(set().union(gtKeys, predKeys))
     dict = {key:index for index, key in enumerate(union)}
     return dict
 
@@ -61,3 +62,142 @@ def hashGranularityIdentifier(studyInstanceUid='', seriesInstanceUid='', sopInst
         }
     return hash
 
+def parseThresholds(thresholds):
+    """
+    Parses the thresholds of a threshold sweep, given either as a list, a comma separated list ("0.1,0.3,0.5") or a
+    range ("start:stop:step", the stop is included when the range reaches it)
+
+    Parameters
+    ----------
+    thresholds : string or array
+        the thresholds
+
+    Returns
+    -------
+    array
+        The distinct thresholds in increasing order, None if no thresholds were given
+    """
+    if thresholds is None:
+        return None
+    if isinstance(thresholds, str):
+        if ":" in thresholds:
+            parts = thresholds.split(":")
+            if len(parts) != 3:
+                raise ValueError('invalid threshold range {0}, it must be in the form of start:stop:step'.format(thresholds))
+            start, stop, step = (float(part) for part in parts)
+            if step <= 0 or stop < start:
+                raise ValueError('invalid threshold range {0}, the step must be positive and the stop must not be lower than the start'.format(thresholds))
+            # count the steps instead of accumulating them so the rounding errors don't add up
+            count = int((stop - start) / step + 1e-9) + 1
+            thresholds = [round(start + i * step, 12) for i in range(count)]
+        else:
+            thresholds = [part for part in thresholds.split(",") if len(part.strip()) > 0]
+    thresholds = sorted(set(float(threshold) for threshold in thresholds))
+    if len(thresholds) <= 0:
+        raise ValueError("no thresholds given for the threshold sweep")
+    return thresholds
+
+
+class GranularityIdentifierTable:
+    """
+    Interns the identifying information for the granularity of a data object (study, series, instance, frame)
+    to dense integer ids. The identifiers are only looked up again when rendering unknowns and failures
+
+    ...
+
+    Attributes
+    ----------
+    ids : dictionary
+        dictionary having the normalized identifier tuples as keys and their integer ids as values
+    identifiers : array
+        the identifier tuples as first seen, indexed by their integer ids
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.identifiers = []
+
+    def __len__(self):
+        return len(self.identifiers)
+
+    def copy(self):
+        """
+        Copies the table so new granularities can be added to the copy without changing the ids of this table
+
+        Returns
+        -------
+        GranularityIdentifierTable
+            The copy of the table
+
+        """
+        table = GranularityIdentifierTable()
+        table.ids = dict(self.ids)
+        table.identifiers = list(self.identifiers)
+        return table
+
+    def getId(self, studyInstanceUid='', seriesInstanceUid='', sopInstanceUid='', frameIndex=''):
+        """
+        Obtains the integer id for the granularity of a data object, creating it the first time the granularity is seen
+
+        Parameters
+        ----------
+        studyInstanceUid : string
+            study instance uid
+        seriesInstanceUid : string
+            series instance uid
+        sopInstanceUid : string
+            SOP instance uid
+        frameIndex : string
+            frame index
+        Returns
+        -------
+        int
+            The granularity id
+
+        """
+        # normalize to strings so that i.e. a frame index of 1 and "1" refer to the same frame
+        key = (str(studyInstanceUid), str(seriesInstanceUid), str(sopInstanceUid), str(frameIndex))
+        id = self.ids.get(key)
+        if id is None:
+            id = len(self.identifiers)
+            self.ids[key] = id
+            self.identifiers.append((studyInstanceUid, seriesInstanceUid, sopInstanceUid, frameIndex))
+        return id
+
+    def getIdentifier(self, id):
+        """
+        Reverse lookup of the identifying information of a granularity id
+
+        Parameters
+        ----------
+        id : int
+            the granularity id
+        Returns
+        -------
+        json object
+            The identifying information of the granularity
+
+        """
+        studyInstanceUid, seriesInstanceUid, sopInstanceUid, frameIndex = self.identifiers[id]
+        return {
+            "studyInstanceUid": studyInstanceUid,
+            "seriesInstanceUid": seriesInstanceUid,
+            "sopInstanceUid": sopInstanceUid,
+            "frameIndex": frameIndex,
+        }
+
+    def getHash(self, id):
+        """
+        Gets the legacy MD5 hash of a granularity id as created by hashGranularityIdentifier
+
+        Parameters
+        ----------
+        id : int
+            the granularity id
+        Returns
+        -------
+        string
+            The hex representation of the hash
+
+        """
+        return hashGranularityIdentifier(*self.identifiers[id])
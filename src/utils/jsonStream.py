@@ -0,0 +1,131 @@
+import json
+
+class JsonArrayStream:
+    """
+    Re-iterable view over a json array stored in a file. Every iteration walks the file and decodes the elements
+    of the array one at a time, so only the element being processed (and not the whole document) is kept in memory
+
+    ...
+
+    Attributes
+    ----------
+    filePath : string
+        the path to the json file
+    propertyName : string
+        optional name of the top level property that holds the array when the array is nested inside a top level object
+        (i.e. "studies" for the standard output json). When None, the top level value of the file must be the array
+    chunkSize : int
+        the number of characters read from the file at a time
+    """
+
+    def __init__(self, filePath, propertyName=None, chunkSize=1024 * 1024):
+        if filePath is None:
+            raise ValueError("no file path provided for the json stream")
+        self.filePath = filePath
+        self.propertyName = propertyName
+        self.chunkSize = chunkSize
+
+    def __iter__(self):
+        with open(self.filePath, encoding='utf-8') as jsonFile:
+            yield from iterateJsonArray(jsonFile, self.propertyName, self.chunkSize)
+
+def iterateJsonArray(jsonFile, propertyName=None, chunkSize=1024 * 1024):
+    """
+    Incrementally decodes the elements of a json array from a file like object
+
+    Parameters
+    ----------
+    jsonFile : file
+        a file like object opened in text mode
+    propertyName : string
+        optional name of the top level property that holds the array
+    chunkSize : int
+        the number of characters read from the file at a time
+
+    Returns
+    -------
+    generator
+        generator yielding the decoded elements of the array in order
+
+    """
+    reader = _JsonReader(jsonFile, chunkSize)
+
+    if propertyName is not None:
+        reader.expect('{')
+        while True:
+            if reader.peek() == '}':
+                raise Exception('the json object does not have a "{0}" property'.format(propertyName))
+            name = reader.decodeValue()
+            reader.expect(':')
+            if name == propertyName:
+                break
+            # skip the values of the properties we are not interested in
+            reader.decodeValue()
+            if reader.peek() == ',':
+                reader.expect(',')
+
+    reader.expect('[')
+    if reader.peek() == ']':
+        return
+    while True:
+        yield reader.decodeValue()
+        if reader.peek() == ',':
+            reader.expect(',')
+        else:
+            reader.expect(']')
+            return
+
+class _JsonReader:
+    """
+    Minimal buffered reader that decodes json values one at a time using the standard library decoder
+    """
+
+    whitespace = ' \t\n\r'
+
+    def __init__(self, jsonFile, chunkSize):
+        self.file = jsonFile
+        self.chunkSize = chunkSize
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.position = 0
+        self.eof = False
+
+    def read(self, size):
+        # drop the consumed part of the buffer so it doesn't grow with the file
+        if self.position > 0:
+            self.buffer = self.buffer[self.position:]
+            self.position = 0
+        chunk = self.file.read(size)
+        if not chunk:
+            self.eof = True
+        self.buffer += chunk
+
+    def peek(self):
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in self.whitespace:
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if self.eof:
+                raise ValueError('unexpected end of json data')
+            self.read(self.chunkSize)
+
+    def expect(self, character):
+        if self.peek() != character:
+            raise ValueError('expected "{0}" at position {1} of the json data but found "{2}"'.format(character, self.position, self.buffer[self.position]))
+        self.position += 1
+
+    def decodeValue(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+                # a value that ends exactly at the end of the buffer (i.e. a number) could continue on the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # grow the reads with the size of the pending value so large values are not decoded over and over
+            self.read(max(self.chunkSize, len(self.buffer) - self.position))
@@ -0,0 +1,124 @@
+import os.path
+
+import numpy as np
+
+class NpyMask(object):
+    """
+    Segmentation mask (or volume) stored in a .npy file. The file is memory mapped so only the ranges of voxels that are
+    read are loaded, every non zero voxel is foreground. The voxels are numbered in row-major order like the run length
+    encoded masks, so both kinds of masks can be compared
+
+    ...
+
+    Attributes
+    ----------
+    path : string
+        the resolved path to the .npy file
+    size : tuple
+        the shape of the mask, i.e. (depth, height, width)
+    """
+
+    def __init__(self, path):
+        if path is None:
+            raise ValueError("no path provided for the npy mask")
+        self.path = path
+        self.voxels = np.load(path, mmap_mode='r', allow_pickle=False)
+        if self.voxels.ndim > 1 and not self.voxels.flags.c_contiguous:
+            raise ValueError('the npy mask {0} must be stored in row-major (C) order'.format(path))
+        self.size = tuple(int(dimension) for dimension in self.voxels.shape)
+
+    @classmethod
+    def fromJsonData(cls, data, directory):
+        """
+        Opens the mask of a segmentation that references a .npy file
+
+        Parameters
+        ----------
+        data : json object
+            the path to the .npy file or an object in the form of {"path": "path/to/mask.npy"}
+        directory : string
+            the directory of the json file that references the mask, the path is relative to it
+        Returns
+        -------
+        NpyMask
+            The mask
+        """
+        return cls(resolveMaskPath(getMaskPath(data), directory))
+
+    def __getstate__(self):
+        # the memory map is opened again instead of copying the voxels when the mask is sent to another process
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+    def getSlab(self, start, stop):
+        """
+        Reads the voxels of a range of the mask
+
+        Parameters
+        ----------
+        start : int
+            the index of the first voxel of the range, in row-major order
+        stop : int
+            the index after the last voxel of the range
+        Returns
+        -------
+        numpy array
+            boolean array with the voxels of the range
+
+        """
+        return self.voxels.reshape(-1)[start:stop] != 0
+
+    def getRegion(self, bounds):
+        """
+        Reads the voxels of a bounding region of the mask, only the region is read from the file
+
+        Parameters
+        ----------
+        bounds : array
+            the (start, stop) range of every axis
+        Returns
+        -------
+        numpy array
+            boolean array with the voxels of the region
+
+        """
+        return self.voxels[tuple(slice(start, stop) for start, stop in bounds)] != 0
+
+def getMaskPath(data):
+    """
+    Gets the path of the .npy file of a segmentation, given either as the path or as an object in the form of {"path": "path/to/mask.npy"}
+    """
+    if isinstance(data, dict):
+        data = data.get("path")
+    if not isinstance(data, str):
+        raise ValueError("an npy mask must have the path to its file")
+    return data
+
+def resolveMaskPath(path, directory):
+    """
+    Resolves the path of a .npy mask relative to the directory of the json file that references it. Throws security exception
+    if the mask is not inside that directory, so the dataset and output files can only reference the masks stored with them
+
+    Parameters
+    ----------
+    path : string
+        the path of the mask as given in the json file
+    directory : string
+        the directory of the json file
+    Returns
+    -------
+    string
+        The real path of the mask
+    """
+    if directory is None:
+        raise ValueError("the npy masks can only be read from the folder of the json file that references them")
+    #path transversal mitigation, the same rule as the paths of the arguments
+    if ".." in path:
+        raise Exception('Security Error: Invalid path: ' + path + '. File paths must not have back tracking dots in them')
+    root = os.path.realpath(directory)
+    realPath = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, realPath]) != root:
+        raise Exception('Security Error: Invalid path: ' + path + '. The npy masks must reside within the folder of the json file that references them')
+    return realPath
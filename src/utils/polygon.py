@@ -0,0 +1,285 @@
+import numpy as np
+
+from utils.rle import checkSizes
+
+# the number of set bits of every byte value
+BIT_COUNTS = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+class PolygonMask(object):
+    """
+    Binary segmentation mask of a polygon contour, kept as a bit-packed pixel map of the bounding box of the polygon only.
+    The columns of the bounding box are aligned to whole bytes of the image, so the bytes of two masks line up and the
+    areas, intersections and unions are counted on the packed bytes without unpacking them
+
+    ...
+
+    Attributes
+    ----------
+    size : tuple
+        the shape of the mask, i.e. (height, width)
+    rowStart : int
+        the first row of the bounding box
+    byteStart : int
+        the first byte of the rows of the bounding box, the first column of the bounding box is byteStart * 8
+    bits : numpy array
+        (rows, bytes) uint8 array with the packed pixels of the bounding box, the first column is the most significant bit
+    """
+
+    def __init__(self, size, rowStart, byteStart, bits):
+        if size is None or len(size) != 2:
+            raise ValueError("a polygon mask must have a size in the form of [height, width]")
+        self.size = tuple(int(dimension) for dimension in size)
+        self.rowStart = int(rowStart)
+        self.byteStart = int(byteStart)
+        self.bits = np.asarray(bits, dtype=np.uint8)
+
+    @classmethod
+    def fromJsonData(cls, data):
+        """
+        Rasterizes the mask of a polygon contour
+
+        Parameters
+        ----------
+        data : json object
+            the polygon in the form of
+            {
+                "size": [height, width],
+                "points": [[x, y], ...] // the vertices of the contour, in pixels, the center of the top left pixel is [0, 0]
+            }
+        Returns
+        -------
+        PolygonMask
+            The mask
+        """
+        if not isinstance(data, dict) or "size" not in data or "points" not in data:
+            raise ValueError("a polygon must have a size and points")
+        points = np.asarray(data["points"], dtype=np.float64)
+        if points.ndim != 2 or points.shape[1] != 2:
+            raise ValueError("the points of a polygon must be an array of [x, y] vertices")
+        if not np.isfinite(points).all():
+            raise ValueError("the points of a polygon must be finite numbers")
+        return cls.fromPolygon(data["size"], points[:, 0], points[:, 1])
+
+    @classmethod
+    def fromPolygon(cls, size, xs, ys):
+        """
+        Rasterizes a polygon with a scanline fill, a pixel is foreground when its center is inside the polygon by the even-odd
+        rule. The crossings of every edge with the rows of the pixel centers are calculated for all the edges at once, so only
+        the bounding box of the polygon is allocated
+
+        Parameters
+        ----------
+        size : tuple
+            the shape of the mask, (height, width)
+        xs : numpy array
+            the x coordinates of the vertices
+        ys : numpy array
+            the y coordinates of the vertices
+        Returns
+        -------
+        PolygonMask
+            The mask
+        """
+        height, width = (int(dimension) for dimension in size)
+        empty = cls(size, 0, 0, np.zeros((0, 0), dtype=np.uint8))
+        if len(xs) < 3:
+            return empty
+
+        # the edges from every vertex to the next one, the horizontal edges never cross a row
+        x0, y0 = xs, ys
+        x1, y1 = np.roll(xs, -1), np.roll(ys, -1)
+        # the rows crossed by every edge, a row is crossed when it is in [min(y0, y1), max(y0, y1)) so a vertex on a row is only counted once
+        firstRows = np.maximum(np.ceil(np.minimum(y0, y1)), 0).astype(np.int64)
+        lastRows = np.minimum(np.ceil(np.maximum(y0, y1)), height).astype(np.int64)
+        rowCounts = np.maximum(lastRows - firstRows, 0)
+        if rowCounts.sum() <= 0:
+            return empty
+
+        # one crossing for every row crossed by every edge
+        edges = np.repeat(np.arange(len(xs)), rowCounts)
+        rows = firstRows[edges] + np.arange(len(edges)) - np.repeat(np.cumsum(rowCounts) - rowCounts, rowCounts)
+        crossings = x0[edges] + (rows - y0[edges]) * (x1[edges] - x0[edges]) / (y1[edges] - y0[edges])
+
+        # the pixels from a crossing up to the next one of the same row are inside, every row has an even number of crossings
+        order = np.lexsort((crossings, rows))
+        rows = rows[order]
+        columns = np.clip(np.ceil(crossings[order]), 0, width).astype(np.int64)
+        spanRows = rows[0::2]
+        spanStarts = columns[0::2]
+        spanStops = columns[1::2]
+        filled = spanStops > spanStarts
+        spanRows, spanStarts, spanStops = spanRows[filled], spanStarts[filled], spanStops[filled]
+        if len(spanRows) <= 0:
+            return empty
+
+        # fill the spans of the bounding box, aligned to whole bytes
+        rowStart = int(spanRows.min())
+        byteStart = int(spanStarts.min()) // 8
+        columnStart = byteStart * 8
+        byteStop = (int(spanStops.max()) + 7) // 8
+        changes = np.zeros((int(spanRows.max()) + 1 - rowStart, (byteStop - byteStart) * 8 + 1), dtype=np.int8)
+        np.add.at(changes, (spanRows - rowStart, spanStarts - columnStart), 1)
+        np.add.at(changes, (spanRows - rowStart, spanStops - columnStart), -1)
+        return cls(size, rowStart, byteStart, np.packbits(np.cumsum(changes[:, :-1], axis=1, dtype=np.int8) > 0, axis=1))
+
+    @classmethod
+    def union(cls, masks, size=None):
+        """
+        Builds the union of many masks
+
+        Parameters
+        ----------
+        masks : array
+            the masks, all of them with the same size
+        size : tuple
+            the size of the union when there are no masks
+        Returns
+        -------
+        PolygonMask
+            The union of the masks
+        """
+        if len(masks) <= 0:
+            return cls((0, 0) if size is None else size, 0, 0, np.zeros((0, 0), dtype=np.uint8))
+        if len(masks) == 1:
+            return masks[0]
+        checkSizes(masks)
+        rowStart, rowStop, byteStart, byteStop = getJointBox(masks)
+        bits = np.zeros((rowStop - rowStart, byteStop - byteStart), dtype=np.uint8)
+        for mask in masks:
+            if mask.bits.size <= 0:
+                continue
+            rows, columns = mask.getBox()
+            bits[rows[0] - rowStart:rows[1] - rowStart, columns[0] - byteStart:columns[1] - byteStart] |= mask.bits
+        return cls(masks[0].size, rowStart, byteStart, bits)
+
+    def __eq__(self, other):
+        # the bounding boxes of the same pixels can differ, the masks are the same when their intersection is their union
+        if not isinstance(other, PolygonMask) or self.size != other.size:
+            return False
+        intersectionArea, unionArea = self.getOverlapAreas(other)
+        return intersectionArea == unionArea
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash((self.size, self.getArea()))
+
+    def getBox(self):
+        """
+        Gets the rows and bytes of the bounding box as ((rowStart, rowStop), (byteStart, byteStop))
+        """
+        return (self.rowStart, self.rowStart + self.bits.shape[0]), (self.byteStart, self.byteStart + self.bits.shape[1])
+
+    def getArea(self):
+        """
+        Calculates the number of foreground pixels by counting the set bits
+
+        Returns
+        -------
+        int
+            The area
+
+        """
+        return int(BIT_COUNTS[self.bits].sum(dtype=np.int64))
+
+    def getOverlapAreas(self, other):
+        """
+        Calculates the areas of the intersection and union with another mask, only the bytes where the bounding boxes overlap
+        are compared
+
+        Parameters
+        ----------
+        other : PolygonMask
+            the other mask, with the same size
+        Returns
+        -------
+        tuple
+            the intersection area and the union area
+
+        """
+        checkSizes([self, other])
+        (rowStart, rowStop), (byteStart, byteStop) = self.getBox()
+        (otherRowStart, otherRowStop), (otherByteStart, otherByteStop) = other.getBox()
+        rows = slice(max(rowStart, otherRowStart), min(rowStop, otherRowStop))
+        columns = slice(max(byteStart, otherByteStart), min(byteStop, otherByteStop))
+
+        intersectionArea = 0
+        if rows.stop > rows.start and columns.stop > columns.start:
+            bits = self.bits[rows.start - rowStart:rows.stop - rowStart, columns.start - byteStart:columns.stop - byteStart]
+            otherBits = other.bits[rows.start - otherRowStart:rows.stop - otherRowStart, columns.start - otherByteStart:columns.stop - otherByteStart]
+            intersectionArea = int(BIT_COUNTS[bits & otherBits].sum(dtype=np.int64))
+        return intersectionArea, self.getArea() + other.getArea() - intersectionArea
+
+    def getBounds(self):
+        """
+        Calculates the bounding region of the foreground
+
+        Returns
+        -------
+        array
+            the (start, stop) range of the rows and columns, None if the mask is empty
+
+        """
+        rows = np.flatnonzero(self.bits.any(axis=1))
+        if len(rows) <= 0:
+            return None
+        columns = np.flatnonzero(np.unpackbits(np.bitwise_or.reduce(self.bits, axis=0)))
+        columnStart = self.byteStart * 8
+        return [(self.rowStart + int(rows[0]), self.rowStart + int(rows[-1]) + 1), (columnStart + int(columns[0]), columnStart + int(columns[-1]) + 1)]
+
+    def getRegion(self, bounds):
+        """
+        Unpacks the pixels of a bounding region of the mask
+
+        Parameters
+        ----------
+        bounds : array
+            the (start, stop) range of the rows and columns
+        Returns
+        -------
+        numpy array
+            boolean array with the pixels of the region
+
+        """
+        (regionRowStart, regionRowStop), (regionColumnStart, regionColumnStop) = bounds
+        region = np.zeros((regionRowStop - regionRowStart, regionColumnStop - regionColumnStart), dtype=bool)
+        (rowStart, rowStop), (byteStart, byteStop) = self.getBox()
+        rows = slice(max(rowStart, regionRowStart), min(rowStop, regionRowStop))
+        columns = slice(max(byteStart * 8, regionColumnStart), min(byteStop * 8, regionColumnStop))
+        if rows.stop > rows.start and columns.stop > columns.start:
+            # only the bytes of the columns of the region are unpacked
+            firstByte = columns.start // 8
+            pixels = np.unpackbits(self.bits[rows.start - rowStart:rows.stop - rowStart, firstByte - byteStart:(columns.stop + 7) // 8 - byteStart], axis=1)
+            region[rows.start - regionRowStart:rows.stop - regionRowStart, columns.start - regionColumnStart:columns.stop - regionColumnStart] = pixels[:, columns.start - firstByte * 8:columns.stop - firstByte * 8].astype(bool)
+        return region
+
+    def getSlab(self, start, stop):
+        """
+        Unpacks the pixels of a range of the mask
+
+        Parameters
+        ----------
+        start : int
+            the index of the first pixel of the range, in row-major order
+        stop : int
+            the index after the last pixel of the range
+        Returns
+        -------
+        numpy array
+            boolean array with the pixels of the range
+
+        """
+        width = self.size[1]
+        firstRow = start // width
+        region = self.getRegion([(firstRow, (stop + width - 1) // width), (0, width)])
+        return region.reshape(-1)[start - firstRow * width:stop - firstRow * width]
+
+def getJointBox(masks):
+    """
+    Gets the rows and bytes of the bounding box of many masks as (rowStart, rowStop, byteStart, byteStop)
+    """
+    boxes = [mask.getBox() for mask in masks if mask.bits.size > 0]
+    if len(boxes) <= 0:
+        return 0, 0, 0, 0
+    return min(rows[0] for rows, _ in boxes), max(rows[1] for rows, _ in boxes), min(columns[0] for _, columns in boxes), max(columns[1] for _, columns in boxes)
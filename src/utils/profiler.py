@@ -0,0 +1,174 @@
+import contextlib
+import os.path
+import threading
+import time
+import tracemalloc
+
+class Profiler(object):
+    """
+    Records the spans of the phases of an evaluation, with the time and the peak of the memory allocated during every span.
+    The memory is traced with tracemalloc, which only sees the allocations of this process and slows the evaluation down
+
+    ...
+
+    Attributes
+    ----------
+    spans : array
+        the records of the spans in the order they started, the records of the spans that didn't end yet have no time
+    traceMemory : bool
+        whether the peak memory of the spans is measured
+    """
+
+    def __init__(self, traceMemory=True):
+        self.spans = []
+        self.traceMemory = traceMemory
+        # the spans that didn't end yet, with the memory when they started and the highest memory seen since then
+        self.openSpans = {}
+        self.lock = threading.Lock()
+        # every thread has its own stack of spans, so the spans of concurrent threads are not nested in each other
+        self.local = threading.local()
+        self.startedTracing = False
+        self.peakMemory = 0
+        if traceMemory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.startedTracing = True
+        self.startTime = time.perf_counter()
+
+    @contextlib.contextmanager
+    def span(self, name, **attributes):
+        """
+        Records a span for the code run in the context, nested in the span the current thread is in
+
+        Parameters
+        ----------
+        name : string
+            the name of the phase (i.e. "indexBuild")
+        attributes : dictionary
+            the json values that identify what the span worked on (i.e. the algorithm type and key)
+        """
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+
+        with self.lock:
+            spanId = len(self.spans)
+            record = {"id": spanId, "name": name, "parent": stack[-1] if len(stack) > 0 else None, "start": time.perf_counter() - self.startTime}
+            record.update(attributes)
+            self.spans.append(record)
+            memory = self.updatePeaks()
+            self.openSpans[spanId] = [memory, memory]
+        stack.append(spanId)
+
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["time"] = time.perf_counter() - start
+            stack.pop()
+            with self.lock:
+                self.updatePeaks()
+                startMemory, peakMemory = self.openSpans.pop(spanId)
+                if self.traceMemory:
+                    record["peakMemory"] = peakMemory - startMemory
+
+    def updatePeaks(self):
+        """
+        Adds the peak of the traced memory since the last update to the open spans and starts measuring a new peak, the
+        lock must be held
+
+        Returns
+        -------
+        int
+            The traced memory right now, 0 if the memory is not traced
+        """
+        if not self.traceMemory or not tracemalloc.is_tracing():
+            return 0
+        memory, peakMemory = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        self.peakMemory = max(self.peakMemory, peakMemory)
+        for openSpan in self.openSpans.values():
+            openSpan[1] = max(openSpan[1], peakMemory)
+        return memory
+
+    def stop(self):
+        """
+        Stops the profiler
+
+        Returns
+        -------
+        json object
+            The profile in the form of
+            {
+                "totalTime": 0.0, // seconds
+                "peakMemory": 0, // bytes, the highest traced memory of the whole profile
+                "spans": [
+                    {
+                        "id": 0,
+                        "name": "phase name",
+                        "parent": null, // the id of the span this one is nested in
+                        "start": 0.0, // seconds since the profiler started
+                        "time": 0.0, // seconds
+                        "peakMemory": 0, // bytes allocated on top of the memory when the span started
+                        ... // the attributes of the span, i.e. "algorithmType" and "key"
+                    }
+                ]
+            }
+        """
+        with self.lock:
+            self.updatePeaks()
+        totalTime = time.perf_counter() - self.startTime
+        if self.startedTracing:
+            tracemalloc.stop()
+        profile = {"totalTime": totalTime, "spans": self.spans}
+        if self.traceMemory:
+            profile["peakMemory"] = self.peakMemory
+        return profile
+
+# the profiler of the running evaluation, None when it is not profiled
+activeProfiler = None
+
+def startProfiling(traceMemory=True):
+    """
+    Starts profiling the evaluation, the spans opened from now on are recorded
+    """
+    global activeProfiler
+    activeProfiler = Profiler(traceMemory)
+    return activeProfiler
+
+def stopProfiling():
+    """
+    Stops profiling the evaluation
+
+    Returns
+    -------
+    json object
+        The profile as given by Profiler.stop, None if the evaluation was not being profiled
+    """
+    global activeProfiler
+    profiler = activeProfiler
+    activeProfiler = None
+    return None if profiler is None else profiler.stop()
+
+def isProfiling():
+    return activeProfiler is not None
+
+def span(name, **attributes):
+    """
+    Opens a span of the active profiler, does nothing when the evaluation is not being profiled
+
+    Parameters
+    ----------
+    name : string
+        the name of the phase
+    attributes : dictionary
+        the json values that identify what the span worked on
+    """
+    if activeProfiler is None:
+        return contextlib.nullcontext()
+    return activeProfiler.span(name, **attributes)
+
+def getProfileFilePath(evaluationFilePath):
+    """
+    Gets the path of the profile written next to an evaluation file (i.e. evaluation.profile.json for evaluation.json)
+    """
+    return os.path.splitext(evaluationFilePath)[0] + '.profile.json'
@@ -0,0 +1,223 @@
+import hashlib
+import json
+import os
+import tempfile
+
+# the version of the metrics calculations, it has to change whenever a change in the code changes the evaluations
+# so the results of the previous versions are not returned from the cache
+ENGINE_VERSION = "4"
+
+class ResultCache:
+    """
+    Content addressed store of whole evaluations. Every evaluation is a file in the cache directory named after the
+    digest of the inputs and arguments of the run, the least recently used evaluations are evicted when the directory
+    grows over its maximum size
+
+    ...
+
+    Attributes
+    ----------
+    directory : string
+        the path to the cache directory
+    maxSize : int
+        the maximum size of the cache directory in bytes
+    """
+
+    def __init__(self, directory, maxSize=512 * 1024 * 1024):
+        if directory is None:
+            raise ValueError("no directory provided for the result cache")
+        self.directory = directory
+        self.maxSize = maxSize
+        os.makedirs(directory, exist_ok=True)
+
+    def getPath(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def get(self, key):
+        """
+        Gets a cached evaluation, marking it as recently used
+
+        Parameters
+        ----------
+        key : string
+            the key of the run as given by getRunKey
+
+        Returns
+        -------
+        string
+            The serialized evaluation, None if it is not in the cache
+
+        """
+        path = self.getPath(key)
+        try:
+            with open(path, encoding='utf-8') as evaluationFile:
+                evaluation = evaluationFile.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return evaluation
+
+    def put(self, key, evaluation):
+        """
+        Stores a serialized evaluation and evicts the least recently used evaluations if the cache grew over its maximum size
+
+        Parameters
+        ----------
+        key : string
+            the key of the run as given by getRunKey
+        evaluation : string
+            the serialized evaluation
+
+        """
+        data = evaluation.encode('utf-8')
+        if len(data) > self.maxSize:
+            return
+
+        # write to a temporary file first so no other process reads a partially written evaluation
+        fileDescriptor, temporaryPath = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fileDescriptor, 'wb') as temporaryFile:
+            temporaryFile.write(data)
+        os.replace(temporaryPath, self.getPath(key))
+
+        self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used evaluations until the cache is within its maximum size
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+        size = sum(entry[1] for entry in entries)
+        for _, entrySize, name in sorted(entries):
+            if size <= self.maxSize:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            size -= entrySize
+
+def getFileDigest(path, chunkSize=1024 * 1024):
+    """
+    Calculates the SHA-256 digest of the content of a file without loading the whole file in memory
+
+    Parameters
+    ----------
+    path : string
+        the path to the file
+    chunkSize : int
+        the number of bytes read from the file at a time
+
+    Returns
+    -------
+    string
+        the hex representation of the digest
+
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as digestFile:
+        for chunk in iter(lambda: digestFile.read(chunkSize), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def getRunKey(datasetFilePath, outputFilePath, arguments):
+    """
+    Creates the key of an evaluation run from the content of its inputs, the arguments that change the evaluation and the engine version
+
+    Parameters
+    ----------
+    datasetFilePath : string
+        the path to the dataset json file
+    outputFilePath : string
+        the path to the output json file
+    arguments : dictionary
+        the arguments of the run that change the evaluation
+
+    Returns
+    -------
+    string
+        the hex representation of the key
+
+    """
+    run = {
+        "engineVersion": ENGINE_VERSION,
+        "dataset": getFileDigest(datasetFilePath),
+        "output": getFileDigest(outputFilePath),
+        "arguments": arguments
+    }
+    return hashlib.sha256(json.dumps(run, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+def getReferencedMaskPaths(jsonFilePath, chunkSize=1024 * 1024):
+    """
+    Finds the .npy masks referenced by the segmentations of a dataset or output json file, their content is an input of
+    the run that is not in the json file
+
+    Parameters
+    ----------
+    jsonFilePath : string
+        the path to the dataset or output json file
+    chunkSize : int
+        the number of bytes read from the file at a time while looking for the masks
+
+    Returns
+    -------
+    array
+        The sorted real paths of the masks
+
+    """
+    # most files have no .npy masks, they are only parsed when the npy key is somewhere in them
+    if not fileContains(jsonFilePath, b'"npy"', chunkSize):
+        return []
+
+    from utils.npyMask import getMaskPath, resolveMaskPath
+    with open(jsonFilePath) as jsonFile:
+        document = json.load(jsonFile)
+    directory = os.path.dirname(os.path.realpath(jsonFilePath))
+    paths = set()
+    values = [document]
+    while len(values) > 0:
+        value = values.pop()
+        if isinstance(value, dict):
+            if "npy" in value:
+                paths.add(resolveMaskPath(getMaskPath(value["npy"]), directory))
+            values.extend(value.values())
+        elif isinstance(value, list):
+            values.extend(value)
+    return sorted(paths)
+
+def fileContains(path, pattern, chunkSize=1024 * 1024):
+    """
+    Checks whether a file contains a sequence of bytes, reading it a chunk at a time
+
+    Parameters
+    ----------
+    path : string
+        the path to the file
+    pattern : bytes
+        the bytes to look for
+    chunkSize : int
+        the number of bytes read from the file at a time
+
+    Returns
+    -------
+    bool
+        True if the pattern is in the file
+
+    """
+    tail = b''
+    with open(path, 'rb') as searchedFile:
+        for chunk in iter(lambda: searchedFile.read(chunkSize), b''):
+            data = tail + chunk
+            if pattern in data:
+                return True
+            # keep the end of the data read in case the pattern is split between chunks
+            tail = data[max(0, len(data) - len(pattern) + 1):]
+    return False
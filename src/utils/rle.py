@@ -0,0 +1,268 @@
+import numpy as np
+
+class RunLengthMask(object):
+    """
+    Binary segmentation mask kept as the runs of its foreground pixels instead of a pixel map. The pixels are numbered
+    in row-major order (the index of a pixel is y * width + x) and the runs are sorted, disjoint and non-adjacent, so
+    the areas, intersections and unions of masks only cost time proportional to their number of runs
+
+    ...
+
+    Attributes
+    ----------
+    size : tuple
+        the shape of the mask, i.e. (height, width)
+    starts : numpy array
+        the index of the first pixel of every run
+    stops : numpy array
+        the index after the last pixel of every run
+    """
+
+    def __init__(self, size, starts, stops):
+        if size is None:
+            raise ValueError("no size provided for the run length mask")
+        self.size = tuple(int(dimension) for dimension in size)
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.stops = np.asarray(stops, dtype=np.int64)
+
+    @classmethod
+    def fromJsonData(cls, data):
+        """
+        Builds a mask from its run length encoding
+
+        Parameters
+        ----------
+        data : json object
+            the run length encoding in the form of
+            {
+                "size": [height, width],
+                "counts": [0, 0, ...] // lengths of the alternating background and foreground runs in row-major order, starting with background
+            }
+        Returns
+        -------
+        RunLengthMask
+            The mask
+        """
+        if not isinstance(data, dict) or "size" not in data or "counts" not in data:
+            raise ValueError("a run length encoded mask must have a size and counts")
+
+        size = data["size"]
+        counts = np.asarray(data["counts"], dtype=np.int64).reshape(-1)
+        if len(counts) > 0 and counts.min() < 0:
+            raise ValueError("the counts of a run length encoded mask can't be negative")
+
+        boundaries = np.cumsum(counts)
+        pixelCount = int(np.prod(size, dtype=np.int64))
+        if len(boundaries) > 0 and boundaries[-1] > pixelCount:
+            raise ValueError('the counts of the run length encoded mask cover {0} pixels but its size only has {1}'.format(boundaries[-1], pixelCount))
+
+        # the odd runs are the foreground, a trailing background run can be left out of the counts
+        starts = boundaries[0:len(boundaries) - 1:2]
+        stops = boundaries[1::2]
+        return cls.fromRuns(size, starts, stops)
+
+    @classmethod
+    def fromRuns(cls, size, starts, stops):
+        """
+        Builds a mask from runs that can overlap or touch each other, merging them into sorted, disjoint and non-adjacent runs
+
+        Parameters
+        ----------
+        size : tuple
+            the shape of the mask
+        starts : numpy array
+            the index of the first pixel of every run
+        stops : numpy array
+            the index after the last pixel of every run
+        Returns
+        -------
+        RunLengthMask
+            The mask
+        """
+        starts = np.asarray(starts, dtype=np.int64)
+        stops = np.asarray(stops, dtype=np.int64)
+        nonEmpty = stops > starts
+        positions, coverage = getCoverage([starts[nonEmpty]], [stops[nonEmpty]])
+        # the merged runs start where the coverage rises from 0 and stop where it falls back to 0
+        covered = coverage[:-1] > 0
+        return cls(size, positions[:-1][covered & ~np.r_[False, covered[:-1]]], positions[1:][covered & ~np.r_[covered[1:], False]])
+
+    @classmethod
+    def union(cls, masks, size=None):
+        """
+        Builds the union of many masks
+
+        Parameters
+        ----------
+        masks : array
+            the masks, all of them with the same size
+        size : tuple
+            the size of the union when there are no masks
+        Returns
+        -------
+        RunLengthMask
+            The union of the masks
+        """
+        if len(masks) <= 0:
+            return cls((0, 0) if size is None else size, [], [])
+        if len(masks) == 1:
+            return masks[0]
+        checkSizes(masks)
+        return cls.fromRuns(masks[0].size, np.concatenate([mask.starts for mask in masks]), np.concatenate([mask.stops for mask in masks]))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __eq__(self, other):
+        return isinstance(other, RunLengthMask) and self.size == other.size and np.array_equal(self.starts, other.starts) and np.array_equal(self.stops, other.stops)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash((self.size, self.starts.tobytes(), self.stops.tobytes()))
+
+    def getArea(self):
+        """
+        Calculates the number of foreground pixels
+
+        Returns
+        -------
+        int
+            The area
+
+        """
+        return int((self.stops - self.starts).sum())
+
+    def getSlab(self, start, stop):
+        """
+        Decodes the pixels of a range of the mask
+
+        Parameters
+        ----------
+        start : int
+            the index of the first pixel of the range, in row-major order
+        stop : int
+            the index after the last pixel of the range
+        Returns
+        -------
+        numpy array
+            boolean array with the pixels of the range
+
+        """
+        # only the runs that overlap the range are decoded
+        first = np.searchsorted(self.stops, start, side="right")
+        last = np.searchsorted(self.starts, stop, side="left")
+        starts = np.clip(self.starts[first:last], start, stop) - start
+        stops = np.clip(self.stops[first:last], start, stop) - start
+
+        # the runs are disjoint and non-adjacent, so every position is at most one start or one stop
+        changes = np.zeros(stop - start + 1, dtype=np.int8)
+        changes[starts] = 1
+        changes[stops] = -1
+        return np.cumsum(changes[:-1], dtype=np.int8) > 0
+
+    def getBounds(self):
+        """
+        Calculates the bounding region of the foreground from the runs, without decoding them
+
+        Returns
+        -------
+        array
+            the (start, stop) range of every axis, None if the mask is empty
+
+        """
+        if len(self.starts) <= 0:
+            return None
+        bounds = []
+        firsts = self.starts
+        lasts = self.stops - 1
+        stride = 1
+        for dimension in reversed(self.size):
+            # the indexes of a run along an axis are the consecutive values of index // stride, wrapped by the size of the axis
+            firstSteps = firsts // stride
+            lastSteps = lasts // stride
+            firstCoordinates = firstSteps % dimension
+            lastCoordinates = lastSteps % dimension
+            # a run that wraps around the axis covers it from its start to its end
+            wraps = (lastSteps - firstSteps >= dimension) | (firstCoordinates > lastCoordinates)
+            starts = np.where(wraps, 0, firstCoordinates)
+            stops = np.where(wraps, dimension - 1, lastCoordinates)
+            bounds.insert(0, (int(starts.min()), int(stops.max()) + 1))
+            stride *= dimension
+        return bounds
+
+    def getRegion(self, bounds):
+        """
+        Decodes the pixels of a bounding region of the mask, decoding one slice of the first axis at a time
+
+        Parameters
+        ----------
+        bounds : array
+            the (start, stop) range of every axis
+        Returns
+        -------
+        numpy array
+            boolean array with the pixels of the region
+
+        """
+        if len(self.size) <= 1:
+            return self.getSlab(bounds[0][0], bounds[0][1])
+        sliceSize = int(np.prod(self.size[1:], dtype=np.int64))
+        crop = tuple(slice(start, stop) for start, stop in bounds[1:])
+        region = np.zeros([stop - start for start, stop in bounds], dtype=bool)
+        for i in range(bounds[0][0], bounds[0][1]):
+            region[i - bounds[0][0]] = self.getSlab(i * sliceSize, (i + 1) * sliceSize).reshape(self.size[1:])[crop]
+        return region
+
+    def getOverlapAreas(self, other):
+        """
+        Calculates the areas of the intersection and union with another mask with a single sweep over the runs of both masks
+
+        Parameters
+        ----------
+        other : RunLengthMask
+            the other mask, with the same size
+        Returns
+        -------
+        tuple
+            the intersection area and the union area
+
+        """
+        checkSizes([self, other])
+        positions, coverage = getCoverage([self.starts, other.starts], [self.stops, other.stops])
+        lengths = np.diff(positions)
+        # the runs of each mask are disjoint, so the pixels covered twice are the ones in both masks
+        return int(lengths[coverage[:-1] >= 2].sum()), int(lengths[coverage[:-1] >= 1].sum())
+
+def getCoverage(starts, stops):
+    """
+    Sweeps the start and stop events of groups of runs, counting how many runs cover the pixels after every event
+
+    Parameters
+    ----------
+    starts : array
+        the arrays of the run starts of every group
+    stops : array
+        the arrays of the run stops of every group
+    Returns
+    -------
+    tuple
+        the sorted event positions and the number of runs covering the pixels from every position to the next
+
+    """
+    starts = np.concatenate(starts)
+    stops = np.concatenate(stops)
+    positions = np.concatenate((starts, stops))
+    deltas = np.concatenate((np.ones(len(starts), dtype=np.int64), -np.ones(len(stops), dtype=np.int64)))
+    # on the same position the starts go first, so touching runs are never counted as a gap
+    order = np.lexsort((-deltas, positions))
+    return positions[order], np.cumsum(deltas[order])
+
+def checkSizes(masks):
+    """
+    Checks that all the masks have the same size, throws a value error otherwise
+    """
+    for mask in masks[1:]:
+        if mask.size != masks[0].size:
+            raise ValueError('the masks have different sizes {0} and {1}'.format(masks[0].size, mask.size))
@@ -0,0 +1,336 @@
+import numpy as np
+
+class BinaryRocCurve:
+    """
+    Sorted-score engine for the binary ROC metrics. The scores are sorted a single time and the cumulative true and false
+    positive counts at every distinct score are shared by the AUC, the ROC and precision-recall curves, the average precision
+    and the metrics at a threshold. The calculations follow sklearn's so the results are the same as its roc_auc_score,
+    roc_curve, precision_recall_curve, average_precision_score and recall_score
+
+    ...
+
+    Attributes
+    ----------
+    thresholds : numpy array
+        the distinct scores in decreasing order
+    tps : numpy array
+        the number of positives with a score greater than or equal to every threshold
+    fps : numpy array
+        the number of negatives with a score greater than or equal to every threshold
+    positives : float
+        the number of positives
+    negatives : float
+        the number of negatives
+    """
+
+    def __init__(self, expected, actual):
+        expected = np.asarray(expected) == 1
+        actual = np.asarray(actual, dtype=np.float64)
+        if len(expected) != len(actual):
+            raise ValueError("the binary truths and the scores must have the same length")
+        if len(actual) <= 0:
+            raise ValueError("no scores for the binary ROC curve")
+
+        # a stable sort on the ascending scores reversed, just like sklearn, so tied scores keep the same order
+        order = np.argsort(actual, kind="mergesort")[::-1]
+        actual = actual[order]
+        expected = expected[order]
+
+        # the last index of every group of tied scores
+        thresholdIndexes = np.r_[np.where(np.diff(actual))[0], len(actual) - 1]
+        self.tps = np.cumsum(expected, dtype=np.float64)[thresholdIndexes]
+        self.fps = 1 + thresholdIndexes - self.tps
+        self.thresholds = actual[thresholdIndexes]
+        self.positives = self.tps[-1]
+        self.negatives = self.fps[-1]
+
+    def getRocCurve(self, dropIntermediate=False):
+        """
+        Gets the ROC curve
+
+        Parameters
+        ----------
+        dropIntermediate : boolean
+            whether to drop the thresholds of the points that are collinear with their neighbours, they do not change the shape of the curve
+        Returns
+        -------
+        tuple
+            the false positive rates, true positive rates and thresholds, starting at an infinite threshold
+
+        """
+        fps, tps, thresholds = self.fps, self.tps, self.thresholds
+        if dropIntermediate and len(fps) > 2:
+            optimalIndexes = np.where(np.r_[True, np.logical_or(np.diff(fps, 2), np.diff(tps, 2)), True])[0]
+            fps = fps[optimalIndexes]
+            tps = tps[optimalIndexes]
+            thresholds = thresholds[optimalIndexes]
+
+        # start the curve at (0, 0)
+        fps = np.r_[0, fps]
+        tps = np.r_[0, tps]
+        thresholds = np.r_[np.inf, thresholds]
+
+        fpr = np.repeat(np.nan, fps.shape) if fps[-1] <= 0 else fps / fps[-1]
+        tpr = np.repeat(np.nan, tps.shape) if tps[-1] <= 0 else tps / tps[-1]
+        return fpr, tpr, thresholds
+
+    def getDecimatedRocCurve(self, maxPoints, threshold):
+        """
+        Gets the ROC curve with at most a maximum number of points, keeping the points of its upper convex hull and the
+        operating point of the threshold
+
+        Parameters
+        ----------
+        maxPoints : int
+            the maximum number of points, the curve has more points when its hull does
+        threshold : float
+            the threshold of the operating point
+        Returns
+        -------
+        tuple
+            the false positive rates, true positive rates and thresholds, starting at an infinite threshold
+
+        """
+        fpr, tpr, thresholds = self.getRocCurve()
+        keptIndexes = [self.getOperatingPointIndex(threshold)]
+        # without positives or negatives the rates are not defined and there is no hull
+        if not np.isnan(fpr).any() and not np.isnan(tpr).any():
+            keptIndexes.extend(getUpperHullIndexes(fpr, tpr))
+        indexes = getDecimatedIndexes(len(fpr), maxPoints, keptIndexes)
+        return fpr[indexes], tpr[indexes], thresholds[indexes]
+
+    def getDecimatedPrecisionRecallCurve(self, maxPoints, threshold):
+        """
+        Gets the precision-recall curve with at most a maximum number of points, keeping the operating point of the threshold
+
+        Parameters
+        ----------
+        maxPoints : int
+            the maximum number of points
+        threshold : float
+            the threshold of the operating point
+        Returns
+        -------
+        tuple
+            the precisions, recalls and thresholds, in order of increasing threshold
+
+        """
+        precision, recall, thresholds = self.getPrecisionRecallCurve()
+        # the curve is in increasing threshold order, with a last point (1, 0) that has no threshold
+        operatingPointIndex = len(self.thresholds) - self.getOperatingPointIndex(threshold)
+        indexes = getDecimatedIndexes(len(precision), maxPoints, [operatingPointIndex])
+        return precision[indexes], recall[indexes], thresholds[indexes[indexes < len(thresholds)]]
+
+    def getOperatingPointIndex(self, threshold):
+        """
+        Gets the index of the point of the ROC curve of a threshold, which is the number of distinct scores greater than or equal to it
+        """
+        return int(np.searchsorted(-self.thresholds, -threshold, side="right"))
+
+    def getAuc(self):
+        """
+        Calculates the area under the ROC curve with the trapezoidal rule
+
+        Returns
+        -------
+        float
+            The auc
+
+        """
+        if self.positives <= 0 or self.negatives <= 0:
+            raise ValueError("the binary truths must have exactly two classes to calculate the auc")
+        fpr, tpr, _ = self.getRocCurve(dropIntermediate=True)
+        return (np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2.0).sum()
+
+    def getPrecisionRecallCurve(self):
+        """
+        Gets the precision-recall curve
+
+        Returns
+        -------
+        tuple
+            the precisions and recalls (ending at a precision of 1 and a recall of 0) and the thresholds, in order of increasing threshold
+
+        """
+        predictedPositives = self.tps + self.fps
+        precision = np.zeros_like(self.tps)
+        np.divide(self.tps, predictedPositives, out=precision, where=(predictedPositives != 0))
+        # when there are no positives the recall is 1 for every threshold
+        recall = np.ones_like(self.tps) if self.positives == 0 else self.tps / self.positives
+        return np.hstack((precision[::-1], 1)), np.hstack((recall[::-1], 0)), self.thresholds[::-1]
+
+    def getAveragePrecision(self):
+        """
+        Calculates the average precision as the step integral of the precision-recall curve
+
+        Returns
+        -------
+        float
+            The average precision
+
+        """
+        precision, recall, _ = self.getPrecisionRecallCurve()
+        return -np.sum(np.diff(recall) * precision[:-1])
+
+    def getCountsAtThreshold(self, threshold):
+        """
+        Gets the confusion counts when the scores greater than or equal to a threshold are predicted as positive
+
+        Parameters
+        ----------
+        threshold : float
+            the threshold
+        Returns
+        -------
+        tuple
+            the true positive, false positive, true negative and false negative counts
+
+        """
+        # the number of distinct scores at or above the threshold
+        above = np.searchsorted(-self.thresholds, -threshold, side="right")
+        truePositives = self.tps[above - 1] if above > 0 else 0.0
+        falsePositives = self.fps[above - 1] if above > 0 else 0.0
+        return truePositives, falsePositives, self.negatives - falsePositives, self.positives - truePositives
+
+    def getOperatingPoints(self, thresholds):
+        """
+        Gets the confusion counts and the binary metrics of many thresholds at once, the scores greater than or equal to
+        every threshold are predicted as positive. The counts of all the thresholds are looked up with a single search
+        over the sorted scores
+
+        Parameters
+        ----------
+        thresholds : array
+            the thresholds
+        Returns
+        -------
+        dictionary
+            arrays with a value for every threshold of the true positive, false positive, true negative and false negative
+            counts and of the sensitivity, specificity, positive predictive value, negative predictive value and Youden
+            index. The rates without any cases in their denominator are 0
+
+        """
+        thresholds = np.asarray(thresholds, dtype=np.float64)
+        # the number of distinct scores at or above every threshold, padded so no distinct score gives 0 counts
+        above = np.searchsorted(-self.thresholds, -thresholds, side="right")
+        truePositives = np.r_[0.0, self.tps][above]
+        falsePositives = np.r_[0.0, self.fps][above]
+        trueNegatives = self.negatives - falsePositives
+        falseNegatives = self.positives - truePositives
+
+        sensitivity = getRates(truePositives, truePositives + falseNegatives)
+        specificity = getRates(trueNegatives, trueNegatives + falsePositives)
+        return {
+            "truePositives": truePositives,
+            "falsePositives": falsePositives,
+            "trueNegatives": trueNegatives,
+            "falseNegatives": falseNegatives,
+            "sensitivity": sensitivity,
+            "specificity": specificity,
+            "positivePredictiveValue": getRates(truePositives, truePositives + falsePositives),
+            "negativePredictiveValue": getRates(trueNegatives, trueNegatives + falseNegatives),
+            "youdenIndex": sensitivity + specificity - 1
+        }
+
+    def getSensitivityAndSpecificity(self, threshold):
+        """
+        Calculates the sensitivity and specificity when the scores greater than or equal to a threshold are predicted as
+        positive, 0 when there are no positives or negatives respectively
+
+        Parameters
+        ----------
+        threshold : float
+            the threshold
+        Returns
+        -------
+        tuple
+            The sensitivity and specificity
+
+        """
+        truePositives, falsePositives, trueNegatives, falseNegatives = self.getCountsAtThreshold(threshold)
+        sensitivity = truePositives / self.positives if self.positives > 0 else 0.0
+        specificity = trueNegatives / self.negatives if self.negatives > 0 else 0.0
+        return float(sensitivity), float(specificity)
+
+
+def getUpperHullIndexes(x, y):
+    """
+    Gets the points of a curve on its upper convex hull, with the monotone chain algorithm
+
+    Parameters
+    ----------
+    x : numpy array
+        the x coordinates of the points, in non decreasing order
+    y : numpy array
+        the y coordinates of the points
+    Returns
+    -------
+    array
+        The indexes of the points of the upper hull, in increasing order
+
+    """
+    hull = []
+    for i in range(len(x)):
+        # drop the last point of the hull while it is not above the line from the point before it to the new point
+        while len(hull) >= 2:
+            a, b = hull[-2], hull[-1]
+            if (x[b] - x[a]) * (y[i] - y[a]) - (y[b] - y[a]) * (x[i] - x[a]) >= 0:
+                hull.pop()
+            else:
+                break
+        hull.append(i)
+    return hull
+
+def getDecimatedIndexes(count, maxPoints, keptIndexes):
+    """
+    Chooses at most a maximum number of the points of a curve, always keeping some points and spreading the rest evenly
+    over the remaining points. When the points to keep are more than the maximum all of them are kept
+
+    Parameters
+    ----------
+    count : int
+        the number of points of the curve
+    maxPoints : int
+        the maximum number of points
+    keptIndexes : array
+        the indexes of the points that are always kept
+    Returns
+    -------
+    numpy array
+        The indexes of the chosen points, in increasing order
+
+    """
+    if maxPoints < 2:
+        raise ValueError("the curves must have at least 2 points")
+    if count <= maxPoints:
+        return np.arange(count)
+
+    kept = np.zeros(count, dtype=bool)
+    kept[np.asarray(keptIndexes, dtype=np.int64)] = True
+    # the first and last points are the ends of the curve
+    kept[[0, -1]] = True
+    remainingPoints = maxPoints - kept.sum()
+    if remainingPoints > 0:
+        others = np.where(~kept)[0]
+        kept[others[np.unique(np.linspace(0, len(others) - 1, remainingPoints).round().astype(np.int64))]] = True
+    return np.where(kept)[0]
+
+def getRates(counts, totals):
+    """
+    Divides the counts by their totals, the rates with a total of 0 are 0
+
+    Parameters
+    ----------
+    counts : numpy array
+        the counts
+    totals : numpy array
+        the totals of the counts
+    Returns
+    -------
+    numpy array
+        The rates
+
+    """
+    rates = np.zeros_like(counts, dtype=np.float64)
+    np.divide(counts, totals, out=rates, where=(totals != 0))
+    return rates
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os.path
+
+class StudyCache:
+    """
+    Cache of the per-study partial results of the evaluations, keyed on a fingerprint of the content of the ground truth
+    and prediction of every study. When an output is evaluated again only the studies that changed or are new have to be
+    calculated, the aggregated metrics are merged from the partial results of every study
+
+    ...
+
+    Attributes
+    ----------
+    entries : dictionary
+        the partial results loaded from a previous run in the form of
+        {
+          algorithmType: {
+              key: {
+                  fingerprint: partialResult
+              }
+          }
+        }
+    usedEntries : dictionary
+        the partial results of the studies of the current run, in the same form as the entries. Only these are saved
+        so the cache doesn't keep the studies that are not part of the evaluation anymore
+    """
+
+    # the version of the partial results, a cache saved with a different version is discarded
+    version = 1
+
+    def __init__(self, entries=None):
+        self.entries = {} if entries is None else entries
+        self.usedEntries = {}
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads the cache saved by a previous run, an empty cache is returned if the file doesn't exist or was saved with another version
+
+        Parameters
+        ----------
+        path : string
+            the path to the cache json file
+
+        Returns
+        -------
+        StudyCache
+            The cache
+
+        """
+        if path is None or not os.path.isfile(path) or os.stat(path).st_size <= 0:
+            return cls()
+        with open(path) as cacheFile:
+            cache = json.load(cacheFile)
+        if cache.get("version") != cls.version:
+            return cls()
+        return cls(cache["entries"])
+
+    def save(self, path):
+        """
+        Saves the partial results of the studies of the current run
+
+        Parameters
+        ----------
+        path : string
+            the path to the cache json file
+
+        """
+        with open(path, 'w', encoding='utf-8') as cacheFile:
+            json.dump({"version": self.version, "entries": self.usedEntries}, cacheFile)
+
+    def getPartials(self, algorithmType, key):
+        """
+        Gets the cached partial results of a key
+
+        Parameters
+        ----------
+        algorithmType : string
+            the algorithm type of the evaluation (i.e. "boundingBox")
+        key : string
+            the annotation key
+
+        Returns
+        -------
+        dictionary
+            dictionary having the study fingerprints as keys and their partial results as values
+
+        """
+        return self.entries.get(algorithmType, {}).get(key, {})
+
+    def setPartials(self, algorithmType, key, partials):
+        """
+        Sets the partial results of the studies of a key for the current run
+
+        Parameters
+        ----------
+        algorithmType : string
+            the algorithm type of the evaluation (i.e. "boundingBox")
+        key : string
+            the annotation key
+        partials : dictionary
+            dictionary having the study fingerprints as keys and their partial results as values
+
+        """
+        if algorithmType not in self.usedEntries:
+            self.usedEntries[algorithmType] = {}
+        self.usedEntries[algorithmType][key] = partials
+
+def getStudyFingerprint(groundTruth, prediction, fileDigests=None):
+    """
+    Creates the fingerprint of the content of the ground truth and prediction of a study
+
+    Parameters
+    ----------
+    groundTruth : json object
+        the ground truth of the study
+    prediction : json object
+        the prediction of the study
+    fileDigests : array
+        optional digests of the files referenced by the ground truth and prediction, like the .npy masks of the segmentations
+
+    Returns
+    -------
+    string
+        the hex representation of the SHA-1 of the serialized content
+
+    """
+    study = [groundTruth, prediction]
+    if fileDigests is not None and len(fileDigests) > 0:
+        study.append(fileDigests)
+    content = json.dumps(study, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
@@ -0,0 +1,253 @@
+from utils.data import GranularityIdentifierTable
+
+# the algorithm type keys as they appear in the annotation data of the dataset and in the studies of the output
+ANNOTATION_TYPE_KEYS = ("classification", "continuous", "boundingBox", "segmentation")
+OUTPUT_TYPE_KEYS = ("classificationOutput", "continuousOutput", "boundingBoxOutput", "segmentationOutput")
+
+class StudyIndex:
+    """
+    Shared index of the ground truths and outputs of every algorithm type. The dataset and the output are each walked
+    a single time so that all the metric factories can obtain their data with simple lookups
+
+    ...
+
+    Attributes
+    ----------
+    granularities : GranularityIdentifierTable
+        the table interning the granularity of every ground truth and output to integer ids
+    groundTruths : dictionary
+        dictionary in the form of
+        {
+          annotationTypeKey: {
+              key: {
+                  granularityId: groundTruth
+              }
+          }
+        }
+        or None if the dataset has no studies
+    outputs : dictionary
+        dictionary in the form of
+        {
+          outputTypeKey: {
+              key: [(granularityId, output), ...] // in the order they appear in the output
+          }
+        }
+        or None if the output has no studies
+    """
+
+    def __init__(self, dataset, output):
+
+        if dataset is None:
+            raise ValueError("no dataset found")
+        if output is None:
+            raise ValueError("no output found")
+
+        self.granularities = GranularityIdentifierTable()
+        self.groundTruths = self.indexDataset(dataset)
+        self.outputs = self.indexOutput(output)
+
+    @classmethod
+    def fromDataset(cls, dataset):
+        """
+        Creates the index of the ground truths of a dataset without any output, so the dataset is only walked once when
+        several outputs are evaluated against it. The index of every output is created with withOutput
+
+        Parameters
+        ----------
+        dataset : json
+            The standard dataset json or a stream of its studies
+
+        Returns
+        -------
+        StudyIndex
+            The index of the ground truths
+        """
+        if dataset is None:
+            raise ValueError("no dataset found")
+
+        index = cls.__new__(cls)
+        index.granularities = GranularityIdentifierTable()
+        index.groundTruths = index.indexDataset(dataset)
+        index.outputs = None
+        return index
+
+    def withOutput(self, output):
+        """
+        Creates the index of an output sharing the ground truths of this index. The granularity table is copied so the
+        granularities of one output don't change the ids of the others, the ids are the same as indexing the dataset and
+        output together
+
+        Parameters
+        ----------
+        output : json
+            The standard output json, its "studies" may be a stream of the studies
+
+        Returns
+        -------
+        StudyIndex
+            The index of the ground truths and the output
+        """
+        if output is None:
+            raise ValueError("no output found")
+
+        index = StudyIndex.__new__(StudyIndex)
+        index.granularities = self.granularities.copy()
+        index.groundTruths = self.groundTruths
+        index.outputs = index.indexOutput(output)
+        return index
+
+    def getGroundTruths(self, annotationTypeKey):
+        """
+        Gets the ground truths of an algorithm type
+
+        Parameters
+        ----------
+        annotationTypeKey : string
+            the identifying key for the algorithm type in the dataset json object
+
+        Returns
+        -------
+        dictionary
+            dictionary in the form of { key: { granularityId: groundTruth } }, None if the dataset has no studies
+
+        """
+        if self.groundTruths is None:
+            return None
+        return self.groundTruths.get(annotationTypeKey, {})
+
+    def getOutputs(self, outputTypeKey):
+        """
+        Gets the raw outputs of an algorithm type
+
+        Parameters
+        ----------
+        outputTypeKey : string
+            the identifying key for the algorithm type in the output json object
+
+        Returns
+        -------
+        dictionary
+            dictionary in the form of { key: [(granularityId, output), ...] }, None if the output has no studies
+
+        """
+        if self.outputs is None:
+            return None
+        return self.outputs.get(outputTypeKey, {})
+
+    def indexDataset(self, dataset):
+        """
+        Walks the standard dataset once and sorts the ground truths of every algorithm type. This will "flaten"
+        the levels of the annotation into a single dictionary structure per algorithm type and key.
+
+        Parameters
+        ----------
+        dataset : json
+            The standard dataset json or a stream of its studies
+
+        Returns
+        -------
+        dictionary
+            the ground truths as described by the groundTruths attribute
+
+        """
+        groundTruths = {}
+        hasStudies = False
+
+        def processAnnotations(annotationData, studyInstanceUid, seriesId='', instanceId='', frameId=''):
+            if annotationData is None:
+                return
+
+            granularityId = None
+            for annotationTypeKey in ANNOTATION_TYPE_KEYS:
+                targetGroundTruths = annotationData.get(annotationTypeKey)
+                if targetGroundTruths is None or len(targetGroundTruths) <= 0:
+                    continue
+
+                # all the annotations in this level share the same granularity
+                if granularityId is None:
+                    granularityId = self.granularities.getId(studyInstanceUid, seriesId, instanceId, frameId)
+
+                if annotationTypeKey not in groundTruths:
+                    groundTruths[annotationTypeKey] = {}
+                typeDict = groundTruths[annotationTypeKey]
+
+                for groundTruth in targetGroundTruths:
+                    if groundTruth["key"] not in typeDict:
+                        targetDict = {}
+                        typeDict[groundTruth["key"]] = targetDict
+                    else:
+                        targetDict = typeDict[groundTruth["key"]]
+
+                    targetDict[granularityId] = groundTruth["value"]
+
+        for data in dataset:
+            hasStudies = True
+            studyInstanceUid = data["studyInstanceUid"]
+            processAnnotations(data["annotationData"], studyInstanceUid)
+            if "series" not in data or data["series"] is None:
+                continue
+            for series in data["series"]:
+                seriesInstanceUid = series["seriesInstanceUid"] if "seriesInstanceUid" in series else ''
+                processAnnotations(series["annotationData"], studyInstanceUid, seriesInstanceUid)
+                if "instances" not in series or series["instances"] is None:
+                    continue
+                for instance in series["instances"]:
+                    sopInstanceUid = instance["sopInstanceUid"] if "sopInstanceUid" in instance else ''
+                    processAnnotations(instance["annotationData"], studyInstanceUid, seriesInstanceUid, sopInstanceUid)
+                    if "frames" not in instance or instance["frames"] is None:
+                        continue
+                    for frame in instance["frames"]:
+                        frameIndex = frame["frameIndex"] if "frameIndex" in frame else ''
+                        processAnnotations(frame["annotationData"], studyInstanceUid, seriesInstanceUid, sopInstanceUid, frameIndex)
+
+        if not hasStudies:
+            return None
+        return groundTruths
+
+    def indexOutput(self, output):
+        """
+        Walks the standard output once and sorts the raw outputs of every algorithm type by key
+
+        Parameters
+        ----------
+        output : json
+            The standard output json, its "studies" may be a stream of the studies
+
+        Returns
+        -------
+        dictionary
+            the outputs as described by the outputs attribute
+
+        """
+        outputs = {}
+        hasStudies = False
+
+        for study in output["studies"]:
+            hasStudies = True
+            for outputTypeKey in OUTPUT_TYPE_KEYS:
+                if outputTypeKey not in study or study[outputTypeKey] is None:
+                    continue
+
+                if outputTypeKey not in outputs:
+                    outputs[outputTypeKey] = {}
+                typeDict = outputs[outputTypeKey]
+
+                for output in study[outputTypeKey]:
+                    if output["key"] not in typeDict:
+                        targetList = []
+                        typeDict[output["key"]] = targetList
+                    else:
+                        targetList = typeDict[output["key"]]
+
+                    # get the granularity id
+                    studyInstanceUID = study["studyInstanceUID"]
+                    seriesInstanceUID = output["seriesInstanceUID"] if "seriesInstanceUID" in output else ''
+                    sopInstanceUID = output["sopInstanceUID"] if "sopInstanceUID" in output else ''
+                    frameIndex = output["frameIndex"] if "frameIndex" in output else ''
+                    granularityId = self.granularities.getId(studyInstanceUID, seriesInstanceUID, sopInstanceUID, frameIndex)
+
+                    targetList.append((granularityId, output["output"]))
+
+        if not hasStudies:
+            return None
+        return outputs
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the modules of the evaluation import each other from the src folder, like when main.py runs
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'src'))
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from utils.boundingBox import BoundingBox, BoxArray, getCoverageAreas
+
+def getRandomBoxes(generator, count, size):
+    # boxes with negative, inverted and out of canvas coordinates are included, they follow the slicing rules of the pixel maps
+    topLeft = generator.integers(-3, size, (count, 2))
+    bottomRight = topLeft + generator.integers(-2, size // 2, (count, 2))
+    return BoxArray(np.concatenate((topLeft, bottomRight), axis=1))
+
+def getPixelMap(boxes, width, height):
+    pixelMap = np.zeros((height, width), dtype=bool)
+    for x1, y1, x2, y2 in boxes.coordinates:
+        pixelMap[y1:y2 + 1, x1:x2 + 1] = True
+    return pixelMap
+
+@pytest.mark.parametrize("seed", range(20))
+def test_coverage_areas_same_as_pixel_maps(seed):
+    generator = np.random.default_rng(seed)
+    gtBoxes = getRandomBoxes(generator, generator.integers(1, 6), 40)
+    predBoxes = getRandomBoxes(generator, generator.integers(1, 6), 40)
+    coordinates = np.concatenate((gtBoxes.coordinates, predBoxes.coordinates))
+    width = coordinates[:, 2].max() + 1
+    height = coordinates[:, 3].max() + 1
+    if width <= 0 or height <= 0:
+        pytest.skip("the boxes are outside of the canvas")
+
+    gtMap = getPixelMap(gtBoxes, width, height)
+    predMap = getPixelMap(predBoxes, width, height)
+    assert getCoverageAreas(gtBoxes, predBoxes) == (gtMap.sum(), predMap.sum(), (gtMap & predMap).sum(), (gtMap | predMap).sum())
+
+def getJsonBox(x1, y1, x2, y2):
+    return {"top_left_hand_corner": {"x": x1, "y": y1}, "bottom_right_hand_corner": {"x": x2, "y": y2}}
+
+@pytest.mark.parametrize("seed", range(10))
+def test_box_array_same_as_bounding_boxes(seed):
+    generator = np.random.default_rng(seed)
+    groups = [[getJsonBox(*box) for box in getRandomBoxes(generator, count, 40).coordinates.clip(0).tolist()] for count in generator.integers(0, 5, 4)]
+    boxArray = BoxArray.fromJsonData(groups)
+    assert boxArray.getGroupCount() == len(groups)
+    assert len(boxArray) == sum(len(group) for group in groups)
+
+    for i, group in enumerate(groups):
+        boxes = [BoundingBox.fromJsonData(box) for box in group]
+        groupArray = boxArray.getGroup(i)
+        assert groupArray.getAreas().tolist() == [box.getArea() for box in boxes]
+        ious = groupArray.getIoUMatrix(boxArray)
+        assert ious.shape == (len(group), len(boxArray))
+        for j, box in enumerate(boxes):
+            for k, other in enumerate(BoundingBox.fromJsonData(box) for group in groups for box in group):
+                assert ious[j, k] == pytest.approx(box.getIoU(other))
+
+def test_intersection_areas_same_as_pixel_maps():
+    generator = np.random.default_rng(0)
+    boxes = BoxArray(getRandomBoxes(generator, 12, 30).coordinates.clip(0))
+    intersections = boxes.getIntersectionAreas(boxes)
+    for i in range(len(boxes)):
+        for j in range(len(boxes)):
+            first = getPixelMap(BoxArray(boxes.coordinates[i]), 60, 60)
+            second = getPixelMap(BoxArray(boxes.coordinates[j]), 60, 60)
+            assert intersections[i, j] == (first & second).sum()
+
+def test_box_array_coordinates_validation():
+    # the values that aren't plain numbers go through the validation of the bounding boxes
+    assert BoxArray.fromJsonData([[getJsonBox("1", 2, 3.7, 4)]]).coordinates.tolist() == [[1, 2, 3, 4]]
+    with pytest.raises(Exception):
+        BoxArray.fromJsonData([[{"top_left_hand_corner": {"x": 1, "y": 2}}]])
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+from sklearn.metrics import confusion_matrix, accuracy_score, cohen_kappa_score, recall_score
+
+from utils.confusionMatrix import getConfusionMatrices, getAccuracies, getLinearKappas, getRecalls, getMacroRecalls
+
+def getGroups(seed, labelCount, groupCount, size):
+    generator = np.random.default_rng(seed)
+    truths = generator.integers(0, labelCount, size)
+    # mostly right predictions, so the kappas are not all around 0
+    predictions = np.where(generator.random(size) < 0.6, truths, generator.integers(0, labelCount, size))
+    groups = generator.integers(0, groupCount, size)
+    return truths, predictions, groups
+
+@pytest.mark.parametrize("seed,labelCount", [(0, 2), (1, 3), (2, 5), (3, 8)])
+def test_same_as_sklearn(seed, labelCount):
+    groupCount = 6
+    truths, predictions, groups = getGroups(seed, labelCount, groupCount, 300)
+    # a group where some labels are never present, the kappa and macro recall only take the present ones into account
+    groups[(truths >= 2) & (predictions >= 2)] = 0
+
+    matrices = getConfusionMatrices(truths, predictions, labelCount, groups, groupCount)
+    accuracies = getAccuracies(matrices)
+    kappas = getLinearKappas(matrices)
+    macroRecalls = getMacroRecalls(matrices)
+    for group in range(groupCount):
+        selected = groups == group
+        groupTruths, groupPredictions = truths[selected], predictions[selected]
+        np.testing.assert_array_equal(matrices[group], confusion_matrix(groupTruths, groupPredictions, labels=range(labelCount)))
+        assert accuracies[group] == pytest.approx(accuracy_score(groupTruths, groupPredictions))
+        assert kappas[group] == pytest.approx(cohen_kappa_score(groupTruths, groupPredictions, weights="linear"))
+        assert macroRecalls[group] == pytest.approx(recall_score(groupTruths, groupPredictions, average="macro", zero_division=0))
+        for label in range(labelCount):
+            assert getRecalls(matrices, label)[group] == pytest.approx(recall_score(groupTruths, groupPredictions, labels=[label], average="macro", zero_division=0))
+
+def test_single_matrix_without_groups():
+    truths, predictions, _ = getGroups(4, 4, 1, 100)
+    matrices = getConfusionMatrices(truths, predictions, 4)
+    assert matrices.shape == (1, 4, 4)
+    np.testing.assert_array_equal(matrices[0], confusion_matrix(truths, predictions, labels=range(4)))
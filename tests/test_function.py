@@ -0,0 +1,103 @@
+import io
+import json
+import os
+import threading
+
+import pytest
+
+pytest.importorskip("boto3")
+from botocore.response import StreamingBody
+
+import function
+from main import getArgumentParser, runEvaluation, serializeEvaluation
+
+EXAMPLE_FOLDER_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'examples', 'pneumoniaDetection')
+
+class TrickleStream(io.RawIOBase):
+    # a response body that is received a few bytes at a time, like a slow download
+    def __init__(self, data):
+        self.data = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        return self.data.read(7 if size is None or size < 0 else min(size, 7))
+
+class FakeS3Client:
+    """
+    Local S3 stand-in with the get_object and put_object of the S3 client. The downloads wait for each other, so the
+    handler only completes when both files are downloaded at the same time
+    """
+    def __init__(self, objects):
+        self.objects = objects
+        self.puts = {}
+        self.bodies = []
+        self.downloads = threading.Barrier(2, timeout=10)
+
+    def get_object(self, Bucket, Key):
+        self.downloads.wait()
+        data = self.objects[(Bucket, Key)]
+        body = StreamingBody(TrickleStream(data), len(data))
+        self.bodies.append(body)
+        return {"Body": body}
+
+    def put_object(self, Bucket, Key, Body, ContentType):
+        self.puts[(Bucket, Key)] = Body
+
+def getExampleClient():
+    objects = {}
+    for key, fileName in [("dataset.json", "dataset.json"), ("output.json", "output.json")]:
+        with open(os.path.join(EXAMPLE_FOLDER_PATH, fileName), 'rb') as exampleFile:
+            objects[("bucket", key)] = exampleFile.read()
+    return FakeS3Client(objects)
+
+def getLocalEvaluation(tmp_path):
+    args = getArgumentParser().parse_args([
+        '--dataset_file_path=' + os.path.join(EXAMPLE_FOLDER_PATH, 'dataset.json'),
+        '--output_file_path=' + os.path.join(EXAMPLE_FOLDER_PATH, 'output.json'),
+        '--evaluation_file_path=' + str(tmp_path / 'evaluation.json'),
+        '--threshold=0.3',
+        '--no_cache'
+    ])
+    return json.loads(runEvaluation(args))
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_same_evaluation_as_a_local_run(tmp_path, monkeypatch, compact):
+    s3 = getExampleClient()
+    monkeypatch.setattr(function, "s3Client", s3)
+
+    evaluation = function.lambda_handler({
+        "bucket": "bucket",
+        "datasetFileKey": "dataset.json",
+        "outputFileKey": "output.json",
+        "evaluationFileKey": "evaluation.json",
+        "compact": compact
+    }, None)
+
+    assert json.loads(serializeEvaluation(evaluation)) == getLocalEvaluation(tmp_path)
+    # the evaluation is written back to the bucket and both downloads are closed
+    assert s3.puts[("bucket", "evaluation.json")] == serializeEvaluation(evaluation, compact).encode('utf-8')
+    assert len(s3.bodies) == 2 and all(body._raw_stream.closed for body in s3.bodies)
+
+def test_evaluation_not_written_without_key(monkeypatch):
+    s3 = getExampleClient()
+    monkeypatch.setattr(function, "s3Client", s3)
+    function.lambda_handler({"bucket": "bucket", "datasetFileKey": "dataset.json", "outputFileKey": "output.json"}, None)
+    assert s3.puts == {}
+
+def test_iterate_json_array_of_a_property():
+    document = {"other": [1, 2], "studies": [{"studyInstanceUid": "1", "values": ["ñ", 1.5, None]}, {"studyInstanceUid": "2"}]}
+    s3 = FakeS3Client({("bucket", "output.json"): json.dumps(document, ensure_ascii=False).encode('utf-8')})
+    s3.downloads = threading.Barrier(1)
+    assert list(function.iterateS3JsonArray(s3, "bucket", "output.json", "studies")) == document["studies"]
+    assert s3.bodies[0]._raw_stream.closed
+
+def test_client_endpoint_from_the_environment(monkeypatch):
+    monkeypatch.setattr(function, "s3Client", None)
+    monkeypatch.setenv("S3_ENDPOINT_URL", "http://localhost:5000")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    client = function.getS3Client()
+    assert client.meta.endpoint_url == "http://localhost:5000"
+    # the client is reused by the next invocations
+    assert function.getS3Client() is client
@@ -0,0 +1,109 @@
+import os
+
+import numpy as np
+import pytest
+from scipy import ndimage
+
+from utils.npyMask import NpyMask, resolveMaskPath
+from evaluations.segmentation import SegmentationEvaluation, getStudyPartials, getSlabStudyPartial, getMasks
+
+def getRandomObject(generator, size):
+    noise = ndimage.gaussian_filter(generator.random(size), 1.5)
+    return noise > np.quantile(noise, generator.uniform(0.7, 0.95))
+
+def getCounts(voxels):
+    # alternating background and foreground run lengths in row-major order, starting with background
+    flat = np.concatenate(([False], voxels.reshape(-1), [False]))
+    changes = np.flatnonzero(flat[1:] != flat[:-1])
+    return np.diff(np.concatenate(([0], changes))).tolist()
+
+def saveStudies(directory, generator, size, studyCount):
+    # the same objects as .npy files and as run length encoded masks, some of the studies and objects are empty
+    npyGts, npyPreds, rleGts, rlePreds, dense = {}, {}, {}, {}, []
+    for study in range(studyCount):
+        objects = [[getRandomObject(generator, size) & (generator.random() < 0.9) for _ in range(generator.integers(1, 4))] for _ in range(2)]
+        # a predicted object close to a ground truth one, so the objects are matched by the average precision
+        objects[1][0] = np.roll(objects[0][0], generator.integers(0, 2), axis=-1)
+        for side, (npyValues, rleValues) in enumerate([(npyGts, rleGts), (npyPreds, rlePreds)]):
+            npyValues[str(study)] = []
+            rleValues[str(study)] = []
+            for i, voxels in enumerate(objects[side]):
+                fileName = '{0}_{1}_{2}.npy'.format(study, side, i)
+                # the voxels can be of any type, every non zero voxel is foreground
+                np.save(os.path.join(directory, fileName), voxels.astype(np.uint8) * (i + 1))
+                npyValues[str(study)].append({"npy": fileName})
+                rleValues[str(study)].append({"rle": {"size": list(size), "counts": getCounts(voxels)}})
+        dense.append(objects)
+    # the predictions are arrays of the segmentations of the predictions of the ground truth level
+    return npyGts, {study: [value] for study, value in npyPreds.items()}, rleGts, {study: [value] for study, value in rlePreds.items()}, dense
+
+@pytest.mark.parametrize("seed,size", [(0, (6, 10, 12)), (1, (16, 20)), (2, (3, 9, 7))])
+def test_slab_path_same_as_dense_and_encoded(tmp_path, seed, size):
+    generator = np.random.default_rng(seed)
+    npyGts, npyPreds, rleGts, rlePreds, dense = saveStudies(str(tmp_path), generator, size, 4)
+
+    for study, (gtObjects, predObjects) in enumerate(dense):
+        gtMasks = getMasks(npyGts[str(study)], str(tmp_path))
+        predMasks = getMasks(npyPreds[str(study)][0], str(tmp_path))
+        gt = np.any(gtObjects, axis=0)
+        pred = np.any(predObjects, axis=0)
+        for chunkSize in [1, 37, 1 << 24]:
+            partial = getSlabStudyPartial(gtMasks, predMasks, chunkSize)
+            if not gt.any() and not pred.any():
+                assert partial is None
+            else:
+                assert partial[1:5] == [gt.sum(), pred.sum(), (gt & pred).sum(), (gt | pred).sum()]
+
+    # the masks read a slab at a time give the same evaluation as the run length encoded ones compared without decoding them
+    expected = SegmentationEvaluation("key", rleGts, rlePreds)
+    for chunkSize in [1, 37, 1 << 24]:
+        assert SegmentationEvaluation("key", npyGts, npyPreds, chunkSize=chunkSize, datasetDirectory=str(tmp_path), outputDirectory=str(tmp_path)) == expected
+
+def test_mixed_masks_use_the_slab_path(tmp_path):
+    voxels = np.zeros((5, 8), dtype=bool)
+    voxels[1:4, 2:6] = True
+    np.save(str(tmp_path / "mask.npy"), voxels)
+    npyMask = NpyMask.fromJsonData("mask.npy", str(tmp_path))
+    rleMask = getMasks({"rle": {"size": [5, 8], "counts": getCounts(voxels)}})[0]
+    # the same mask as a file and as runs is a perfect match
+    assert getStudyPartials([[npyMask]], [[rleMask]], 4)[0] == pytest.approx([1.0, 12, 12, 12, 12, 0.0, 0.0])
+
+def test_paths_resolved_in_the_json_directory(tmp_path):
+    os.makedirs(str(tmp_path / "masks"))
+    np.save(str(tmp_path / "masks" / "mask.npy"), np.ones((2, 2), dtype=bool))
+    assert NpyMask.fromJsonData({"path": "masks/mask.npy"}, str(tmp_path)).path == os.path.realpath(str(tmp_path / "masks" / "mask.npy"))
+
+    # the masks can't be outside of the directory of the json file
+    with pytest.raises(Exception, match="Security Error"):
+        resolveMaskPath(str(tmp_path / "masks" / "mask.npy"), str(tmp_path / "other"))
+    with pytest.raises(Exception, match="Security Error"):
+        resolveMaskPath("masks/../../mask.npy", str(tmp_path))
+    # nor reached through a symbolic link
+    os.makedirs(str(tmp_path / "json"))
+    os.symlink(str(tmp_path / "masks"), str(tmp_path / "json" / "link"))
+    with pytest.raises(Exception, match="Security Error"):
+        resolveMaskPath("link/mask.npy", str(tmp_path / "json"))
+    with pytest.raises(ValueError):
+        resolveMaskPath("masks/mask.npy", None)
+
+def test_more_masks_than_open_files(tmp_path):
+    resource = pytest.importorskip("resource")
+    # every mapped .npy file keeps a file descriptor open, the studies must not all be opened at the same time
+    studyCount = 300
+    groundTruths = {}
+    predictions = {}
+    for study in range(studyCount):
+        voxels = np.zeros((4, 4), dtype=bool)
+        voxels[study % 4, :] = True
+        np.save(str(tmp_path / '{0}.npy'.format(study)), voxels)
+        groundTruths[str(study)] = {"npy": '{0}.npy'.format(study)}
+        predictions[str(study)] = [{"npy": '{0}.npy'.format(study)}]
+
+    softLimit, hardLimit = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(128, hardLimit), hardLimit))
+    try:
+        metrics = SegmentationEvaluation("key", groundTruths, predictions, datasetDirectory=str(tmp_path), outputDirectory=str(tmp_path))
+    finally:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (softLimit, hardLimit))
+    assert metrics["meanDiceCoefficient"] == pytest.approx(1.0)
+    assert len(metrics["scatterPlot"]["data"]) == studyCount
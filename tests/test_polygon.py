@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from utils.polygon import PolygonMask
+
+def getRandomPolygon(generator, size):
+    # star shaped polygons around a random center, some of them going past the borders of the image
+    count = generator.integers(3, 12)
+    angles = np.sort(generator.uniform(0, 2 * np.pi, count))
+    radii = generator.uniform(1, max(size) / 2, count)
+    centerX, centerY = generator.uniform(-2, size[1] + 2), generator.uniform(-2, size[0] + 2)
+    return [[float(x), float(y)] for x, y in zip(centerX + radii * np.cos(angles), centerY + radii * np.sin(angles))]
+
+def getPixels(size, points):
+    # a pixel is inside when a ray from its center to the left crosses the contour an odd number of times, counting the edges
+    # that cross the row of the center in [min(y0, y1), max(y0, y1))
+    pixels = np.zeros(size, dtype=bool)
+    for y in range(size[0]):
+        for x in range(size[1]):
+            crossings = 0
+            for (x0, y0), (x1, y1) in zip(points, points[1:] + points[:1]):
+                if min(y0, y1) <= y < max(y0, y1) and x0 + (y - y0) * (x1 - x0) / (y1 - y0) <= x:
+                    crossings += 1
+            pixels[y, x] = crossings % 2 == 1
+    return pixels
+
+def getMask(size, points):
+    return PolygonMask.fromJsonData({"size": list(size), "points": points})
+
+def decode(mask):
+    return mask.getSlab(0, mask.size[0] * mask.size[1]).reshape(mask.size)
+
+@pytest.mark.parametrize("seed,size", [(0, (12, 20)), (1, (30, 9)), (2, (24, 24)), (3, (5, 40)), (4, (17, 33))])
+def test_same_as_point_in_polygon(seed, size):
+    generator = np.random.default_rng(seed)
+    points = getRandomPolygon(generator, size)
+    otherPoints = getRandomPolygon(generator, size)
+    pixels = getPixels(size, points)
+    other = getPixels(size, otherPoints)
+    mask = getMask(size, points)
+
+    np.testing.assert_array_equal(decode(mask), pixels)
+    assert mask.getArea() == pixels.sum()
+    assert mask.getOverlapAreas(getMask(size, otherPoints)) == ((pixels & other).sum(), (pixels | other).sum())
+    np.testing.assert_array_equal(decode(PolygonMask.union([mask, getMask(size, otherPoints)])), pixels | other)
+
+    flat = pixels.reshape(-1)
+    for start, stop in [(0, 1), (size[1] - 1, len(flat) - 3), (len(flat) // 2, len(flat))]:
+        np.testing.assert_array_equal(mask.getSlab(start, stop), flat[start:stop])
+
+    bounds = mask.getBounds()
+    if pixels.any():
+        coordinates = np.argwhere(pixels)
+        assert bounds == [(int(first), int(last) + 1) for first, last in zip(coordinates.min(axis=0), coordinates.max(axis=0))]
+        np.testing.assert_array_equal(mask.getRegion(bounds), pixels[tuple(slice(start, stop) for start, stop in bounds)])
+    else:
+        assert bounds is None
+
+def test_integer_vertices_on_pixel_centers():
+    # a square on the pixel centers only keeps the top and left edges, like the scanline fill of the rasterizers
+    mask = getMask((6, 6), [[1, 1], [4, 1], [4, 4], [1, 4]])
+    np.testing.assert_array_equal(decode(mask), getPixels((6, 6), [[1, 1], [4, 1], [4, 4], [1, 4]]))
+    assert mask.getBounds() == [(1, 4), (1, 4)]
+
+def test_degenerate_and_invalid_polygons():
+    assert getMask((4, 4), [[0, 0], [3, 3]]).getArea() == 0
+    assert getMask((4, 4), [[0, 1], [3, 1], [2, 1]]).getBounds() is None
+    with pytest.raises(ValueError):
+        getMask((4, 4), [[0, 0, 1]])
+    with pytest.raises(ValueError):
+        getMask((4, 4), [[0, 0], [float("nan"), 1], [2, 2]])
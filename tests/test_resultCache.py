@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+from main import getArgumentParser, getResultCacheKey, runEvaluation
+from utils.resultCache import fileContains
+
+EXAMPLES_FOLDER_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'examples')
+
+def getArguments(tmp_path, example, outputFileName):
+    return getArgumentParser().parse_args([
+        '--dataset_file_path=' + os.path.join(EXAMPLES_FOLDER_PATH, example, 'dataset.json'),
+        '--output_file_path=' + os.path.join(EXAMPLES_FOLDER_PATH, example, outputFileName),
+        '--evaluation_file_path=' + str(tmp_path / 'evaluation.json'),
+        '--result_cache_dir=' + str(tmp_path / 'cache')
+    ])
+
+def test_identical_runs_have_the_same_key(tmp_path):
+    # the evaluation file written by the first run doesn't change the key of the second one, without bounding boxes
+    args = getArguments(tmp_path, 'breastDensity', 'modelOutput.json')
+    keys = []
+    for _ in range(3):
+        keys.append(getResultCacheKey(args))
+        runEvaluation(args)
+    assert keys[0] == keys[1] == keys[2]
+    assert len(os.listdir(str(tmp_path / 'cache'))) == 1
+
+def test_previous_bounding_box_evaluation_is_part_of_the_key(tmp_path):
+    # the bounding box areas of the previous evaluation are reused, so it is part of the key once it has them
+    args = getArguments(tmp_path, 'pneumoniaDetection', 'output.json')
+    keys = []
+    for _ in range(3):
+        keys.append(getResultCacheKey(args))
+        runEvaluation(args)
+    assert keys[0] != keys[1]
+    assert keys[1] == keys[2]
+
+    args.use_cache = False
+    assert getResultCacheKey(args) == keys[0]
+
+@pytest.mark.parametrize("chunkSize", [1, 2, 3, 5, 1024])
+def test_file_contains_patterns_split_between_chunks(tmp_path, chunkSize):
+    path = str(tmp_path / 'file.json')
+    with open(path, 'wb') as searchedFile:
+        searchedFile.write(b'{"a": [1, 2], "npy": "mask.npy"}')
+    assert fileContains(path, b'"npy"', chunkSize)
+    assert fileContains(path, b'}', chunkSize)
+    assert not fileContains(path, b'"boundingBoxOutput"', chunkSize)
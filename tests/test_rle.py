@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from utils.rle import RunLengthMask
+
+def getRandomMask(generator, size):
+    # blobs of foreground so the masks have runs of every length, touching the borders of the rows
+    pixels = generator.random(size) < generator.uniform(0.05, 0.6)
+    pixels |= np.roll(pixels, 1) | np.roll(pixels, -1)
+    return pixels
+
+def getCounts(pixels):
+    # alternating background and foreground run lengths in row-major order, starting with background
+    flat = np.concatenate(([False], pixels.reshape(-1), [False]))
+    changes = np.flatnonzero(flat[1:] != flat[:-1])
+    return np.diff(np.concatenate(([0], changes))).tolist()
+
+def getMask(pixels):
+    return RunLengthMask.fromJsonData({"size": list(pixels.shape), "counts": getCounts(pixels)})
+
+def decode(mask):
+    # paints the runs of the mask
+    pixels = np.zeros(int(np.prod(mask.size)), dtype=bool)
+    for start, stop in zip(mask.starts, mask.stops):
+        pixels[start:stop] = True
+    return pixels.reshape(mask.size)
+
+@pytest.mark.parametrize("seed,size", [(0, (7, 9)), (1, (1, 30)), (2, (16, 16)), (3, (4, 5, 6)), (4, (3, 1, 8))])
+def test_same_as_dense_pixels(seed, size):
+    generator = np.random.default_rng(seed)
+    pixels = getRandomMask(generator, size)
+    other = getRandomMask(generator, size)
+    mask = getMask(pixels)
+
+    np.testing.assert_array_equal(decode(mask), pixels)
+    assert mask.getArea() == pixels.sum()
+    assert mask.getOverlapAreas(getMask(other)) == ((pixels & other).sum(), (pixels | other).sum())
+    np.testing.assert_array_equal(decode(RunLengthMask.union([mask, getMask(other), getMask(other)])), pixels | other)
+
+    flat = pixels.reshape(-1)
+    for start, stop in [(0, 1), (3, len(flat) - 2), (len(flat) // 2, len(flat))]:
+        np.testing.assert_array_equal(mask.getSlab(start, stop), flat[start:stop])
+
+    bounds = mask.getBounds()
+    coordinates = np.argwhere(pixels)
+    assert bounds == [(int(first), int(last) + 1) for first, last in zip(coordinates.min(axis=0), coordinates.max(axis=0))]
+    np.testing.assert_array_equal(mask.getRegion(bounds), pixels[tuple(slice(start, stop) for start, stop in bounds)])
+
+def test_overlapping_runs_are_merged():
+    mask = RunLengthMask.fromRuns((2, 10), [0, 3, 5, 12], [4, 5, 8, 12])
+    assert mask.starts.tolist() == [0] and mask.stops.tolist() == [8]
+
+def test_empty_and_invalid_masks():
+    mask = RunLengthMask.fromJsonData({"size": [3, 4], "counts": [12]})
+    assert mask.getArea() == 0 and mask.getBounds() is None
+    with pytest.raises(ValueError):
+        RunLengthMask.fromJsonData({"size": [3, 4], "counts": [10, 5]})
+    with pytest.raises(ValueError):
+        RunLengthMask.fromJsonData({"size": [3, 4], "counts": [2, -1]})
+    with pytest.raises(ValueError):
+        getMask(np.ones((2, 2), dtype=bool)).getOverlapAreas(getMask(np.ones((4, 1), dtype=bool)))
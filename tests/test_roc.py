@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+from sklearn.metrics import roc_auc_score, roc_curve, precision_recall_curve, average_precision_score, recall_score
+
+from utils.roc import BinaryRocCurve, getUpperHullIndexes
+
+def getCases():
+    generator = np.random.default_rng(0)
+    for size in [2, 3, 10, 100, 1000]:
+        for ties in [False, True]:
+            expected = generator.integers(0, 2, size)
+            expected[:2] = [0, 1]
+            actual = generator.random(size)
+            if ties:
+                # few distinct scores, so many thresholds have tied positives and negatives
+                actual = np.round(actual * 4) / 4
+            yield expected, actual
+
+@pytest.mark.parametrize("expected,actual", list(getCases()))
+def test_same_as_sklearn(expected, actual):
+    curve = BinaryRocCurve(expected, actual)
+
+    assert curve.getAuc() == pytest.approx(roc_auc_score(expected, actual), abs=1e-12)
+    assert curve.getAveragePrecision() == pytest.approx(average_precision_score(expected, actual), abs=1e-12)
+
+    fpr, tpr, thresholds = curve.getRocCurve(dropIntermediate=True)
+    expectedFpr, expectedTpr, expectedThresholds = roc_curve(expected, actual, drop_intermediate=True)
+    np.testing.assert_allclose(fpr, expectedFpr)
+    np.testing.assert_allclose(tpr, expectedTpr)
+    np.testing.assert_array_equal(thresholds[1:], expectedThresholds[1:])
+
+    precision, recall, thresholds = curve.getPrecisionRecallCurve()
+    expectedPrecision, expectedRecall, expectedThresholds = precision_recall_curve(expected, actual)
+    np.testing.assert_allclose(precision, expectedPrecision)
+    np.testing.assert_allclose(recall, expectedRecall)
+    np.testing.assert_array_equal(thresholds, expectedThresholds)
+
+    for threshold in [0.0, 0.25, 0.5, 0.75, 1.0]:
+        predicted = (actual >= threshold).astype(int)
+        sensitivity, specificity = curve.getSensitivityAndSpecificity(threshold)
+        assert sensitivity == pytest.approx(recall_score(expected, predicted, pos_label=1, zero_division=0))
+        assert specificity == pytest.approx(recall_score(expected, predicted, pos_label=0, zero_division=0))
+
+def test_counts_match_the_predictions_at_the_threshold():
+    generator = np.random.default_rng(1)
+    expected = generator.integers(0, 2, 200)
+    actual = np.round(generator.random(200), 2)
+    curve = BinaryRocCurve(expected, actual)
+
+    for threshold in np.linspace(-0.1, 1.1, 25):
+        predicted = actual >= threshold
+        assert curve.getCountsAtThreshold(threshold) == (
+            np.sum(predicted & (expected == 1)),
+            np.sum(predicted & (expected == 0)),
+            np.sum(~predicted & (expected == 0)),
+            np.sum(~predicted & (expected == 1))
+        )
+
+def test_operating_points_match_the_counts_of_every_threshold():
+    generator = np.random.default_rng(1)
+    expected = generator.integers(0, 2, 200)
+    actual = np.round(generator.random(200), 2)
+    curve = BinaryRocCurve(expected, actual)
+    thresholds = np.linspace(-0.1, 1.1, 25)
+
+    points = curve.getOperatingPoints(thresholds)
+    for i, threshold in enumerate(thresholds):
+        predicted = actual >= threshold
+        assert points["truePositives"][i] == np.sum(predicted & (expected == 1))
+        assert points["falsePositives"][i] == np.sum(predicted & (expected == 0))
+        assert points["trueNegatives"][i] == np.sum(~predicted & (expected == 0))
+        assert points["falseNegatives"][i] == np.sum(~predicted & (expected == 1))
+
+def test_decimated_roc_curve_keeps_the_hull_and_operating_point():
+    generator = np.random.default_rng(2)
+    expected = generator.integers(0, 2, 5000)
+    actual = generator.random(5000) + expected * 0.3
+    curve = BinaryRocCurve(expected, actual)
+
+    fpr, tpr, thresholds = curve.getDecimatedRocCurve(50, 0.5)
+    allFpr, allTpr, allThresholds = curve.getRocCurve()
+    hullIndexes = getUpperHullIndexes(allFpr, allTpr)
+    assert len(fpr) <= max(50, len(hullIndexes) + 1)
+    assert set(allThresholds[hullIndexes]) <= set(thresholds)
+    assert allThresholds[curve.getOperatingPointIndex(0.5)] in thresholds
+    # the trapezoidal area of the points on the upper hull is the area of the whole curve or more
+    assert getArea(fpr, tpr) >= getArea(allFpr, allTpr) - 1e-12
+    assert fpr[0] == 0 and tpr[0] == 0 and fpr[-1] == 1 and tpr[-1] == 1
+
+def getArea(x, y):
+    return np.sum(np.diff(x) * (y[1:] + y[:-1]) / 2.0)
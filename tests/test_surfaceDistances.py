@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from scipy import ndimage
+from scipy.spatial.distance import cdist
+
+from evaluations.segmentation import getSurfaceDistances, getJointBounds
+
+class DenseMask:
+    # a mask decoded in memory, with the interface the surface distances read the masks with
+    def __init__(self, voxels):
+        self.voxels = voxels
+
+    def getRegion(self, bounds):
+        return self.voxels[tuple(slice(start, stop) for start, stop in bounds)]
+
+def getBounds(voxels):
+    coordinates = np.argwhere(voxels)
+    if len(coordinates) <= 0:
+        return None
+    return [(int(first), int(last) + 1) for first, last in zip(coordinates.min(axis=0), coordinates.max(axis=0))]
+
+def getReferenceDistances(gt, pred):
+    # the surfaces of the whole images and the brute force distances between every pair of surface voxels, like medpy's hd95 and assd
+    structure = ndimage.generate_binary_structure(gt.ndim, 1)
+    gtSurface = np.argwhere(gt & ~ndimage.binary_erosion(gt, structure=structure))
+    predSurface = np.argwhere(pred & ~ndimage.binary_erosion(pred, structure=structure))
+    distances = cdist(gtSurface, predSurface)
+    gtDistances = distances.min(axis=1)
+    predDistances = distances.min(axis=0)
+    return np.percentile(np.hstack((gtDistances, predDistances)), 95), np.mean((predDistances.mean(), gtDistances.mean()))
+
+def getRandomBlob(generator, size):
+    # smoothed noise, so the blobs have holes, several components and voxels on the borders of the image
+    noise = ndimage.gaussian_filter(generator.random(size), 1.5)
+    return noise > np.quantile(noise, generator.uniform(0.5, 0.9))
+
+@pytest.mark.parametrize("seed,size", [(0, (20, 24)), (1, (9, 40)), (2, (8, 10, 12)), (3, (14, 6, 9)), (4, (1, 16, 16))])
+def test_same_as_brute_force(seed, size):
+    generator = np.random.default_rng(seed)
+    gt = getRandomBlob(generator, size)
+    pred = getRandomBlob(generator, size)
+    bounds = getJointBounds(getBounds(gt), getBounds(pred))
+    hausdorffDistance95, averageSymmetricSurfaceDistance = getReferenceDistances(gt, pred)
+
+    sliceSize = int(np.prod([stop - start for start, stop in bounds[1:]]))
+    # from a single slice per slab, smaller than the halo, up to the whole region at once
+    for chunkSize in [1, sliceSize * 3, sliceSize * 5 + 7, 1 << 24]:
+        distances = getSurfaceDistances(DenseMask(gt), DenseMask(pred), bounds, chunkSize)
+        assert distances == pytest.approx([hausdorffDistance95, averageSymmetricSurfaceDistance])
+
+def test_empty_segmentations():
+    voxels = np.zeros((4, 4), dtype=bool)
+    voxels[1:3, 1:3] = True
+    assert getSurfaceDistances(DenseMask(voxels), DenseMask(np.zeros((4, 4), dtype=bool)), getBounds(voxels)) == [None, None]
+    assert getSurfaceDistances(DenseMask(voxels), DenseMask(voxels), None) == [None, None]
+    assert getSurfaceDistances(DenseMask(voxels), DenseMask(voxels), getBounds(voxels)) == [0.0, 0.0]